@@ -1,141 +1,283 @@
 import streamlit as st
-import pandas as pd
 import os
-import re
 from datetime import datetime
 
+from toolbox.cache import DEFAULT_CACHE_PATH
+from toolbox.discovery import DEFAULT_MANIFEST_DIR, FileDiscovery, parse_patterns
+from toolbox.hardcoding import build_ruleset
+from toolbox.jobs import DEFAULT_JOB_STORE, DONE, FAILED, QUEUED, RUNNING, JobRunner, JobStore
+from toolbox.logs import IO_BOUND_RATIO, LogFollower, profile, steps
+from toolbox.matching import MATCHER_ENGINES
+from toolbox.parallel import EXECUTORS, default_workers
+from toolbox.reports import REPORT_FORMATS, report_mime
+from toolbox.tasks import TASKS, check_inputs, describe_inputs, list_log_files, run_task
+from toolbox.trigram import DEFAULT_INDEX_PATH
+
 # ---------- Utility Functions ----------
 
-def run_macro_usage_check(macro_dir, program_dir):
-    macro_files = [f for f in os.listdir(macro_dir) if f.lower().endswith(".sas")]
-    macro_names = [os.path.splitext(f)[0].lower() for f in macro_files]
-
-    sas_program_texts = []
-    for root, _, files in os.walk(program_dir):
-        for file in files:
-            if file.lower().endswith(".sas"):
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        sas_program_texts.append(f.read().lower())
-                except Exception as e:
-                    st.warning(f"Could not read {file_path}: {e}")
-
-    all_program_text = "\n".join(sas_program_texts)
-    macro_status = []
-    for macro in macro_names:
-        is_used = f"%{macro}" in all_program_text
-        macro_status.append({
-            "List of macros": macro,
-            "Status": "Used" if is_used else "Not Used"
-        })
-
-    df = pd.DataFrame(macro_status)
-    return df
-
-def run_search_for_terms(program_dir, terms):
-    result = []
-    for root, dirs, files in os.walk(program_dir):
-        for file in files:
-            if file.endswith(".sas"):
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = f.readlines()
-                    for line_num, line in enumerate(lines, start=1):
-                        for term in terms:
-                            if re.search(re.escape(term), line, re.IGNORECASE):
-                                result.append({
-                                    'Program Name': file,
-                                    'Line Number': line_num,
-                                    'Line Code': line.strip(),
-                                    'Identified Term': term
-                                })
-                except Exception as e:
-                    st.warning(f"Error reading file {file_path}: {e}")
-    return pd.DataFrame(result)
-
-def run_search_and_replace_terms(program_dir, replace_dict):
-    result = []
-    for root, dirs, files in os.walk(program_dir):
-        for file in files:
-            if file.endswith(".sas"):
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = f.readlines()
-
-                    updated_lines = []
-                    file_modified = False
-                    for line_num, line in enumerate(lines, start=1):
-                        original_line = line
-                        for search_term, replace_term in replace_dict.items():
-                            if re.search(re.escape(search_term), line, re.IGNORECASE):
-                                line = re.sub(re.escape(search_term), replace_term, line, flags=re.IGNORECASE)
-                                result.append({
-                                    'Program Name': file,
-                                    'Line Number': line_num,
-                                    'Original Line': original_line.strip(),
-                                    'Modified Line': line.strip(),
-                                    'Identified Term': search_term,
-                                    'Replaced With': replace_term
-                                })
-                                file_modified = True
-                        updated_lines.append(line)
-
-                    if file_modified:
-                        with open(file_path, 'w', encoding='utf-8', errors='ignore') as f:
-                            f.writelines(updated_lines)
-
-                except Exception as e:
-                    st.warning(f"Error processing file {file_path}: {e}")
-    return pd.DataFrame(result)
+LIVE_LOG_COLUMNS = ["Folder", "File", "Step", "Step Name", "Real Time (s)", "CPU Time (s)", "Memory (KB)",
+                    "Observations Read", "Observations Written", "I/O Bound"]
+# Dry-run diffs shown inline; the downloadable patch always has every file
+MAX_DIFF_PREVIEWS = 50
+# Per-file warnings shown under a job; the rest are only counted
+MAX_JOB_MESSAGES = 20
+MAX_RECENT_JOBS = 10
+ROOTS_HELP = ("Several studies or cuts: separate folders with ';' or use a glob such as /studies/*/dmc5/programs. "
+              "They are scanned side by side into one report with a Study/Cut column and an Across Studies sheet.")
+TERMS_HELP = ("Plain text is matched anywhere, ignoring case. Start a line with word: for a whole word, re: for a "
+              "regular expression or glob: for a word with * and ? wildcards; such a line holds one term. Other "
+              "lines are split on commas.")
+
+@st.cache_resource
+def get_job_runner():
+    # One runner per server process, shared by every session, so jobs outlive reruns and page reloads
+    return JobRunner(JobStore(DEFAULT_JOB_STORE))
+
+def show_job_result(job):
+    result = job.result
+    if result.get("cache_stats"):
+        stats = result["cache_stats"]
+        st.info(f"Scan cache: {stats['hits']} files reused, {stats['rescanned']} re-scanned.")
+    if result.get("index_stats"):
+        stats = result["index_stats"]
+        st.info(f"Trigram index: {stats['candidates']} of {stats['files']} files searched, "
+                f"{stats['indexed']} re-indexed.")
+    output_path = result.get("output_path")
+    if output_path and os.path.exists(output_path):
+        st.success("✅ Task completed successfully.")
+        with open(output_path, "rb") as f:
+            st.download_button("📥 Download Report", data=f, file_name=os.path.basename(output_path),
+                               mime=report_mime(output_path), key=f"report_{job.id}")
+    elif output_path:
+        st.warning(f"The report {output_path} is no longer on disk.")
+    else:
+        st.warning("No matches found or no data generated.")
+
+    bundle_path = result.get("bundle_path")
+    if bundle_path and os.path.exists(bundle_path):
+        st.info(f"Bundle: {bundle_path} ({result['bundle_pages']} pages).")
+        with open(bundle_path, "rb") as f:
+            st.download_button("📥 Download Bundle", data=f, file_name=os.path.basename(bundle_path),
+                               mime="application/pdf", key=f"bundle_{job.id}")
+
+    if result.get("performance"):
+        with st.expander("Performance"):
+            st.caption("Run phases are timed on the job's own thread and add up to the wall time; per-file phases "
+                       "are summed over every file and worker.")
+            st.dataframe(result["performance"], hide_index=True)
+
+    if result.get("dry_run"):
+        patch_path = result.get("patch_path")
+        diffs = result.get("diffs") or []
+        if patch_path and os.path.exists(patch_path):
+            st.info("Dry run: no files were modified.")
+            with open(patch_path, "rb") as f:
+                st.download_button("📥 Download Patch", data=f, file_name=os.path.basename(patch_path),
+                                   mime="text/x-diff", key=f"patch_{job.id}")
+        else:
+            st.info("Dry run: no files would change.")
+        # Per-file previews are only kept in memory, for jobs of this server process
+        for file_path, diff in diffs[:MAX_DIFF_PREVIEWS]:
+            with st.expander(file_path):
+                st.code(diff, language="diff")
+        if len(diffs) > MAX_DIFF_PREVIEWS:
+            st.caption(f"Showing the first {MAX_DIFF_PREVIEWS} files; the patch has all of them.")
+
+def show_job(job):
+    submitted_at = datetime.fromtimestamp(job.submitted).strftime("%Y-%m-%d %H:%M:%S")
+    st.markdown(f"**{job.task}** {job.description} · {job.status} · submitted {submitted_at}")
+    if job.status in (QUEUED, RUNNING):
+        fraction = job.done / job.total if job.total else 0.0
+        st.progress(fraction, text=f"{job.done} / {job.total} files, {job.throughput():.1f} files/s")
+        st.button("Cancel", key=f"cancel_{job.id}", on_click=job.cancel, disabled=job.cancel_requested)
+    elif job.status == DONE:
+        st.caption(f"{job.done} files in {job.finished - job.started:.1f}s ({job.throughput():.1f} files/s)")
+        show_job_result(job)
+    elif job.status == FAILED:
+        st.error(f"Task failed: {job.error}")
+    for message in job.messages[:MAX_JOB_MESSAGES]:
+        st.warning(message)
+    if len(job.messages) > MAX_JOB_MESSAGES:
+        st.caption(f"{len(job.messages) - MAX_JOB_MESSAGES} more warnings not shown.")
+
+def show_jobs(watching):
+    """Draw this session's jobs; rerun the page once the last running one finishes."""
+    runner = get_job_runner()
+    jobs = [job for job in map(runner.get, st.session_state.get("job_ids", [])) if job is not None]
+    for job in jobs:
+        with st.container(border=True):
+            show_job(job)
+    if watching and not any(job.status in (QUEUED, RUNNING) for job in jobs):
+        # Stops the auto-refresh
+        st.rerun()
+
+def show_live_log_view():
+    """Refresh the followed logs and redraw the slowest-steps table."""
+    settings = st.session_state["log_follow"]
+    follower = st.session_state["log_follower"]
+    # Listed afresh on every refresh so new logs are picked up; a manifest keeps that cheap
+    log_files = list_log_files(settings["log_dir"], FileDiscovery(**settings["discovery"]))
+    bytes_read, restarted = follower.refresh(log_files)
+    events = follower.table()
+    live = profile(events, settings["io_ratio"]).head(settings["top_n"])
+    st.caption(f"{len(follower)} logs, {len(steps(events))} steps. Last refresh read {bytes_read:,} new bytes"
+               + (f" and restarted {restarted} truncated or rotated logs." if restarted else ".")
+               + f" Updated {datetime.now():%H:%M:%S}.")
+    st.dataframe(live[LIVE_LOG_COLUMNS], hide_index=True)
 
 # ---------- Streamlit App UI ----------
 
 st.title("ClinSage-Programmers Toolbox")
 
-task = st.selectbox("Select a task:", ["Macro Usage Check", "Search for Terms", "Search and Replace Terms"])
+with st.sidebar:
+    st.header("Settings")
+    workers = st.number_input("Worker count", min_value=1, max_value=64, value=default_workers(), step=1)
+    executor = st.selectbox("Worker type", EXECUTORS, help="Processes for regex-heavy scans, threads for slow network shares")
+    root_workers = st.number_input("Workers per folder (several folders)", min_value=0, max_value=64, value=0, step=1,
+                                   help="Each folder gets a pool of its own; 0 shares the workers out")
+    use_cache = st.checkbox("Reuse results for unchanged files", value=True)
+    cache_path = st.text_input("Scan cache file", value=DEFAULT_CACHE_PATH)
+    cache_hash = st.checkbox("Verify file contents by hash", value=False)
+    cache_max_age = st.number_input("Drop cache entries unused for (days)", min_value=1, value=30)
+    exclude_text = st.text_input("Skip folders/files matching", placeholder="archive, old, qc, */tmp/*",
+                                 help="Comma-separated globs: a name (any depth) or a path relative to the folder")
+    include_text = st.text_input("Only files matching (optional)", placeholder="t_*.sas, l_*.sas")
+    use_manifest = st.checkbox("Remember folder listings (re-list only changed folders)", value=False)
+    discovery_settings = {"exclude": parse_patterns(exclude_text), "include": parse_patterns(include_text),
+                          "manifest_dir": DEFAULT_MANIFEST_DIR if use_manifest else None}
+    measure_run = st.checkbox("Measure performance (Performance panel and report sheet)", value=True)
+    profile_run = st.checkbox("Profile with cProfile (slower)", value=False, disabled=not measure_run,
+                              help="Profiles the job's own thread; per-file work in worker processes is not included. "
+                                   "One profiled or traced job runs at a time; others wait for it to finish")
+    trace_memory = st.checkbox("Trace memory with tracemalloc (slower)", value=False, disabled=not measure_run,
+                               help="One profiled or traced job runs at a time; others wait for it to finish")
+    perf_settings = {"profile": profile_run, "trace_memory": trace_memory} if measure_run else None
+
+task = st.selectbox("Select a task:", TASKS)
 
+# Form values are collected here so a background job gets a snapshot of them
+inputs = {}
 with st.form("input_form"):
     if task == "Macro Usage Check":
-        macro_dir = st.text_input("Path to Macro Folder")
-        program_dir = st.text_input("Path to SAS Programs Folder")
+        inputs["macro_dir"] = st.text_input("Path to Macro Folder")
+        inputs["program_dir"] = st.text_input("Path to SAS Programs Folder", help=ROOTS_HELP)
 
     elif task == "Search for Terms":
-        program_dir = st.text_input("Path to SAS Programs Folder")
-        terms_text = st.text_area("Enter terms to search (comma-separated)")
+        inputs["program_dir"] = st.text_input("Path to SAS Programs Folder", help=ROOTS_HELP)
+        inputs["terms_text"] = st.text_area("Enter terms to search (comma-separated)", help=TERMS_HELP)
+        inputs["matcher_engine"] = st.selectbox("Matcher engine", list(MATCHER_ENGINES))
+        inputs["use_mmap"] = st.checkbox("Memory-mapped fast path (large trees)", value=False)
+        inputs["code_only"] = st.checkbox("Ignore matches inside comments", value=False)
+        use_index = st.checkbox("Trigram index (fast repeat searches of the same tree)", value=False,
+                                help=f"Kept in {DEFAULT_INDEX_PATH} and updated for changed files before each search")
+        inputs["index_path"] = DEFAULT_INDEX_PATH if use_index else ""
 
     elif task == "Search and Replace Terms":
-        program_dir = st.text_input("Path to SAS Programs Folder")
-        terms_text = st.text_area("Enter search and replace terms as 'search:replace' per line")
+        inputs["program_dir"] = st.text_input("Path to SAS Programs Folder", help=ROOTS_HELP)
+        inputs["terms_text"] = st.text_area("Enter search and replace terms as 'search:replace' per line",
+                                            help="Terms take the same word:, re: and glob: prefixes as the search. "
+                                                 "Use 'search => replace' when the term contains a colon; a re: "
+                                                 "replacement can refer to groups as \\1.")
+        inputs["dry_run"] = st.checkbox("Dry run (preview diffs without changing files)", value=False)
+
+    elif task == "Hardcoding Check":
+        inputs["program_dir"] = st.text_input("Path to SAS Programs Folder", help=ROOTS_HELP)
+        inputs["rules_path"] = st.text_input("Study-specific rules file (JSON or YAML, optional)")
+        inputs["include_default_rules"] = st.checkbox("Include built-in rules", value=True)
 
+    elif task == "Log Runtime Check":
+        inputs["log_dir"] = st.text_input("Path to Log Folder", help=ROOTS_HELP)
+        inputs["threshold"] = st.number_input("Flag steps slower than (seconds)", min_value=0.0, value=5.0, step=1.0)
+        inputs["top_n"] = st.number_input("Slowest steps to list", min_value=1, value=25, step=5)
+        inputs["io_ratio"] = st.number_input("Flag as I/O bound when real time exceeds cpu time by (x)", min_value=1.0,
+                                             value=IO_BOUND_RATIO, step=1.0)
+        follow = st.checkbox("Follow logs while jobs run (live table instead of a report)", value=False)
+        refresh_seconds = st.number_input("Refresh every (seconds)", min_value=1, value=10, step=1)
+
+    elif task == "Real Time Report":
+        inputs["log_dir"] = st.text_input("Path to Log Folder", help=ROOTS_HELP)
+        inputs["use_mmap"] = st.checkbox("Memory-mapped fast path (large logs)", value=False)
+
+    elif task == "Dependency Graph":
+        inputs["program_dir"] = st.text_input("Path to SAS Programs Folder")
+        inputs["query"] = st.text_input("Who uses / what must rerun if this changes (macro, dataset or program; optional)")
+        inputs["use_saved_graph"] = st.checkbox("Query the saved graph without rescanning", value=False)
+
+    elif task == "Run All Checks":
+        # Every program is read once and handed to each enabled check
+        inputs["program_dir"] = st.text_input("Path to SAS Programs Folder", help=ROOTS_HELP)
+        inputs["macro_dir"] = st.text_input("Path to Macro Folder (optional, enables the macro usage check)")
+        inputs["log_dir"] = st.text_input("Path to Log Folder (optional, enables the log runtime check)",
+                                          help=ROOTS_HELP)
+        inputs["terms_text"] = st.text_area("Terms to search (comma-separated, optional)", help=TERMS_HELP)
+        inputs["matcher_engine"] = st.selectbox("Matcher engine", list(MATCHER_ENGINES))
+        inputs["code_only"] = st.checkbox("Ignore matches inside comments", value=False)
+        inputs["hardcoding"] = st.checkbox("Hardcoding check", value=True)
+        inputs["rules_path"] = st.text_input("Study-specific rules file (JSON or YAML, optional)")
+        inputs["include_default_rules"] = st.checkbox("Include built-in rules", value=True)
+        inputs["dependencies"] = st.checkbox("List dependencies", value=True)
+        inputs["threshold"] = st.number_input("Flag log steps slower than (seconds)", min_value=0.0, value=5.0,
+                                              step=1.0)
+
+    elif task == "RTF to PDF Bundle":
+        # Converted by LibreOffice, as many at a time as the worker count
+        inputs["toc_path"] = st.text_input("Path to the TOC RTF (the listed RTFs are read from its folder)")
+        inputs["pdf_dir"] = st.text_input("Folder for the PDFs and the bundle")
+        inputs["bundle_name"] = st.text_input("Bundle file name", value="bundle.pdf")
+        inputs["dry_run"] = st.checkbox("Dry run (list what would be converted)", value=False)
+
+    report_format = st.selectbox("Report format", list(REPORT_FORMATS))
     submitted = st.form_submit_button("Process Task")
 
-if submitted:
-    with st.spinner("Processing..."):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = f"report_{task.replace(' ', '_').lower()}_{timestamp}.xlsx"
-
-        if task == "Macro Usage Check":
-            df = run_macro_usage_check(macro_dir, program_dir)
-
-        elif task == "Search for Terms":
-            search_terms = [t.strip() for t in terms_text.split(",") if t.strip()]
-            df = run_search_for_terms(program_dir, search_terms)
-
-        elif task == "Search and Replace Terms":
-            replace_dict = {}
-            for line in terms_text.strip().split("\n"):
-                if ":" in line:
-                    key, val = line.split(":", 1)
-                    replace_dict[key.strip()] = val.strip()
-            df = run_search_and_replace_terms(program_dir, replace_dict)
-
-        if not df.empty:
-            df.to_excel(output_path, index=False)
-            st.success("✅ Task completed successfully.")
-            with open(output_path, "rb") as f:
-                st.download_button("📥 Download Report", data=f, file_name=output_path, mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        else:
-            st.warning("No matches found or no data generated.")
+if submitted and task == "Log Runtime Check" and follow:
+    # A new follower starts from the beginning of every log; later refreshes only read appended output
+    st.session_state["log_follow"] = {"log_dir": inputs["log_dir"], "top_n": int(inputs["top_n"]),
+                                      "io_ratio": inputs["io_ratio"], "refresh_seconds": int(refresh_seconds),
+                                      "discovery": discovery_settings}
+    st.session_state["log_follower"] = LogFollower()
+
+elif submitted:
+    if task == "Hardcoding Check" or (task == "Run All Checks" and inputs["hardcoding"]):
+        # Checked here as well so a bad rules file is reported before a job is queued
+        try:
+            build_ruleset(inputs["rules_path"].strip() or None, inputs["include_default_rules"])
+        except (OSError, ValueError, ImportError) as e:
+            st.error(f"Could not load rules: {e}")
+            st.stop()
+    inputs["root_workers"] = root_workers or None
+    try:
+        check_inputs(task, inputs)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+    cache_settings = None
+    if use_cache:
+        cache_settings = {"db_path": cache_path, "use_hash": cache_hash, "max_age_days": cache_max_age}
+    job = get_job_runner().submit(task, run_task, task, inputs, report_format, workers, executor, cache_settings,
+                                  discovery_settings, None, perf_settings, description=describe_inputs(inputs))
+    st.session_state.setdefault("job_ids", []).insert(0, job.id)
+
+if st.session_state.get("job_ids"):
+    st.subheader("Jobs")
+    runner = get_job_runner()
+    watching = any(job is not None and job.status in (QUEUED, RUNNING)
+                   for job in map(runner.get, st.session_state["job_ids"]))
+    # Only poll while something is still running
+    st.fragment(show_jobs, run_every=1 if watching else None)(watching)
+
+with st.expander("Recent reports"):
+    recent = [job for job in get_job_runner().recent(MAX_RECENT_JOBS) if job.status == DONE
+              and job.id not in st.session_state.get("job_ids", [])]
+    if not recent:
+        st.caption("No earlier reports.")
+    for job in recent:
+        with st.container(border=True):
+            show_job(job)
+
+if task == "Log Runtime Check" and "log_follow" in st.session_state:
+    st.subheader(f"Following logs in {st.session_state['log_follow']['log_dir']}")
+    if st.button("Stop following"):
+        del st.session_state["log_follow"], st.session_state["log_follower"]
+        st.rerun()
+    st.fragment(show_live_log_view, run_every=st.session_state["log_follow"]["refresh_seconds"])()
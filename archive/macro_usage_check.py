@@ -1,40 +1,63 @@
+import argparse
 import os
+import sys
+from contextlib import nullcontext
 import pandas as pd
 
-# Local paths (Windows style)
-macro_dir = r"J:\bdm\tbos\TAK279\studies\pso_3003\dmc5\macros"
-program_dir = r"J:\bdm\tbos\TAK279\studies\pso_3003\dmc5\programs"
-
-# Step 1: List all macro file names (without extension)
-macro_files = [f for f in os.listdir(macro_dir) if f.lower().endswith(".sas")]
-macro_names = [os.path.splitext(f)[0].lower() for f in macro_files]
-
-# Step 2: Read all .sas program contents from program_dir and subfolders
-sas_program_texts = []
-for root, _, files in os.walk(program_dir):
-    for file in files:
-        if file.lower().endswith(".sas"):
-            file_path = os.path.join(root, file)
-            try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    sas_program_texts.append(f.read().lower())
-            except Exception as e:
-                print(f"Could not read {file_path}: {e}")
-
-all_program_text = "\n".join(sas_program_texts)
-
-# Step 3: Check if each macro is used
-macro_status = []
-for macro in macro_names:
-    is_used = f"%{macro}" in all_program_text
-    macro_status.append({
-        "List of macros": macro,
-        "Status": "Used" if is_used else "Not Used"
-    })
-
-# Step 4: Save results to Excel
-output_file = os.path.join(os.getcwd(), "macro_usage_status.xlsx")
-df = pd.DataFrame(macro_status)
-df.to_excel(output_file, index=False)
-
-print(f"\n✅ Macro usage analysis complete. Output saved to:\n{output_file}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from toolbox import perf
+from toolbox.discovery import FileDiscovery
+from toolbox.macros import MacroIndex, extract_macro_calls
+from toolbox.reading import iter_lines
+
+def check_macro_usage(macro_dir, program_dir, output_file):
+    discovery = FileDiscovery()
+
+    # Step 1: List all macro file names (without extension)
+    macro_files = discovery.files(macro_dir, recursive=False)
+    macro_names = [os.path.splitext(os.path.basename(f))[0].lower() for f in macro_files]
+
+    # Step 2: Index %macro calls in all .sas programs from program_dir and subfolders
+    index = MacroIndex()
+    for file_path in discovery.files(program_dir):
+        try:
+            with perf.per_file(file_path):
+                calls = extract_macro_calls(iter_lines(file_path))
+            perf.count("matches", sum(len(lines) for lines in calls.values()))
+            index.add(os.path.relpath(file_path, program_dir), calls)
+        except Exception as e:
+            print(f"Could not read {file_path}: {e}")
+
+    # Step 3: Check if each macro is used
+    macro_status = []
+    for macro in macro_names:
+        macro_status.append({
+            "List of macros": macro,
+            "Status": "Used" if macro in index else "Not Used",
+            "Call Count": index.call_count(macro),
+            "Calling Programs": ", ".join(index.programs(macro))
+        })
+
+    # Step 4: Save results to Excel
+    with perf.phase("dataframe"):
+        df = pd.DataFrame(macro_status)
+    with perf.phase("write"):
+        df.to_excel(output_file, index=False)
+
+    print(f"\n✅ Macro usage analysis complete. Output saved to:\n{output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check which macros of a macro library the SAS programs call.")
+    parser.add_argument("macro_dir", help="macro library folder")
+    parser.add_argument("program_dir", help="SAS programs folder (searched recursively)")
+    parser.add_argument("-o", "--output", default=os.path.join(os.getcwd(), "macro_usage_status.xlsx"))
+    parser.add_argument("--perf", action="store_true", help="print the time per phase and file/byte/line/match counts")
+    args = parser.parse_args()
+
+    with perf.measure() if args.perf else nullcontext() as metrics:
+        check_macro_usage(args.macro_dir, args.program_dir, args.output)
+    if metrics is not None:
+        print(metrics.summary())
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,29 @@
+# Word (Windows only), one table at a time. The cross-platform, parallel version with a merged,
+# bookmarked bundle is the "RTF to PDF Bundle" task: python -m toolbox bundle TOC_RTF --pdf-dir DIR
+import argparse
 import os
-import re
-import win32com.client as win32
-import time
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Title parsing is shared with the toolbox bundle task
+from toolbox.bundle import title_to_filename, toc_titles
 
 # Paths
-toc_rtf_path = r"J:\bdm\tbos\TAK279\studies\3001\dryrun1\tables\FTE review\rtfs\INDEX_TAK279_3001_dryrun1_TOC_bundle.rtf"
+parser = argparse.ArgumentParser(description="Convert the RTFs listed in a TOC RTF to PDF with Word.")
+parser.add_argument("toc_rtf_path", help="TOC RTF; the listed RTFs are read from its folder")
+parser.add_argument("pdf_dir", help="folder the PDFs are written to")
+args = parser.parse_args()
+toc_rtf_path = os.path.abspath(args.toc_rtf_path)
 rtf_dir = os.path.dirname(toc_rtf_path)
-pdf_dir = r"J:\bdm\tbos\TAK279\studies\3001\dryrun1\tables\FTE review\pdfs"
+pdf_dir = os.path.abspath(args.pdf_dir)
 
 os.makedirs(pdf_dir, exist_ok=True)
 
-# Mapping prefixes
-prefix_map = {
-    "Table": "t",
-    "Listing": "l",
-    "Figure": "f"
-}
-
-# Function to generate filename from title
-def title_to_filename(title):
-    for key in prefix_map:
-        if title.startswith(key):
-            code = title.split()[1].replace('.', '_')
-            return f"{prefix_map[key]}{code}.rtf"
-    return None
-
 # Extract titles from TOC
-with open(toc_rtf_path, "r", encoding="utf-8", errors="ignore") as f:
-    rtf_text = f.read()
-
-pattern = r"\b(?:Table|Listing|Figure)\s+\d+(?:\.\d+)*[a-zA-Z]?\b"
-titles = re.findall(pattern, rtf_text)
+titles = toc_titles(toc_rtf_path)
 
-# Launch Word
+# Launch Word (Windows only)
+import win32com.client as win32
 word = win32.gencache.EnsureDispatch('Word.Application')
 word.Visible = False
 
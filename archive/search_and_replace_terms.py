@@ -1,68 +1,71 @@
+import argparse
 import os
-import re
+import sys
+from contextlib import nullcontext
 import pandas as pd
 
-def search_and_replace_sas_programs(folder_path, replace_dict):
-    result = []
-
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith(".sas"):
-                file_path = os.path.join(root, file)
-                print(f"Processing file: {file_path}")
-
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = f.readlines()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from toolbox import perf
+from toolbox.discovery import FileDiscovery
+from toolbox.replace import ReplacePlan, parse_replacements, replace_in_file
 
-                    updated_lines = []
-                    file_modified = False
+def search_and_replace_sas_programs(folder_path, replace_dict, dry_run=False, exclude=()):
+    plan = ReplacePlan(replace_dict)
+    result = []
 
-                    for line_num, line in enumerate(lines, start=1):
-                        original_line = line
-                        for search_term, replace_term in replace_dict.items():
-                            # Case-insensitive match
-                            if re.search(re.escape(search_term), line, re.IGNORECASE):
-                                matched_text = re.findall(re.escape(search_term), line, re.IGNORECASE)
-                                line = re.sub(re.escape(search_term), replace_term, line, flags=re.IGNORECASE)
-                                result.append({
-                                    'Program Name': file,
-                                    'Line Number': line_num,
-                                    'Original Line': original_line.strip(),
-                                    'Modified Line': line.strip(),
-                                    'Identified Term': search_term,
-                                    'Replaced With': replace_term
-                                })
-                                file_modified = True
-                        updated_lines.append(line)
+    for file_path in FileDiscovery(exclude=exclude).files(folder_path):
+        file = os.path.basename(file_path)
+        print(f"Processing file: {file_path}")
 
-                    if file_modified:
-                        with open(file_path, 'w', encoding='utf-8', errors='ignore') as f:
-                            f.writelines(updated_lines)
+        try:
+            # One combined pass per line, written atomically; untouched files are not rewritten
+            with perf.per_file(file_path):
+                changes, diff, encoding = replace_in_file(file_path, plan, dry_run)
+            perf.count("matches", len(changes))
+            if diff:
+                print(diff)
+            for line_num, original_line, modified_line, search_term, replace_term in changes:
+                result.append({
+                    'Program Name': file,
+                    'Encoding': encoding,
+                    'Line Number': line_num,
+                    'Original Line': original_line,
+                    'Modified Line': modified_line,
+                    'Identified Term': search_term,
+                    'Replaced With': replace_term
+                })
 
-                except Exception as e:
-                    print(f"Error processing file {file_path}: {e}")
+        except Exception as e:
+            print(f"Error processing file {file_path}: {e}")
 
-    return pd.DataFrame(result)
+    with perf.phase("dataframe"):
+        return pd.DataFrame(result)
 
 def save_report(report_df, output_file):
     if not report_df.empty:
-        report_df.to_excel(output_file, index=False)
+        with perf.phase("write"):
+            report_df.to_excel(output_file, index=False)
         print(f"✅ Report saved to {output_file}")
     else:
         print("⚠️ No matches found. No data to save.")
 
-# Define search and replace terms (case-insensitive search)
-replace_dict = {
-    'check1': 'testval1',
-    'Check 2': 'Test Value 2'
-}
-
-# Folder containing SAS programs
-sas_program_folder = r'J:\bdm\tbos\TAK279\studies\pso_3003\dmc5\programs\test'
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search and replace terms in SAS programs (case-insensitive search).")
+    # Folder containing SAS programs
+    parser.add_argument("folder")
+    # Search and replace terms, e.g. "check1:testval1" "Check 2:Test Value 2" "re:dmc(\d) => DMC_\1"
+    parser.add_argument("pairs", nargs="+", metavar="SEARCH:REPLACE")
+    parser.add_argument("--dry-run", action="store_true", help="print diffs without changing files")
+    parser.add_argument("-o", "--output", default="sas_program_search_replace_report.xlsx")
+    parser.add_argument("--perf", action="store_true", help="print the time per phase and file/byte/line/match counts")
+    args = parser.parse_args()
+    replace_dict = parse_replacements("\n".join(args.pairs))
 
-# Run search and replace
-report_df = search_and_replace_sas_programs(sas_program_folder, replace_dict)
+    with perf.measure() if args.perf else nullcontext() as metrics:
+        # Run search and replace
+        report_df = search_and_replace_sas_programs(args.folder, replace_dict, args.dry_run)
 
-# Save Excel report
-save_report(report_df, 'sas_program_search_replace_report.xlsx')
+        # Save Excel report
+        save_report(report_df, args.output)
+    if metrics is not None:
+        print(metrics.summary())
@@ -1,56 +1,68 @@
+import argparse
 import os
-import re
+import sys
+from contextlib import nullcontext
 import pandas as pd
 
-def search_sas_programs(folder_path, search_terms):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from toolbox import perf
+from toolbox.discovery import FileDiscovery
+from toolbox.matching import build_matcher, scan_lines
+from toolbox.reading import read_text
+
+def search_sas_programs(folder_path, search_terms, engine="regex", exclude=()):
+    matcher = build_matcher(search_terms, engine)
     result = []
 
-    # Traverse all files in the given folder and its subfolders
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith(".sas"):  # Check for .sas files
-                file_path = os.path.join(root, file)
-                print(f"Processing file: {file_path}")  # Debug - Check file path
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as sas_file:
-                        lines = sas_file.readlines()
-
-                        for line_num, line in enumerate(lines, start=1):
-                            for term in search_terms:
-                                # Case-insensitive search using re.IGNORECASE
-                                if re.search(re.escape(term), line, re.IGNORECASE):
-                                    print(f"Match found in {file} on line {line_num}: {line.strip()}")  # Debug - Check matches
-                                    result.append({
-                                        'Program Name': file,
-                                        'Line Number': line_num,
-                                        'Line Code': line.strip(),
-                                        'Identified Term': term
-                                    })
-                except Exception as e:
-                    print(f"Error reading file {file_path}: {e}")  # Debug - File read error
+    # All .sas files (any case) in the given folder and its subfolders, minus excluded folders
+    for file_path in FileDiscovery(exclude=exclude).files(folder_path):
+        file = os.path.basename(file_path)
+        print(f"Processing file: {file_path}")  # Debug - Check file path
+
+        try:
+            with perf.per_file(file_path):
+                # Case-insensitive search, one pass per line for all terms, in the file's own encoding
+                encoding, lines = read_text(file_path)
+                for line_num, line, term in scan_lines(lines, matcher):
+                    perf.count("matches")
+                    print(f"Match found in {file} on line {line_num}: {line.strip()}")  # Debug - Check matches
+                    result.append({
+                        'Program Name': file,
+                        'Encoding': encoding,
+                        'Line Number': line_num,
+                        'Line Code': line.strip(),
+                        'Identified Term': term
+                    })
+        except Exception as e:
+            print(f"Error reading file {file_path}: {e}")  # Debug - File read error
 
     # Convert results to a pandas DataFrame
-    return pd.DataFrame(result)
+    with perf.phase("dataframe"):
+        return pd.DataFrame(result)
 
 def save_report(report_df, output_file):
     if not report_df.empty:
-        report_df.to_excel(output_file, index=False)
+        with perf.phase("write"):
+            report_df.to_excel(output_file, index=False)
         print(f"✅ Report saved to {output_file}")
     else:
         print("⚠️ No matches found. No data to save.")
 
-# List of specific words or sentences to search for (case-insensitive)
-search_terms = [
-    'dmc4',
-    'dev'
-]
-
-# Folder containing the SAS programs
-sas_program_folder = r'J:\bdm\tbos\TAK279\studies\pso_3003\dmc5\programs'
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search SAS programs for terms (case-insensitive).")
+    # Folder containing the SAS programs
+    parser.add_argument("folder")
+    # Specific words or sentences to search for
+    parser.add_argument("terms", nargs="+")
+    parser.add_argument("-o", "--output", default="sas_program_search_report.xlsx")
+    parser.add_argument("--perf", action="store_true", help="print the time per phase and file/byte/line/match counts")
+    args = parser.parse_args()
 
-# Search for terms and generate the report
-report_df = search_sas_programs(sas_program_folder, search_terms)
+    with perf.measure() if args.perf else nullcontext() as metrics:
+        # Search for terms and generate the report
+        report_df = search_sas_programs(args.folder, args.terms)
 
-# Save the report to an Excel file
-save_report(report_df, 'sas_program_search_report.xlsx')
+        # Save the report to an Excel file
+        save_report(report_df, args.output)
+    if metrics is not None:
+        print(metrics.summary())
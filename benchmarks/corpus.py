@@ -0,0 +1,198 @@
+"""Synthetic study trees for benchmarking the scanners.
+
+``generate_corpus`` writes a reproducible tree laid out like a study area::
+
+    <root>/macros/      macro library (one %macro per file)
+    <root>/programs/    SAS programs in adam/, tables/, listings/ and figures/
+                        subfolders of at most 200 files each
+    <root>/logs/        one log per program with SAS NOTE blocks
+
+Programs mix what the scanners look for: header comment blocks, %let and
+%include, DATA steps with SET/MERGE and hardcoded WHERE/IF literals, PROC
+SQL, PROC steps with data=/out=, macro calls (some commented out) and date
+literals. Logs have an author line, echoed source, observation NOTEs and
+``real time``/``cpu time``/memory blocks, ending with the session totals.
+The same ``seed`` always gives the same files.
+
+Run as a script to write a tree::
+
+    python benchmarks/corpus.py /tmp/bench_corpus --programs 10000
+"""
+import argparse
+import os
+import random
+
+SUBFOLDERS = ("adam", "tables", "listings", "figures")
+FILES_PER_FOLDER = 200
+DOMAINS = ("dm", "ae", "cm", "ex", "lb", "vs", "mh", "ds", "sv", "eg")
+TERMS = ("dmc4", "dev", "dryrun", "cutoff", "prod")
+
+
+def macro_names(count):
+    return [f"m_{DOMAINS[i % len(DOMAINS)]}_{i:04d}" for i in range(count)]
+
+
+def macro_source(name, rng):
+    params = ", ".join(rng.sample(["ds", "out", "by", "where", "var", "fmt"], 3))
+    return (
+        f"/* Macro {name}: shared utility */\n"
+        f"%macro {name}({params});\n"
+        f"  %local i n;\n"
+        f"  %let n = %sysfunc(countw(&var));\n"
+        f"  %do i = 1 %to &n;\n"
+        f"    %put NOTE: processing %scan(&var, &i);\n"
+        f"  %end;\n"
+        f"  data &out; set &ds; run;\n"
+        f"%mend {name};\n"
+    )
+
+
+def _data_step(rng, domain, index, macros):
+    term = rng.choice(TERMS)
+    lines = [
+        f"* derive {domain} records, step {index};\n",
+        f"data work.{domain}_{index}(keep=usubjid {domain}seq {domain}dtc);\n",
+        f"  set sdtm.{domain} (where=(studyid = 'TAK-{rng.randint(100, 999)}'));\n",
+        f"  if {domain}seq = {rng.randint(1, 40)} then flag = 'Y';\n",
+        f"  if put({domain}dtc, yymmdd10.) > '{2020 + rng.randint(0, 5)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}' "
+        f"then late = 1;\n",
+        f"  /* {term} cut: keep in sync with the spec */\n",
+        "run;\n",
+    ]
+    if rng.random() < 0.5:
+        lines.insert(3, f"  merge work.{domain}_{index} adam.adsl(in=a keep=usubjid arm);\n  by usubjid;\n")
+    if rng.random() < 0.6:
+        lines.append(f"%{rng.choice(macros)}(ds=work.{domain}_{index}, out=work.{domain}_{index}_x, var=aval);\n")
+    if rng.random() < 0.2:
+        lines.append(f"/* %{rng.choice(macros)}(ds=old); */\n")
+    return lines
+
+
+def _proc_steps(rng, domain, index):
+    lines = [
+        f"proc sort data=work.{domain}_{index} out=work.{domain}_{index}_s nodupkey;\n",
+        "  by usubjid;\n",
+        "run;\n",
+        "proc sql;\n",
+        f"  create table work.{domain}_{index}_n as\n",
+        f"  select arm, count(distinct usubjid) as n from work.{domain}_{index}_s\n",
+        f"  where arm = 'Treatment {rng.choice('ABC')}' group by arm;\n",
+        "quit;\n",
+    ]
+    if rng.random() < 0.3:
+        lines.append(f"proc print data=work.{domain}_{index}_n; where site = '{rng.randint(1000, 9999)}'; run;\n")
+    return lines
+
+
+def program_source(name, rng, macros):
+    """Text of one program; roughly 2 to 25 KB."""
+    domain = rng.choice(DOMAINS)
+    lines = [
+        "/*" + "*" * 70 + "\n",
+        f" Program:  {name}.sas\n",
+        f" Author:   {rng.choice(['J Doe', 'A Smith', 'K Rao', 'M Chen'])}\n",
+        f" Purpose:  {domain.upper()} outputs for the {rng.choice(TERMS)} delivery\n",
+        "*" * 70 + "*/\n",
+        "%let study = TAK279;\n",
+        f"%let cutoff = {2020 + rng.randint(0, 5)}-06-30;\n",
+        "%include 'setup.sas';\n",
+    ]
+    if rng.random() < 0.3:
+        lines.append(f"%include \"../macros/{rng.choice(macros)}.sas\";\n")
+    for index in range(rng.randint(3, 40)):
+        lines += _data_step(rng, domain, index, macros)
+        if rng.random() < 0.5:
+            lines += _proc_steps(rng, domain, index)
+    return "".join(lines)
+
+
+def _stat_block(rng, step, seconds):
+    if seconds >= 60:
+        real = f"{int(seconds // 60)}:{seconds % 60:05.2f}"
+    else:
+        real = f"{seconds:.2f} seconds"
+    cpu = seconds * rng.uniform(0.05, 1.0)
+    return [
+        f"NOTE: {step} used (Total process time):\n",
+        f"      real time           {real}\n",
+        f"      user cpu time       {cpu * 0.8:.2f} seconds\n",
+        f"      system cpu time     {cpu * 0.2:.2f} seconds\n",
+        f"      memory              {rng.uniform(200, 90000):.2f}k\n",
+        f"      OS Memory           {rng.uniform(18000, 120000):.2f}k\n",
+        "\n",
+    ]
+
+
+def log_source(name, rng):
+    """Text of one log with 5 to 80 step NOTE blocks."""
+    lines = [
+        "1                                                          The SAS System\n",
+        f"NOTE: Author: {rng.choice(['J Doe', 'A Smith', 'K Rao', 'M Chen'])}\n",
+        f"NOTE: Running {name}.sas\n",
+    ]
+    line_num = 2
+    total = 0.0
+    for index in range(rng.randint(5, 80)):
+        domain = rng.choice(DOMAINS)
+        seconds = rng.choice([rng.uniform(0.01, 1), rng.uniform(1, 10), rng.uniform(10, 200)])
+        total += seconds
+        obs = rng.randint(10, 500000)
+        if rng.random() < 0.6:
+            lines += [f"{line_num}    data work.{domain}_{index};\n", f"{line_num + 1}      set sdtm.{domain};\n",
+                      f"{line_num + 2}    run;\n", "\n",
+                      f"NOTE: There were {obs} observations read from the data set SDTM.{domain.upper()}.\n",
+                      f"NOTE: The data set WORK.{domain.upper()}_{index} has {obs} observations and "
+                      f"{rng.randint(5, 80)} variables.\n"]
+            lines += _stat_block(rng, "DATA statement", seconds)
+        else:
+            proc = rng.choice(["SORT", "SQL", "MEANS", "FREQ", "REPORT", "TRANSPOSE"])
+            lines += [f"{line_num}    proc {proc.lower()} data=work.{domain}_{index}; run;\n", "\n",
+                      f"NOTE: There were {obs} observations read from the data set WORK.{domain.upper()}_{index}.\n"]
+            lines += _stat_block(rng, f"PROCEDURE {proc}", seconds)
+        line_num += 4
+    lines.append("NOTE: SAS Institute Inc., SAS Campus Drive, Cary, NC USA 27513-2414\n")
+    lines += _stat_block(rng, "The SAS System", total)
+    return "".join(lines)
+
+
+def generate_corpus(root, programs=100, logs=None, macros=None, seed=0):
+    """Write a synthetic tree under ``root``; returns ``{"programs": dir, "macros": dir, "logs": dir}``.
+
+    ``logs`` defaults to one per program and ``macros`` to one per 20
+    programs (at least 10). Existing files are overwritten.
+    """
+    rng = random.Random(seed)
+    logs = programs if logs is None else logs
+    names = macro_names(macros or max(10, programs // 20))
+    dirs = {kind: os.path.join(root, kind) for kind in ("programs", "macros", "logs")}
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+
+    for name in names:
+        with open(os.path.join(dirs["macros"], f"{name}.sas"), "w", encoding="utf-8") as f:
+            f.write(macro_source(name, rng))
+
+    # Only the first half of the library is called, so the macro usage check has both outcomes
+    called = names[:max(1, len(names) // 2)]
+    for i in range(programs):
+        folder = os.path.join(dirs["programs"], SUBFOLDERS[i % len(SUBFOLDERS)], f"batch{i // FILES_PER_FOLDER:03d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"p{i:06d}.sas"), "w", encoding="utf-8") as f:
+            f.write(program_source(f"p{i:06d}", rng, called))
+
+    for i in range(logs):
+        folder = os.path.join(dirs["logs"], f"batch{i // FILES_PER_FOLDER:03d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"p{i:06d}.log"), "w", encoding="utf-8") as f:
+            f.write(log_source(f"p{i:06d}", rng))
+    return dirs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic SAS study tree for benchmarks.")
+    parser.add_argument("root")
+    parser.add_argument("--programs", type=int, default=100)
+    parser.add_argument("--logs", type=int, help="log count (default: one per program)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate_corpus(args.root, args.programs, args.logs, seed=args.seed))
@@ -0,0 +1,218 @@
+"""Time the scanners on synthetic corpora and write a JSON baseline.
+
+Each benchmark runs in a fresh interpreter, so its peak RSS is its own and
+no file is already in this process's memory. Corpora are generated once per
+size under ``--corpus-dir`` (see ``benchmarks/corpus.py``) and reused by
+later runs; the result cache is never used.
+
+    python benchmarks/run.py --sizes 100,1000,10000 -o baseline.json
+    python benchmarks/run.py --sizes 1000 --compare baseline.json
+
+Every result has the files and bytes scanned, seconds, files/s, MB/s, the
+peak RSS of the benchmark process and of its largest worker process (in MB;
+None where the platform does not report it) and the number of report rows.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "archive"))
+from corpus import TERMS, generate_corpus
+
+BENCHMARKS = ("run_macro_usage_check", "run_search_for_terms", "run_search_for_terms_indexed",
+              "run_search_for_terms_query", "run_search_and_replace_terms", "scan_directory",
+              "scan_directory_no_prefilter", "scan_logs")
+REPLACE_TERMS = {"dmc4": "dmc5", "cutoff": "cut_off"}
+# Whole-word, regex and glob terms in one plan, as the literal TERMS would need many variants
+QUERY_TERMS = ("re:dmc[0-9]+", "word:dev", "glob:dry*", "re:cut_?off", "word:prod")
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "toolbox_bench_corpus")
+
+
+def corpus_for(corpus_dir, size, seed=0):
+    """Corpus folders for ``size`` programs (and logs), generated on first use."""
+    root = os.path.join(corpus_dir, f"{size}_{seed}")
+    marker = os.path.join(root, "corpus.json")
+    if os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            return json.load(f)
+    print(f"Generating {size} programs and logs in {root} ...", file=sys.stderr)
+    dirs = generate_corpus(root, size, seed=seed)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(dirs, f)
+    return dirs
+
+
+def tree_size(folder, extension):
+    files = total = 0
+    for parent, _, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith(extension):
+                files += 1
+                total += os.path.getsize(os.path.join(parent, name))
+    return files, total
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None, None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def run_case(name, dirs, workers, executor):
+    """Run one benchmark in this process and return its result dict."""
+    from toolbox.tasks import run_macro_usage_check, run_search_and_replace_terms, run_search_for_terms
+
+    extension = ".log" if name == "scan_logs" else ".sas"
+    folder = dirs["logs"] if name == "scan_logs" else dirs["programs"]
+    scratch = None
+    if name == "run_search_and_replace_terms":
+        # Replace rewrites files: it runs on a copy, and copying is not timed
+        scratch = tempfile.mkdtemp(prefix="toolbox_bench_")
+        folder = shutil.copytree(folder, os.path.join(scratch, "programs"))
+    index_path = None
+    if name == "run_search_for_terms_indexed":
+        # Times a repeat search: the index is built first, untimed
+        scratch = tempfile.mkdtemp(prefix="toolbox_bench_")
+        index_path = os.path.join(scratch, "trigram_index.sqlite3")
+        run_search_for_terms(folder, ["index"], "regex", workers, executor, index_path=index_path)
+    files, size = tree_size(folder, extension)
+
+    try:
+        start = time.perf_counter()
+        if name == "run_macro_usage_check":
+            rows = len(run_macro_usage_check(dirs["macros"], folder, workers, executor))
+        elif name == "run_search_for_terms":
+            rows = len(run_search_for_terms(folder, list(TERMS), "regex", workers, executor))
+        elif name == "run_search_for_terms_indexed":
+            rows = len(run_search_for_terms(folder, list(TERMS), "regex", workers, executor, index_path=index_path))
+        elif name == "run_search_for_terms_query":
+            rows = len(run_search_for_terms(folder, list(QUERY_TERMS), "regex", workers, executor))
+        elif name == "run_search_and_replace_terms":
+            rows = len(run_search_and_replace_terms(folder, REPLACE_TERMS, workers, executor))
+        elif name == "scan_directory":
+            from detect_hardcoding_sasfiles import scan_directory
+            rows = len(scan_directory(folder, workers, executor))
+        elif name == "scan_directory_no_prefilter":
+            # The same scan with every rule's regex run on every statement, to time the keyword prefilter
+            from detect_hardcoding_sasfiles import scan_directory
+            from toolbox.hardcoding import DEFAULT_RULES, RuleSet
+            rows = len(scan_directory(folder, workers, executor, ruleset=RuleSet(DEFAULT_RULES, prefilter=False)))
+        elif name == "scan_logs":
+            from toolbox.realtime import scan_logs
+            df_summary, df_details = scan_logs(folder, workers, executor)
+            rows = len(df_summary) + len(df_details)
+        else:
+            raise ValueError(f"Unknown benchmark {name!r}")
+        seconds = time.perf_counter() - start
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    peak_rss_mb, peak_worker_rss_mb = _peak_rss_mb()
+    return {
+        "benchmark": name, "files": files, "bytes": size, "rows": rows, "seconds": round(seconds, 4),
+        "files_per_s": round(files / seconds, 1) if seconds else None,
+        "mb_per_s": round(size / 1e6 / seconds, 2) if seconds else None,
+        "peak_rss_mb": peak_rss_mb and round(peak_rss_mb, 1),
+        "peak_worker_rss_mb": peak_worker_rss_mb and round(peak_worker_rss_mb, 1),
+    }
+
+
+def run_isolated(name, dirs, workers, executor):
+    """``run_case`` in a fresh interpreter."""
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", name, "--case-dirs", json.dumps(dirs),
+         "--workers", str(workers), "--executor", executor],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["benchmark"], r["files"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path} (files/s, higher is better):")
+    for result in results:
+        old = baseline.get((result["benchmark"], result["files"]))
+        if old and old.get("files_per_s") and result.get("files_per_s"):
+            ratio = result["files_per_s"] / old["files_per_s"]
+            print(f"  {result['benchmark']:<30} {result['files']:>7} files  "
+                  f"{old['files_per_s']:>9.1f} -> {result['files_per_s']:>9.1f}  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the toolbox scanners on synthetic corpora.")
+    parser.add_argument("--sizes", default="100,1000", help="comma-separated program counts (100 to 100000)")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help="comma-separated benchmark names")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--executor", choices=("process", "thread"), default="process")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="where generated corpora are kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON baseline here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print files/s against an earlier baseline")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--case-dirs", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, json.loads(args.case_dirs), args.workers, args.executor)))
+        return
+
+    names = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(BENCHMARKS))
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        dirs = corpus_for(args.corpus_dir, size, args.seed)
+        for name in names:
+            result = run_isolated(name, dirs, args.workers, args.executor)
+            results.append(result)
+            print(f"{name:<30} {result['files']:>7} files {result['seconds']:>9.2f}s {result['files_per_s']:>9.1f} files/s "
+                  f"{result['mb_per_s']:>7.2f} MB/s  peak RSS {result['peak_rss_mb']} MB", file=sys.stderr)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "executor": args.executor,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Shared scanning engines used by the Streamlit app and the archive scripts."""
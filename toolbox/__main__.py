@@ -0,0 +1,6 @@
+"""``python -m toolbox``: see ``toolbox.cli``."""
+import sys
+
+from toolbox.cli import main
+
+sys.exit(main())
@@ -0,0 +1,328 @@
+"""Run every check over a tree in one pass: each program is read once.
+
+The per-file checks are written as visitors. ``analyze_file`` reads and lexes
+a program once and hands every line to each enabled visitor (macro calls,
+term search, hardcoding rules, dependencies), so a nightly run that needs
+all of them costs one read per file instead of one per check. Logs are a
+separate set of files and are parsed once by the log runtime check.
+
+``run_all_checks`` returns the ``toolbox.reports.Sheet`` list of one
+multi-sheet workbook, with the same columns as the single-check reports.
+For the nightly batch run it from the command line::
+
+    python -m toolbox all PROGRAM_DIR --macros MACRO_DIR --logs LOG_DIR --terms dmc4,dev -o oversight.xlsx
+"""
+import os
+from collections import Counter, defaultdict
+
+from toolbox import perf
+from toolbox.cache import cache_namespace
+from toolbox.depgraph import DependencyCollector
+from toolbox.discovery import FileDiscovery
+from toolbox.lexer import code_view, iter_lexed
+from toolbox.logs import (PROFILE_COLUMNS, TABLE_COLUMNS, event_table, log_summary, parse_log_events, profile,
+                          records, steps_over)
+from toolbox.macros import MacroIndex, line_macro_calls
+from toolbox.matching import build_matcher
+from toolbox.parallel import scan_files
+from toolbox.reading import read_text
+from toolbox.reports import Sheet
+from toolbox.studies import ACROSS_COLUMNS, as_roots, iter_across_studies
+
+MACRO_USAGE_COLUMNS = ["List of macros", "Status", "Call Count", "Calling Programs"]
+SEARCH_COLUMNS = ["Program Name", "Encoding", "Line Number", "Line Code", "Identified Term"]
+HARDCODING_COLUMNS = ["File", "Encoding", "Line Number", "Line", "Issue", "Severity"]
+DEPENDENCY_COLUMNS = ["Program", "Kind", "Target", "Line Number"]
+LOG_STEP_COLUMNS = [c for c in TABLE_COLUMNS if c != "Session Total"]
+LOG_SUMMARY_COLUMNS = ["Author", "Folder", "File", "Steps", "Total Real Time (s)", "Max Real Time (s)",
+                       "Session Real Time (s)"]
+
+MACRO_CALLS = "macro_calls"
+TERMS = "terms"
+HARDCODING = "hardcoding"
+DEPENDENCIES = "dependencies"
+
+
+class MacroCallVisitor:
+    key = MACRO_CALLS
+    needs_lexer = True
+
+    def signature(self):
+        return ()
+
+    def begin(self):
+        return defaultdict(list)
+
+    def visit(self, calls, line_num, line, segments, statements):
+        for name in line_macro_calls(line, segments):
+            calls[name].append(line_num)
+
+    def end(self, calls):
+        return dict(calls)
+
+
+class TermVisitor:
+    key = TERMS
+
+    def __init__(self, terms, engine="regex", code_only=False):
+        self.matcher = build_matcher(terms, engine)
+        # As typed, so the cache namespace does not depend on how the terms were passed
+        self.terms = self.matcher.terms
+        self.engine = engine
+        self.code_only = code_only
+        # Only skipping comments needs the lexer
+        self.needs_lexer = code_only
+
+    def signature(self):
+        return self.terms, self.engine, self.code_only
+
+    def begin(self):
+        return []
+
+    def visit(self, hits, line_num, line, segments, statements):
+        text = code_view(segments) if self.code_only else line
+        hits.extend((line_num, line.strip(), term) for term in self.matcher.match_line(text))
+
+    def end(self, hits):
+        return hits
+
+
+class HardcodingVisitor:
+    key = HARDCODING
+    needs_lexer = True
+
+    def __init__(self, ruleset):
+        self.ruleset = ruleset
+
+    def signature(self):
+        return self.ruleset.signature()
+
+    def begin(self):
+        return []
+
+    def visit(self, issues, line_num, line, segments, statements):
+        for statement in statements:
+            text = statement.normalized()
+            issues.extend((statement.start_line, text, description, severity)
+                          for description, severity in self.ruleset.check_line(text))
+
+    def end(self, issues):
+        return issues
+
+
+class DependencyVisitor:
+    key = DEPENDENCIES
+    needs_lexer = True
+
+    def signature(self):
+        return ()
+
+    def begin(self):
+        return DependencyCollector()
+
+    def visit(self, collector, line_num, line, segments, statements):
+        collector.feed(line_num, line, segments, statements)
+
+    def end(self, collector):
+        return collector.edges()
+
+
+def analyze_file(file_path, visitors):
+    """Read ``file_path`` once; return each visitor's result, in order, and the encoding it was read in."""
+    visits = [(visitor.visit, visitor.begin()) for visitor in visitors]
+    encoding, lines = read_text(file_path)
+    if any(visitor.needs_lexer for visitor in visitors):
+        for line_num, line, segments, statements in iter_lexed(lines):
+            for visit, state in visits:
+                visit(state, line_num, line, segments, statements)
+    else:
+        for line_num, line in enumerate(lines, start=1):
+            for visit, state in visits:
+                visit(state, line_num, line, None, ())
+    return [visitor.end(state) for visitor, (_, state) in zip(visitors, visits)], encoding
+
+
+class SinglePass:
+    """One ``scan_files`` pass over the programs, shared by several report sheets.
+
+    The first sheet to ask for its rows drives the pass and gets them as the
+    files are read; rows for the other sheets are kept until asked for.
+    """
+
+    def __init__(self, program_dir, files, visitors, workers=1, executor="process", cache=None, progress=None,
+                 warn=print):
+        self.roots = as_roots(program_dir)
+        self.files = files
+        self.visitors = visitors
+        self.workers = workers
+        self.executor = executor
+        self.cache = cache
+        self.progress = progress
+        self.warn = warn
+        # One per root
+        self.macro_indexes = [MacroIndex() for _ in self.roots.paths]
+        self.severity_counts = Counter()
+        # Hits of each term by study, for the cross-study sheet
+        self.term_hits = defaultdict(Counter)
+        self.programs = []
+        self._buffers = {visitor.key: [] for visitor in visitors}
+        self._scanned = False
+
+    def _file_rows(self, file_path, results, encoding):
+        program = self.roots.relpath(file_path)
+        study = self.roots.study(file_path)
+        for visitor, result in zip(self.visitors, results):
+            if visitor.key == MACRO_CALLS:
+                perf.count("matches", sum(len(lines) for lines in result.values()))
+                self.macro_indexes[self.roots.index_of(file_path)].add(program, result)
+                continue
+            perf.count("matches", len(result))
+            if visitor.key == TERMS:
+                for *_, term in result:
+                    self.term_hits[term][self.roots.label_for(file_path)] += 1
+                yield TERMS, [{**study, "Program Name": os.path.basename(file_path), "Encoding": encoding,
+                               "Line Number": line_num, "Line Code": line, "Identified Term": term}
+                              for line_num, line, term in result]
+            elif visitor.key == HARDCODING:
+                self.severity_counts.update(severity for *_, severity in result)
+                yield HARDCODING, [{**study, "File": file_path, "Encoding": encoding, "Line Number": line_num,
+                                    "Line": line, "Issue": issue, "Severity": severity}
+                                   for line_num, line, issue, severity in result]
+            elif visitor.key == DEPENDENCIES:
+                self.programs.append((program, result))
+                yield DEPENDENCIES, [{**study, "Program": program, "Kind": kind, "Target": target,
+                                      "Line Number": line_num} for kind, target, line_num in result]
+
+    def rows(self, key):
+        """Rows for ``key``'s sheet; the first call runs the pass."""
+        if not self._scanned:
+            self._scanned = True
+            namespace = cache_namespace("batch", tuple((v.key, v.signature()) for v in self.visitors))
+            for file_path, result, error in scan_files(analyze_file, self.files, (self.visitors,), self.workers,
+                                                        self.executor, cache=self.cache, namespace=namespace,
+                                                        progress=self.progress, roots=self.roots, dedupe=True):
+                if error:
+                    self.warn(f"Error reading file {file_path}: {error}")
+                    continue
+                for row_key, rows in self._file_rows(file_path, *result):
+                    if row_key == key:
+                        yield from rows
+                    else:
+                        self._buffers[row_key].extend(rows)
+        rows, self._buffers[key] = self._buffers.get(key, []), []
+        yield from rows
+
+    def visitor(self, key):
+        return next(visitor for visitor in self.visitors if visitor.key == key)
+
+    def finish(self):
+        """Run the pass if no sheet has yet."""
+        for _ in self.rows(None):
+            pass
+
+
+def iter_macro_usage(macro_names, single_pass, across=None):
+    """Macro usage rows, per study with several roots; ``across`` gets each macro's call count by study."""
+    single_pass.finish()
+    roots = single_pass.roots
+    for study, (label, index) in enumerate(zip(roots.labels, single_pass.macro_indexes)):
+        for macro in macro_names:
+            if across is not None:
+                across[macro][label] += index.call_count(macro)
+            yield {
+                **roots.study(index=study),
+                "List of macros": macro,
+                "Status": "Used" if macro in index else "Not Used",
+                "Call Count": index.call_count(macro),
+                "Calling Programs": ", ".join(index.programs(macro))
+            }
+
+
+def iter_term_hits(single_pass):
+    single_pass.finish()
+    hits = {term: single_pass.term_hits.get(term, Counter()) for term in single_pass.visitor(TERMS).terms}
+    yield from iter_across_studies("Identified Term", hits, single_pass.roots.labels)
+
+
+def iter_severity_counts(single_pass):
+    single_pass.finish()
+    for severity, count in single_pass.severity_counts.most_common():
+        yield {"Severity": severity, "Count": count}
+
+
+def parse_logs(log_dir, workers=1, executor="process", cache=None, discovery=None, progress=None, warn=print):
+    """Parse every log under ``log_dir`` (one or several roots) into one step-level event table."""
+    roots = as_roots(log_dir)
+    log_files = roots.files(discovery or FileDiscovery(), (".log",))
+    parsed = []
+    for file_path, result, error in scan_files(parse_log_events, log_files, (), workers, executor,
+                                               cache=cache, namespace=cache_namespace("log_events"),
+                                               progress=progress, roots=roots, dedupe=True):
+        if error:
+            warn(f"Error reading log {file_path}: {error}")
+            continue
+        author, columns = result
+        perf.count("matches", len(columns["Step"]))
+        parsed.append((file_path, author, columns))
+    with perf.phase("dataframe"):
+        return event_table(parsed)
+
+
+def run_all_checks(program_dir, macro_dir=None, terms=(), engine="regex", code_only=False, ruleset=None,
+                   dependencies=True, log_dir=None, threshold=5.0, workers=1, executor="process",
+                   cache=None, discovery=None, progress=None, warn=print):
+    """Sheets for every enabled check, for one workbook.
+
+    Macro usage runs when ``macro_dir`` is given, the term search when
+    ``terms`` are, the hardcoding check with a ``ruleset``, and the log
+    runtime check with a ``log_dir``; dependencies are listed unless
+    turned off. Programs are read once, while the first program sheet is
+    written.
+    """
+    discovery = discovery or FileDiscovery()
+    roots = as_roots(program_dir) if program_dir else None
+    visitors = []
+    if macro_dir:
+        visitors.append(MacroCallVisitor())
+    if terms:
+        visitors.append(TermVisitor(terms, engine, code_only))
+    if ruleset is not None:
+        visitors.append(HardcodingVisitor(ruleset))
+    if dependencies:
+        visitors.append(DependencyVisitor())
+
+    sheets = []
+    if visitors and roots is not None:
+        files = roots.files(discovery, (".sas",))
+        single_pass = SinglePass(roots, files, visitors, workers, executor, cache, progress, warn)
+        macro_hits = defaultdict(Counter)
+        if ruleset is not None:
+            sheets.append(Sheet("Hardcoding Issues", roots.columns(HARDCODING_COLUMNS), single_pass.rows(HARDCODING)))
+        if terms:
+            sheets.append(Sheet("Term Search", roots.columns(SEARCH_COLUMNS), single_pass.rows(TERMS)))
+        if dependencies:
+            sheets.append(Sheet("Dependencies", roots.columns(DEPENDENCY_COLUMNS), single_pass.rows(DEPENDENCIES)))
+        if macro_dir:
+            macro_files = discovery.files(macro_dir, (".sas",), recursive=False)
+            macro_names = [os.path.splitext(os.path.basename(f))[0].lower() for f in macro_files]
+            sheets.append(Sheet("Macro Usage", roots.columns(MACRO_USAGE_COLUMNS),
+                                iter_macro_usage(macro_names, single_pass, macro_hits)))
+        if ruleset is not None:
+            sheets.append(Sheet("Hardcoding by Severity", ["Severity", "Count"], iter_severity_counts(single_pass)))
+        if roots.multiple and macro_dir:
+            sheets.append(Sheet("Macros Across Studies", ["List of macros"] + ACROSS_COLUMNS,
+                                iter_across_studies("List of macros", macro_hits, roots.labels)))
+        if roots.multiple and terms:
+            sheets.append(Sheet("Terms Across Studies", ["Identified Term"] + ACROSS_COLUMNS,
+                                iter_term_hits(single_pass)))
+
+    if log_dir:
+        events = parse_logs(log_dir, workers, executor, cache, discovery, progress, warn)
+        with perf.phase("dataframe"):
+            sheets += [
+                Sheet("Slow Steps", LOG_STEP_COLUMNS, records(steps_over(events, threshold))),
+                Sheet("Step Profile", LOG_STEP_COLUMNS + PROFILE_COLUMNS, records(profile(events))),
+                Sheet("Log Summary", LOG_SUMMARY_COLUMNS, records(log_summary(events))),
+            ]
+    return sheets
+
@@ -0,0 +1,251 @@
+"""Convert the RTF outputs listed in a TOC to PDF and merge them into one bundle.
+
+The TOC is an RTF whose text names every output (``Table 14.1.1``,
+``Listing 16.2.4a``, ``Figure 14.2.1``); ``title_to_filename`` maps each
+title to its RTF file (``t14_1_1.rtf``) in the TOC's folder. The RTFs are
+converted by a pool of headless LibreOffice processes, each with its own
+user profile so they can run side by side, several files per launch. A PDF
+newer than its RTF is reused. The TOC and the tables are then merged in TOC
+order into one PDF with a bookmark per title.
+
+A dry run only plans: it reads the TOC and checks which RTFs exist and
+which PDFs are out of date, without starting LibreOffice.
+
+Merging needs the ``pypdf`` package; converting needs LibreOffice
+(``soffice``) on the PATH or in its default install location.
+"""
+import math
+import os
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+BUNDLE_COLUMNS = ["Order", "Title", "RTF File", "PDF File", "Status"]
+
+PREFIX_MAP = {
+    "Table": "t",
+    "Listing": "l",
+    "Figure": "f"
+}
+TOC_TITLE_RE = re.compile(r"\b(?:Table|Listing|Figure)\s+\d+(?:\.\d+)*[a-zA-Z]?\b")
+TOC_BOOKMARK = "Table of Contents"
+
+# Files handed to one LibreOffice launch; starting soffice costs seconds, so it is shared
+BATCH_SIZE = 10
+# Per file in a batch, before the launch is abandoned
+CONVERT_TIMEOUT_SECONDS = 120
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".programmers_toolbox", "libreoffice")
+SOFFICE_LOCATIONS = (
+    r"C:\Program Files\LibreOffice\program\soffice.exe",
+    r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+    "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+)
+
+CONVERT = "converted"
+UP_TO_DATE = "up to date"
+WOULD_CONVERT = "would convert"
+MISSING = "missing RTF"
+UNPARSED = "could not parse title"
+
+
+def title_to_filename(title):
+    """RTF file name of a TOC title (``Table 14.1.1`` -> ``t14_1_1.rtf``), or None."""
+    for key in PREFIX_MAP:
+        if title.startswith(key):
+            code = title.split()[1].replace('.', '_')
+            return f"{PREFIX_MAP[key]}{code}.rtf"
+    return None
+
+
+def toc_titles(toc_path):
+    """Titles named in the TOC, in order, each once."""
+    with open(toc_path, "r", encoding="utf-8", errors="ignore") as f:
+        rtf_text = f.read()
+    return list(dict.fromkeys(" ".join(title.split()) for title in TOC_TITLE_RE.findall(rtf_text)))
+
+
+def find_soffice(path=None):
+    """Path of the LibreOffice ``soffice`` executable; raises FileNotFoundError when there is none."""
+    candidates = [path] if path else [shutil.which("soffice"), shutil.which("libreoffice"), *SOFFICE_LOCATIONS]
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError("LibreOffice (soffice) was not found; install it or give the path to soffice")
+
+
+class BundleItem:
+    """One TOC entry: its title, RTF and PDF paths, and what happened to it."""
+
+    def __init__(self, title, rtf_path, pdf_path, status):
+        self.title = title
+        self.rtf_path = rtf_path
+        self.pdf_path = pdf_path
+        self.status = status
+
+    def row(self, order):
+        return {"Order": order, "Title": self.title, "RTF File": self.rtf_path or "", "PDF File": self.pdf_path or "",
+                "Status": self.status}
+
+
+def _pdf_status(rtf_path, pdf_path):
+    if not os.path.exists(rtf_path):
+        return MISSING
+    try:
+        if os.path.getmtime(pdf_path) >= os.path.getmtime(rtf_path):
+            return UP_TO_DATE
+    except OSError:
+        pass
+    return WOULD_CONVERT
+
+
+def plan_bundle(toc_path, pdf_dir):
+    """The TOC itself, then one ``BundleItem`` per TOC title, with their status before converting."""
+    rtf_dir = os.path.dirname(os.path.abspath(toc_path))
+    toc_pdf = os.path.join(pdf_dir, Path(toc_path).stem + ".pdf")
+    items = [BundleItem(TOC_BOOKMARK, os.path.abspath(toc_path), toc_pdf, _pdf_status(toc_path, toc_pdf))]
+    for title in toc_titles(toc_path):
+        filename = title_to_filename(title)
+        if filename is None:
+            items.append(BundleItem(title, None, None, UNPARSED))
+            continue
+        rtf_path = os.path.join(rtf_dir, filename)
+        pdf_path = os.path.join(pdf_dir, Path(filename).stem + ".pdf")
+        items.append(BundleItem(title, rtf_path, pdf_path, _pdf_status(rtf_path, pdf_path)))
+    return items
+
+
+def _convert_batch(soffice, profiles, items, pdf_dir):
+    """Convert ``items`` with one soffice launch; returns ``{rtf_path: error or None}``."""
+    profile = profiles.get()
+    # Converted into a scratch folder first, so a killed launch never leaves a half-written PDF that looks current
+    scratch = tempfile.mkdtemp(prefix=".bundle_", dir=pdf_dir)
+    try:
+        command = [soffice, f"-env:UserInstallation={Path(profile).as_uri()}", "--headless", "--norestore",
+                   "--nolockcheck", "--convert-to", "pdf", "--outdir", scratch] + [item.rtf_path for item in items]
+        try:
+            completed = subprocess.run(command, capture_output=True, text=True, errors="replace",
+                                       timeout=CONVERT_TIMEOUT_SECONDS * len(items))
+            failure = completed.stderr.strip() or f"soffice exited with {completed.returncode}"
+        except subprocess.TimeoutExpired:
+            failure = "LibreOffice timed out"
+        errors = {}
+        for item in items:
+            produced = os.path.join(scratch, Path(item.rtf_path).stem + ".pdf")
+            if os.path.exists(produced):
+                os.replace(produced, item.pdf_path)
+                errors[item.rtf_path] = None
+            else:
+                errors[item.rtf_path] = failure
+        return errors
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        profiles.put(profile)
+
+
+def convert_items(items, pdf_dir, workers=1, soffice=None, profile_dir=DEFAULT_PROFILE_DIR, progress=None):
+    """Convert every item marked ``WOULD_CONVERT`` with ``workers`` LibreOffice processes at a time.
+
+    Items are updated in place to ``CONVERT`` or ``conversion failed: ...``.
+    ``progress(done, total)`` is called as batches finish.
+    """
+    pending = [item for item in items if item.status == WOULD_CONVERT]
+    if not pending:
+        return
+    soffice = find_soffice(soffice)
+    workers = max(1, min(int(workers or 1), len(pending)))
+    # Enough batches for every worker, at most BATCH_SIZE files each
+    size = max(1, min(BATCH_SIZE, math.ceil(len(pending) / workers)))
+    batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+
+    # One LibreOffice profile per worker slot: soffice instances cannot share one
+    profiles = queue.Queue()
+    for slot in range(workers):
+        path = os.path.join(profile_dir, f"worker_{slot}")
+        os.makedirs(path, exist_ok=True)
+        profiles.put(path)
+
+    done = 0
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="soffice")
+    try:
+        futures = {pool.submit(_convert_batch, soffice, profiles, batch, pdf_dir): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                errors = future.result()
+            except Exception as e:
+                errors = {item.rtf_path: f"{type(e).__name__}: {e}" for item in batch}
+            for item in batch:
+                error = errors.get(item.rtf_path)
+                item.status = CONVERT if error is None else f"conversion failed: {error}"
+            done += len(batch)
+            if progress is not None:
+                progress(done, len(pending))
+    finally:
+        # Batches not yet started are dropped when the consumer stops early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def check_tools(soffice=None):
+    """Check that LibreOffice and ``pypdf`` are there, so a missing one is reported before any conversion.
+
+    Raises ``ValueError``.
+    """
+    try:
+        import pypdf  # noqa: F401
+    except ImportError as e:
+        raise ValueError("Merging the bundle requires the pypdf package") from e
+    try:
+        find_soffice(soffice)
+    except FileNotFoundError as e:
+        raise ValueError(str(e)) from e
+
+
+def merge_pdfs(items, bundle_path):
+    """Merge the items' PDFs in order into ``bundle_path``, one bookmark per item; returns the page count."""
+    try:
+        from pypdf import PdfWriter
+    except ImportError as e:
+        raise ImportError("Merging the bundle requires the pypdf package") from e
+
+    writer = PdfWriter()
+    for item in items:
+        if item.status in (CONVERT, UP_TO_DATE):
+            writer.append(item.pdf_path, outline_item=item.title)
+    page_count = len(writer.pages)
+    directory = os.path.dirname(os.path.abspath(bundle_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".bundle_", suffix=".pdf", dir=directory)
+    try:
+        with open(fd, "wb") as f:
+            writer.write(f)
+        os.replace(tmp_path, bundle_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return page_count
+
+
+def build_bundle(toc_path, pdf_dir, bundle_name="bundle.pdf", workers=1, dry_run=False, soffice=None,
+                 progress=None):
+    """Plan, convert and merge; returns ``(items, bundle_path, page_count)``.
+
+    ``bundle_path`` is None for a dry run and when no PDF is available.
+    """
+    os.makedirs(pdf_dir, exist_ok=True)
+    items = plan_bundle(toc_path, pdf_dir)
+    if dry_run:
+        return items, None, 0
+    convert_items(items, pdf_dir, workers, soffice, progress=progress)
+    if not any(item.status in (CONVERT, UP_TO_DATE) for item in items):
+        return items, None, 0
+    bundle_path = os.path.join(pdf_dir, bundle_name)
+    return items, bundle_path, merge_pdfs(items, bundle_path)
+
+
+def iter_bundle_rows(items):
+    for order, item in enumerate(items):
+        yield item.row(order)
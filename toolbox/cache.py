@@ -0,0 +1,153 @@
+"""Persistent per-file scan cache so reruns only reprocess changed files.
+
+Results are stored in a small SQLite database keyed on a namespace (the task
+plus its parameters) and the file path. A cached result is reused only while
+the file's fingerprint -- mtime and size, plus an optional content hash --
+is unchanged.
+
+Several scans may share one cache (two app jobs, or the app and the CLI):
+the database is in WAL mode so reads never wait on a writer, and writes are
+buffered and committed in short transactions every ``COMMIT_EVERY`` results
+and at the end of each ``scan_files`` pass, never held for a whole scan. The
+``accessed`` time that eviction goes by is only refreshed once it is a day old.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".programmers_toolbox", "scan_cache.sqlite3")
+
+# Bump when a per-file worker changes what it returns
+CACHE_VERSION = 4
+
+# Seconds a write waits for another scan's transaction before giving up
+LOCK_TIMEOUT = 300
+# Buffered results and hits written per transaction
+COMMIT_EVERY = 500
+# A hit only refreshes ``accessed`` when it is older than this (seconds); eviction counts in days
+ACCESSED_RESOLUTION = 86400
+
+
+def cache_namespace(task, *params):
+    """Build a namespace string for ``task`` run with ``params``."""
+    digest = hashlib.sha1(repr(params).encode("utf-8")).hexdigest()[:16]
+    return f"v{CACHE_VERSION}:{task}:{digest}"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ScanCache:
+    """SQLite-backed store of per-file results with age/size eviction."""
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, use_hash=False, max_age_days=30, max_bytes=512 * 1024 * 1024):
+        self.db_path = db_path
+        self.use_hash = use_hash
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Written by ``commit``: result rows, and (namespace, path) of hits whose accessed time is stale
+        self._puts = []
+        self._touched = []
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                   namespace TEXT NOT NULL,
+                   path TEXT NOT NULL,
+                   mtime_ns INTEGER NOT NULL,
+                   size INTEGER NOT NULL,
+                   digest TEXT NOT NULL,
+                   result BLOB NOT NULL,
+                   accessed REAL NOT NULL,
+                   PRIMARY KEY (namespace, path)
+               )"""
+        )
+        self._conn.commit()
+
+    def fingerprint(self, path):
+        st = os.stat(path)
+        digest = file_digest(path) if self.use_hash else ""
+        return st.st_mtime_ns, st.st_size, digest
+
+    def get(self, namespace, path, fingerprint):
+        """Return ``(True, result)`` on a hit, ``(False, None)`` otherwise."""
+        row = self._conn.execute(
+            "SELECT mtime_ns, size, digest, result, accessed FROM results WHERE namespace = ? AND path = ?",
+            (namespace, path),
+        ).fetchone()
+        if row is not None and tuple(row[:3]) == tuple(fingerprint):
+            if row[4] < time.time() - ACCESSED_RESOLUTION:
+                self._touched.append((namespace, path))
+                self._commit_if_full()
+            self.hits += 1
+            return True, pickle.loads(row[3])
+        self.misses += 1
+        return False, None
+
+    def put(self, namespace, path, fingerprint, result):
+        mtime_ns, size, digest = fingerprint
+        self._puts.append((namespace, path, mtime_ns, size, digest,
+                           pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), time.time()))
+        self._commit_if_full()
+
+    def _commit_if_full(self):
+        if len(self._puts) + len(self._touched) >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        """Write the buffered results and access times in one short transaction."""
+        if not self._puts and not self._touched:
+            return
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", self._puts)
+            self._conn.executemany("UPDATE results SET accessed = ? WHERE namespace = ? AND path = ?",
+                                   [(time.time(), namespace, path) for namespace, path in self._touched])
+        self._puts.clear()
+        self._touched.clear()
+
+    def evict(self):
+        """Drop entries not used within ``max_age_days`` and trim to ``max_bytes``."""
+        self.commit()
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            self._conn.execute("DELETE FROM results WHERE accessed < ?", (cutoff,))
+        if self.max_bytes is not None:
+            total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(result)), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                # Oldest-accessed first until the store fits again
+                rows = self._conn.execute(
+                    "SELECT namespace, path, LENGTH(result) FROM results ORDER BY accessed"
+                ).fetchall()
+                stale = []
+                for namespace, path, length in rows:
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((namespace, path))
+                    total -= length
+                self._conn.executemany("DELETE FROM results WHERE namespace = ? AND path = ?", stale)
+        self._conn.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "rescanned": self.misses}
+
+    def close(self):
+        self.evict()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
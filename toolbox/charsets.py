@@ -0,0 +1,126 @@
+"""Per-file encoding sniffing, so programs and logs are decoded in their own encoding.
+
+SAS programs and logs saved on Windows are often cp1252 (or latin-1), not
+UTF-8; decoding them as UTF-8 drops or mangles every accented character. A
+file is sniffed from its bytes, read in large chunks:
+
+- a chunk of pure ASCII, by far the most common case, is settled by one
+  ``bytes.isascii`` call in C and never goes through a decoder;
+- other chunks are validated as UTF-8 (a leading byte order mark makes it
+  ``utf-8-sig``);
+- bytes that are not valid UTF-8 make the file cp1252, or latin-1 when it
+  has one of the five bytes cp1252 leaves undefined.
+
+latin-1 decodes any byte, so every file decodes without loss. A file no
+larger than ``SNIFF_CHUNK`` is decoded from the bytes read to sniff it, so
+it is still read once (``toolbox.reading.read_text``). The per-file workers
+return the encoding with their results, so it is kept in the scan cache
+with the file's mtime and size and an unchanged file is not sniffed again.
+"""
+import codecs
+import re
+import time
+
+from toolbox.perf import current_metrics
+
+ASCII = "ascii"
+UTF8 = "utf-8"
+UTF8_SIG = "utf-8-sig"
+CP1252 = "cp1252"
+LATIN1 = "latin-1"
+
+SNIFF_CHUNK = 1 << 20
+
+_CP1252_UNDEFINED = re.compile(rb"[\x81\x8d\x8f\x90\x9d]")
+
+
+class Sniffer:
+    """Fed a file's bytes in order, chunk by chunk; ``encoding`` is then the encoding to read it in."""
+
+    def __init__(self):
+        self._started = False
+        self._ascii = True
+        self._bom = False
+        self._utf8 = codecs.getincrementaldecoder(UTF8)()
+        self._valid_utf8 = True
+        self._undefined = False
+
+    def feed(self, chunk):
+        if not self._started:
+            self._started = bool(chunk)
+            self._bom = chunk.startswith(codecs.BOM_UTF8)
+        if chunk.isascii():
+            return
+        self._ascii = False
+        if self._valid_utf8:
+            try:
+                self._utf8.decode(chunk)
+            except UnicodeDecodeError:
+                self._valid_utf8 = False
+        if not self._undefined:
+            self._undefined = _CP1252_UNDEFINED.search(chunk) is not None
+
+    @property
+    def encoding(self):
+        if self._ascii:
+            return ASCII
+        if self._valid_utf8:
+            try:
+                # A character cut off by the end of the file is not UTF-8
+                self._utf8.decode(b"", final=True)
+            except UnicodeDecodeError:
+                self._valid_utf8 = False
+            else:
+                return UTF8_SIG if self._bom else UTF8
+        return LATIN1 if self._undefined else CP1252
+
+
+def sniff_bytes(buf):
+    """Encoding of ``buf`` (``bytes`` or an ``mmap``), sniffed chunk by chunk."""
+    start = time.perf_counter()
+    sniffer = Sniffer()
+    for offset in range(0, len(buf), SNIFF_CHUNK):
+        sniffer.feed(buf[offset:offset + SNIFF_CHUNK])
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.add_seconds("sniff", time.perf_counter() - start)
+    return sniffer.encoding
+
+
+def sniff_file(file_path):
+    """``(encoding, data)`` of ``file_path``; ``data`` is its content if it fit in one chunk, else None."""
+    sniffer = Sniffer()
+    read_seconds = sniff_seconds = 0.0
+    first, chunks = b"", 0
+    with open(file_path, "rb") as f:
+        while True:
+            start = time.perf_counter()
+            chunk = f.read(SNIFF_CHUNK)
+            read = time.perf_counter()
+            read_seconds += read - start
+            if not chunk:
+                break
+            sniffer.feed(chunk)
+            sniff_seconds += time.perf_counter() - read
+            chunks += 1
+            if chunks == 1:
+                first = chunk
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.add_seconds("read", read_seconds)
+        metrics.add_seconds("sniff", sniff_seconds)
+    return sniffer.encoding, first if chunks <= 1 else None
+
+
+def decode_guess(raw):
+    """A few bytes with no file encoding to go by (a log field), decoded as ``sniff_bytes`` would read them."""
+    if raw.isascii():
+        return raw.decode(ASCII)
+    sniffer = Sniffer()
+    sniffer.feed(raw)
+    return raw.decode(sniffer.encoding, errors="replace")
+
+
+def write_encoding(encoding):
+    """Encoding to write a file back in: an ASCII file may gain other characters, so it is written as UTF-8."""
+    return UTF8 if encoding == ASCII else encoding
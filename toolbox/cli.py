@@ -0,0 +1,231 @@
+"""Command line for the toolbox tasks, for cron and CI batch runs.
+
+Each subcommand runs the ``toolbox.tasks`` engine of the Streamlit task with
+the same name and writes its report, without starting a web server::
+
+    python -m toolbox search /studies/3001/programs --terms dmc4,dev -o hits.xlsx
+    python -m toolbox search /studies/3001/programs --terms 're:dmc[0-9]+' --terms word:dev
+    python -m toolbox hardcoding /studies/3001/programs --rules study_rules.yaml --format csv
+    python -m toolbox all /studies/3001/programs --macros /studies/3001/macros --logs /studies/3001/logs
+    python -m toolbox macro-usage '/studies/*/*/programs' --macros /standards/macros -o usage.xlsx
+
+Only argparse and a few constants are imported up front; pandas, openpyxl
+and the scan engines are imported once a task runs, so ``--help`` is quick.
+"""
+import argparse
+import os
+import sys
+
+from toolbox.cache import DEFAULT_CACHE_PATH
+from toolbox.discovery import DEFAULT_MANIFEST_DIR, parse_patterns
+from toolbox.matching import MATCHER_ENGINES
+from toolbox.parallel import EXECUTORS, default_workers
+from toolbox.perf import format_performance
+from toolbox.reports import REPORT_FORMATS
+from toolbox.trigram import DEFAULT_INDEX_PATH
+
+
+def _program_inputs(args):
+    return {"program_dir": args.program_dir}
+
+
+def _macro_usage_inputs(args):
+    return {"program_dir": args.program_dir, "macro_dir": args.macros}
+
+
+def _search_inputs(args):
+    return {"program_dir": args.program_dir, "terms_text": "\n".join(args.terms), "matcher_engine": args.engine,
+            "use_mmap": args.mmap, "code_only": args.code_only, "index_path": args.index or ""}
+
+
+def _replace_inputs(args):
+    return {"program_dir": args.program_dir, "terms_text": "\n".join(args.replace), "dry_run": args.dry_run}
+
+
+def _hardcoding_inputs(args):
+    return {"program_dir": args.program_dir, "rules_path": args.rules or "",
+            "include_default_rules": not args.no_default_rules}
+
+
+def _logs_inputs(args):
+    from toolbox.logs import IO_BOUND_RATIO
+    return {"log_dir": args.log_dir, "threshold": args.threshold, "top_n": args.top_n,
+            "io_ratio": args.io_ratio or IO_BOUND_RATIO}
+
+
+def _realtime_inputs(args):
+    return {"log_dir": args.log_dir, "use_mmap": args.mmap}
+
+
+def _dependencies_inputs(args):
+    return {"program_dir": args.program_dir, "query": args.query, "use_saved_graph": args.saved}
+
+
+def _all_inputs(args):
+    return {"program_dir": args.program_dir, "macro_dir": args.macros or "", "log_dir": args.logs or "",
+            "terms_text": "\n".join(args.terms or []), "matcher_engine": args.engine, "code_only": args.code_only,
+            "hardcoding": not args.no_hardcoding, "rules_path": args.rules or "",
+            "include_default_rules": not args.no_default_rules, "dependencies": not args.no_dependencies,
+            "threshold": args.threshold}
+
+
+def _bundle_inputs(args):
+    return {"toc_path": args.toc_path, "pdf_dir": args.pdf_dir or "", "bundle_name": args.name, "dry_run": args.dry_run}
+
+
+TERMS_HELP = ("comma-separated terms, case-insensitive; a value starting word:, re: or glob: is one whole-word, "
+              "regex or wildcard term; repeat for more")
+FOLDER_HELP = {"program_dir": "folders of SAS programs, or globs of them ('/studies/*/dmc5/programs'); several are "
+                              "scanned side by side into one report with a Study/Cut column",
+               "log_dir": "folders of SAS logs, or globs of them; several are scanned side by side",
+               "toc_path": "TOC RTF; the RTFs it lists are read from its folder"}
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    output = common.add_argument_group("output and scanning")
+    output.add_argument("-o", "--output", help="report path (default: report_<task>_<timestamp> in this folder)")
+    output.add_argument("--format", choices=list(REPORT_FORMATS), default="xlsx", help="report format")
+    output.add_argument("--workers", type=int, default=default_workers(), help="worker count")
+    output.add_argument("--executor", choices=EXECUTORS, default="process",
+                        help="processes for regex-heavy scans, threads for slow network shares")
+    output.add_argument("--root-workers", type=int, metavar="N",
+                        help="with several folders, workers of each folder's own pool (default: --workers shared out)")
+    output.add_argument("--exclude", default="", help="comma-separated globs of folders/files to skip")
+    output.add_argument("--include", default="", help="comma-separated globs; only matching files are read")
+    output.add_argument("--manifest", nargs="?", const=DEFAULT_MANIFEST_DIR, metavar="DIR",
+                        help="remember folder listings between runs (in DIR, default %(const)s)")
+    output.add_argument("--no-cache", action="store_true", help="re-read every file instead of reusing results")
+    output.add_argument("--cache", default=DEFAULT_CACHE_PATH, metavar="FILE", help="scan cache file")
+    output.add_argument("--verify-hash", action="store_true", help="verify cached files by content hash")
+    output.add_argument("--perf", action="store_true",
+                        help="time each phase and count files, bytes, lines and matches; printed and, for xlsx, "
+                             "added as a Performance sheet")
+    output.add_argument("--profile", action="store_true", help="--perf plus a cProfile of the main thread (slower)")
+    output.add_argument("--trace-memory", action="store_true",
+                        help="--perf plus a tracemalloc allocation trace (slower)")
+
+    parser = argparse.ArgumentParser(prog="python -m toolbox",
+                                     description="Run the Programmers Toolbox checks without the web app.")
+    subparsers = parser.add_subparsers(title="tasks", metavar="TASK", required=True)
+
+    def task_parser(name, task, inputs, help_text, folder="program_dir"):
+        sub = subparsers.add_parser(name, parents=[common], help=help_text, description=help_text)
+        sub.add_argument(folder, nargs=1 if folder == "toc_path" else "+", help=FOLDER_HELP[folder])
+        sub.set_defaults(task=task, inputs=inputs, folder=folder)
+        return sub
+
+    sub = task_parser("macro-usage", "Macro Usage Check", _macro_usage_inputs,
+                      "Which macros of a macro library the programs call.")
+    sub.add_argument("--macros", required=True, metavar="DIR", help="macro library folder")
+
+    sub = task_parser("search", "Search for Terms", _search_inputs, "Find terms in every program.")
+    sub.add_argument("--terms", action="append", required=True, help=TERMS_HELP)
+    sub.add_argument("--engine", choices=list(MATCHER_ENGINES), default="regex", help="matcher engine")
+    sub.add_argument("--mmap", action="store_true", help="memory-mapped fast path for large trees")
+    sub.add_argument("--code-only", action="store_true", help="ignore matches inside comments")
+    sub.add_argument("--index", nargs="?", const=DEFAULT_INDEX_PATH, metavar="FILE",
+                     help="read only the files a trigram index cannot rule out, updating it first "
+                          "(in FILE, default %(const)s)")
+
+    sub = task_parser("replace", "Search and Replace Terms", _replace_inputs,
+                      "Replace terms in every program (case-insensitive search).")
+    sub.add_argument("--replace", action="append", required=True, metavar="SEARCH:REPLACE",
+                     help="one search:replace pair, or 'search => replace' when the term has a colon; terms take the "
+                          "--terms prefixes and a re: replacement can use \\1; repeat for more")
+    sub.add_argument("--dry-run", action="store_true", help="write a patch instead of changing files")
+
+    sub = task_parser("hardcoding", "Hardcoding Check", _hardcoding_inputs,
+                      "Hardcoded values and suspected macro variable misuse.")
+    sub.add_argument("--rules", metavar="FILE", help="study-specific rules (JSON or YAML)")
+    sub.add_argument("--no-default-rules", action="store_true", help="use only the rules in --rules")
+
+    sub = task_parser("logs", "Log Runtime Check", _logs_inputs,
+                      "Step-level runtime profile of every log.", folder="log_dir")
+    sub.add_argument("--threshold", type=float, default=5.0, help="flag steps slower than this many seconds")
+    sub.add_argument("--top-n", type=int, default=25, help="slowest steps to list")
+    sub.add_argument("--io-ratio", type=float, help="flag as I/O bound when real time exceeds cpu time by this")
+
+    sub = task_parser("realtime", "Real Time Report", _realtime_inputs,
+                      "'real time' summary and details of every log, with log snippets.", folder="log_dir")
+    sub.add_argument("--mmap", action="store_true", help="memory-mapped fast path for large logs")
+
+    sub = task_parser("dependencies", "Dependency Graph", _dependencies_inputs,
+                      "Macro, %%include and dataset dependencies between programs.")
+    sub.add_argument("--query", default="", help="who uses / what must rerun if this macro, dataset or program changes")
+    sub.add_argument("--saved", action="store_true", help="query the saved graph without rescanning")
+
+    sub = task_parser("all", "Run All Checks", _all_inputs,
+                      "Every check in one pass over the programs, in one report.")
+    sub.add_argument("--macros", metavar="DIR", help="macro library folder; enables the macro usage check")
+    sub.add_argument("--logs", metavar="DIR", help="log folder, or several separated by ';' or a glob; enables the log "
+                                                   "runtime check")
+    sub.add_argument("--terms", action="append", help=TERMS_HELP + "; enables the term search")
+    sub.add_argument("--engine", choices=list(MATCHER_ENGINES), default="regex", help="matcher engine")
+    sub.add_argument("--code-only", action="store_true", help="ignore term matches inside comments")
+    sub.add_argument("--rules", metavar="FILE", help="study-specific hardcoding rules (JSON or YAML)")
+    sub.add_argument("--no-default-rules", action="store_true", help="use only the rules in --rules")
+    sub.add_argument("--no-hardcoding", action="store_true", help="skip the hardcoding check")
+    sub.add_argument("--no-dependencies", action="store_true", help="skip the dependency listing")
+    sub.add_argument("--threshold", type=float, default=5.0, help="flag log steps slower than this many seconds")
+
+    sub = task_parser("bundle", "RTF to PDF Bundle", _bundle_inputs,
+                      "Convert the RTFs listed in a TOC to PDF with LibreOffice (--workers at a time) and merge them "
+                      "into one bookmarked PDF.", folder="toc_path")
+    sub.add_argument("--pdf-dir", metavar="DIR", help="folder for the PDFs and the bundle (default: the TOC's folder)")
+    sub.add_argument("--name", default="bundle.pdf", help="file name of the merged bundle")
+    sub.add_argument("--dry-run", action="store_true", help="list what would be converted without converting")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Several program or log folders travel as one root list, as typed into the app
+    setattr(args, args.folder, "\n".join(getattr(args, args.folder)))
+    macros = getattr(args, "macros", None)
+    if macros and not os.path.isdir(macros):
+        parser.error(f"not a folder: {macros}")
+
+    # Imported here so --help does not load pandas and the scan engines
+    from toolbox.tasks import check_inputs, run_task
+
+    inputs = args.inputs(args)
+    inputs["root_workers"] = args.root_workers
+    if inputs.get("rules_path") and not os.path.isfile(inputs["rules_path"]):
+        parser.error(f"rules file not found: {inputs['rules_path']}")
+    try:
+        check_inputs(args.task, inputs)
+    except ValueError as e:
+        parser.error(str(e))
+    cache_settings = None if args.no_cache else {"db_path": args.cache, "use_hash": args.verify_hash}
+    discovery_settings = {"exclude": parse_patterns(args.exclude), "include": parse_patterns(args.include),
+                          "manifest_dir": args.manifest}
+    perf_settings = None
+    if args.perf or args.profile or args.trace_memory:
+        perf_settings = {"profile": args.profile, "trace_memory": args.trace_memory}
+    output_path = args.output and os.path.splitext(args.output)[0] + f".{args.format}"
+    result = run_task(args.task, inputs, args.format, args.workers, args.executor, cache_settings,
+                      discovery_settings, output_path, perf_settings)
+
+    if result.get("cache_stats"):
+        stats = result["cache_stats"]
+        print(f"Scan cache: {stats['hits']} files reused, {stats['rescanned']} re-scanned", file=sys.stderr)
+    if result.get("index_stats"):
+        stats = result["index_stats"]
+        print(f"Trigram index: {stats['candidates']} of {stats['files']} files searched, {stats['indexed']} re-indexed",
+              file=sys.stderr)
+    for name, count in result["row_counts"].items():
+        print(f"{name}: {count} rows")
+    if result.get("output_path"):
+        print(f"Report written to {result['output_path']}")
+    else:
+        print("No matches found or no data generated.")
+    if result.get("dry_run"):
+        print(f"Dry run: no files were modified. Patch: {result['patch_path']}" if result.get("patch_path")
+              else "Dry run: no files would change.")
+    if result.get("bundle_path"):
+        print(f"Bundle written to {result['bundle_path']} ({result['bundle_pages']} pages)")
+    if result.get("performance"):
+        print(format_performance(result["performance"]), file=sys.stderr)
+    return 0
@@ -0,0 +1,252 @@
+"""Cross-program dependency graph: macros, %include files and datasets.
+
+``program_dependencies`` lexes a program once and records, with the first
+line each appears on, which macros it calls and defines, which files it
+``%include``\\ s, and which datasets it reads (SET/MERGE/UPDATE/MODIFY, PROC
+``data=``, SQL FROM/JOIN) and writes (DATA, PROC ``out=``, SQL CREATE
+TABLE/VIEW and INSERT INTO). Dataset names are lower-cased and one-level
+names are qualified with ``work.``.
+
+``DependencyGraph`` keeps the edges of every scanned tree in a small SQLite
+index, so "who uses X" and "what must rerun if X changes" are indexed
+lookups rather than a rescan of the tree.
+"""
+import os
+import re
+import sqlite3
+from collections import deque
+
+from toolbox.lexer import iter_lexed
+from toolbox.macros import line_macro_calls
+from toolbox.reading import iter_lines
+
+DEFAULT_GRAPH_PATH = os.path.join(os.path.expanduser("~"), ".programmers_toolbox", "dependency_graph.sqlite3")
+
+MACRO = "macro"
+DEFINES = "defines"
+INCLUDE = "include"
+READS = "reads"
+WRITES = "writes"
+EDGE_KINDS = (MACRO, DEFINES, INCLUDE, READS, WRITES)
+# Edges through which a change to the target reaches the program
+USE_KINDS = (MACRO, INCLUDE, READS)
+
+# Macro statements and functions that look like calls but are part of the language
+MACRO_KEYWORDS = frozenset("""
+    abort bquote by cmpres compstor copy datatyp display do else end eval global goto if include inc index
+    input keydef label left length let local lowcase macro mend nrbquote nrquote nrstr put qcmpres qleft
+    qlowcase qscan qsubstr qsysfunc qtrim quote qupcase return scan substr superq symdel symexist symglobl
+    symlocal syscall sysevalf sysexec sysfunc sysget syslput sysmacdelete sysmstoresearch sysprod sysrput
+    then to trim unquote until upcase verify while window
+""".split())
+
+# Names SAS reserves for "no dataset" or "the last dataset"
+SPECIAL_DATASETS = {"_null_", "_data_", "_last_"}
+
+_FIRST_WORDS_RE = re.compile(r"\s*(%?[A-Za-z_][A-Za-z0-9_]*)(?:\s+([A-Za-z_][A-Za-z0-9_]*))?")
+_OPTIONS_RE = re.compile(r"\([^()]*\)")
+_ASSIGNMENT_RE = re.compile(r"""\b\w+\s*=\s*(?:'[^']*'|"[^"]*"|\S+)""")
+_DATASET_RE = re.compile(r"[A-Za-z_&][\w&]*(?:\.+[A-Za-z_&][\w&]*)?$")
+_QUOTED_RE = re.compile(r"""'([^']*)'|"([^"]*)\"""")
+_PROC_DATA_RE = re.compile(r"\bdata\s*=\s*([A-Za-z_&][\w&.]*)", re.IGNORECASE)
+_PROC_OUT_RE = re.compile(r"\bout\s*=\s*([A-Za-z_&][\w&.]*)", re.IGNORECASE)
+_SQL_WRITE_RE = re.compile(r"\b(?:create\s+(?:table|view)|insert\s+into)\s+([A-Za-z_&][\w&.]*)", re.IGNORECASE)
+_SQL_READ_RE = re.compile(r"\b(?:from|join)\s+([A-Za-z_&][\w&.]*)", re.IGNORECASE)
+
+
+def normalize_dataset(name):
+    """Lower-case ``name`` and qualify a one-level name with ``work.``; None for special names."""
+    name = name.strip().rstrip(".").lower()
+    if not name or name in SPECIAL_DATASETS:
+        return None
+    return name if "." in name else f"work.{name}"
+
+
+def dataset_list(text):
+    """Dataset names in the body of a DATA/SET/MERGE-style statement, options removed."""
+    previous = None
+    while previous != text:
+        # Innermost parentheses first, so nested dataset options go too
+        previous, text = text, _OPTIONS_RE.sub(" ", text)
+    text = _ASSIGNMENT_RE.sub(" ", text.split("/")[0])
+    names = (normalize_dataset(token) for token in text.split() if _DATASET_RE.match(token))
+    return [name for name in names if name]
+
+
+def include_targets(text):
+    """File names (lower-cased base names) or filerefs named by a ``%include`` statement."""
+    targets = [os.path.basename((sq or dq).replace("\\", "/")).lower() for sq, dq in _QUOTED_RE.findall(text)]
+    bare = _QUOTED_RE.sub(" ", text).split("/")[0]
+    targets.extend(token.lower() for token in bare.split() if re.fullmatch(r"[A-Za-z_]\w*", token))
+    return [target for target in targets if target]
+
+
+class DependencyCollector:
+    """Collects the edges of one program from its lexed lines, fed in order."""
+
+    def __init__(self):
+        self._edges = {}
+        self._in_sql = False
+
+    def _add(self, kind, targets, line_num):
+        for target in targets:
+            self._edges.setdefault((kind, target), line_num)
+
+    def feed(self, line_num, line, segments, statements):
+        """Take one line from ``toolbox.lexer.iter_lexed``."""
+        add = self._add
+        add(MACRO, (name for name in line_macro_calls(line, segments) if name not in MACRO_KEYWORDS), line_num)
+
+        for statement in statements:
+            text = statement.normalized().rstrip(";").rstrip()
+            m = _FIRST_WORDS_RE.match(text)
+            if m is None:
+                continue
+            keyword, second = m.group(1).lower(), (m.group(2) or "").lower()
+            rest = text[m.end(1):]
+            start = statement.start_line
+
+            if keyword in ("data", "proc", "quit", "run"):
+                self._in_sql = keyword == "proc" and second == "sql"
+            if keyword == "data" and not rest.lstrip().startswith("="):
+                add(WRITES, dataset_list(rest), start)
+            elif keyword in ("set", "merge", "update", "modify"):
+                add(READS, dataset_list(rest), start)
+            elif keyword == "proc":
+                add(READS, filter(None, map(normalize_dataset, _PROC_DATA_RE.findall(rest))), start)
+                add(WRITES, filter(None, map(normalize_dataset, _PROC_OUT_RE.findall(rest))), start)
+            elif keyword in ("%include", "%inc"):
+                add(INCLUDE, include_targets(rest), start)
+            elif keyword == "%macro" and second:
+                add(DEFINES, [second], start)
+            elif self._in_sql:
+                add(WRITES, filter(None, map(normalize_dataset, _SQL_WRITE_RE.findall(text))), start)
+                add(READS, filter(None, map(normalize_dataset, _SQL_READ_RE.findall(text))), start)
+
+    def edges(self):
+        """``[(kind, target, first_line), ...]`` in order of first appearance."""
+        return [(kind, target, line_num) for (kind, target), line_num in self._edges.items()]
+
+
+def program_dependencies(file_path):
+    """Return ``[(kind, target, first_line), ...]`` for one program, in order of first appearance."""
+    collector = DependencyCollector()
+    for lexed in iter_lexed(iter_lines(file_path)):
+        collector.feed(*lexed)
+    return collector.edges()
+
+
+def _candidates(name):
+    """Targets a user-typed name can refer to: as typed, as a file base name, and with ``.sas``."""
+    name = name.strip().lower()
+    base = os.path.basename(name.replace("\\", "/"))
+    candidates = {name, base}
+    if not base.endswith(".sas"):
+        candidates.add(f"{base}.sas")
+    return candidates
+
+
+class DependencyGraph:
+    """SQLite-backed edge index for one or more scanned trees (keyed by root folder)."""
+
+    def __init__(self, db_path=DEFAULT_GRAPH_PATH):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Two Dependency Graph runs may save at once; the second waits for the first
+        self._conn = sqlite3.connect(db_path, timeout=300)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS edges (
+                   root TEXT NOT NULL,
+                   program TEXT NOT NULL,
+                   kind TEXT NOT NULL,
+                   target TEXT NOT NULL,
+                   line INTEGER NOT NULL
+               );
+               CREATE INDEX IF NOT EXISTS edges_by_target ON edges (root, target, kind);
+               CREATE INDEX IF NOT EXISTS edges_by_program ON edges (root, program);"""
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _root(root):
+        return os.path.abspath(root)
+
+    def replace(self, root, programs):
+        """Replace the graph of ``root`` with ``programs``: ``(program, [(kind, target, line), ...])`` pairs."""
+        root = self._root(root)
+        # ``programs`` may drive the whole scan: collect it first, so the write lock is only held to save it
+        rows = [(root, program, kind, target, line) for program, edges in programs for kind, target, line in edges]
+        with self._conn:
+            self._conn.execute("DELETE FROM edges WHERE root = ?", (root,))
+            self._conn.executemany("INSERT INTO edges VALUES (?, ?, ?, ?, ?)", rows)
+
+    def has_root(self, root):
+        return self._conn.execute("SELECT 1 FROM edges WHERE root = ? LIMIT 1", (self._root(root),)).fetchone() is not None
+
+    def edges(self, root):
+        """Every ``(program, kind, target, line)`` of ``root``, by program."""
+        return self._conn.execute(
+            "SELECT program, kind, target, line FROM edges WHERE root = ? ORDER BY program, kind, line",
+            (self._root(root),),
+        ).fetchall()
+
+    def users(self, root, name, kinds=USE_KINDS):
+        """``(program, kind, target, line)`` for every program that calls, includes or reads ``name``."""
+        candidates = sorted(_candidates(name))
+        return self._conn.execute(
+            f"SELECT program, kind, target, line FROM edges WHERE root = ? "
+            f"AND target IN ({', '.join('?' * len(candidates))}) AND kind IN ({', '.join('?' * len(kinds))}) "
+            f"ORDER BY program, line",
+            (self._root(root), *candidates, *kinds),
+        ).fetchall()
+
+    def must_rerun(self, root, name):
+        """Programs affected by a change to ``name``, nearest first.
+
+        Returns ``(program, depth, reason)``. A program is affected when it
+        uses ``name`` or a permanent (non-WORK) dataset written by an affected
+        program, or includes an affected program. Depth 0 is the changed
+        program itself, when ``name`` is one.
+        """
+        root = self._root(root)
+        affected = {}
+        queue = deque()
+
+        def affect(program, depth, reason):
+            if program in affected:
+                return
+            affected[program] = (depth, reason)
+            outputs = self._conn.execute(
+                "SELECT target FROM edges WHERE root = ? AND program = ? AND kind = ?", (root, program, WRITES)
+            ).fetchall()
+            for (dataset,) in outputs:
+                if not dataset.startswith("work."):
+                    queue.append((dataset, depth + 1))
+            queue.append((os.path.basename(program).lower(), depth + 1))
+
+        candidates = _candidates(name)
+        for (program,) in self._conn.execute("SELECT DISTINCT program FROM edges WHERE root = ?", (root,)):
+            if os.path.basename(program).lower() in candidates:
+                affect(program, 0, "changed")
+        queue.append((name, 1))
+
+        seen = set()
+        while queue:
+            target, depth = queue.popleft()
+            if target in seen:
+                continue
+            seen.add(target)
+            for program, kind, matched, _ in self.users(root, target):
+                affect(program, depth, f"{kind} {matched}")
+        return sorted(((program, depth, reason) for program, (depth, reason) in affected.items()),
+                      key=lambda row: (row[1], row[0]))
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,166 @@
+"""Shared file discovery for every task: one concurrent walk per tree.
+
+``FileDiscovery`` lists a tree with ``os.scandir``, handing each
+subdirectory to a small thread pool as soon as its parent has been read, so
+the round trips of a slow network share overlap instead of queueing one
+after another. The listing of each root is kept on the instance; every task
+run with the same ``FileDiscovery`` reuses it, so a run that executes
+several checks enumerates the tree once.
+
+Exclude patterns prune folders and files while walking; include patterns
+only filter files. A pattern without ``/`` matches a file or folder name
+(``qc``, ``old*``, ``*_bak.sas``); a pattern with ``/`` matches the path
+relative to the root (``archive/*``). Patterns and extensions are matched
+case-insensitively.
+
+With a ``manifest_dir`` the listing is also saved to disk. The next walk
+stats each known folder and only lists again the folders whose mtime has
+changed (a file or folder was added, removed or renamed in it).
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from toolbox import perf
+
+DEFAULT_MANIFEST_DIR = os.path.join(os.path.expanduser("~"), ".programmers_toolbox", "manifests")
+
+# Folder listings are latency-bound, so more threads than cores pays off on a share
+DEFAULT_LIST_WORKERS = 16
+
+MANIFEST_VERSION = 1
+
+
+def parse_patterns(text):
+    """Split comma- or newline-separated glob patterns typed into a form."""
+    return [p.strip().replace("\\", "/") for p in text.replace("\n", ",").split(",") if p.strip()]
+
+
+def _matches(patterns, name, rel_path):
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(rel_path if "/" in pattern else name, pattern):
+            return True
+    return False
+
+
+class FileDiscovery:
+    """Concurrent, memoized tree listing with include/exclude globs."""
+
+    def __init__(self, exclude=(), include=(), workers=DEFAULT_LIST_WORKERS, manifest_dir=None):
+        self.exclude = [p.lower() for p in exclude]
+        self.include = [p.lower() for p in include]
+        self.workers = max(1, workers or 1)
+        self.manifest_dir = manifest_dir
+        # (folder, error) for every folder that could not be listed
+        self.errors = []
+        self.walks = 0
+        self.reused_dirs = 0
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def _excluded(self, name, rel_path):
+        return _matches(self.exclude, name.lower(), rel_path.lower())
+
+    def _list_dir(self, root, rel_dir, previous):
+        """Return ``(rel_dir, [mtime_ns, files, subdirs])``, reusing ``previous`` while the folder is unchanged."""
+        path = os.path.join(root, rel_dir) if rel_dir else root
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns if self.manifest_dir else None
+            if previous is not None and previous[0] == mtime_ns:
+                with self._lock:
+                    self.reused_dirs += 1
+                return rel_dir, previous
+            files, subdirs = [], []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if self._excluded(entry.name, rel_path):
+                        continue
+                    # Symlinked folders are not followed, as with os.walk
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+        except OSError as e:
+            with self._lock:
+                self.errors.append((path, e))
+            return rel_dir, None
+        return rel_dir, [mtime_ns, sorted(files), sorted(subdirs)]
+
+    def _manifest_path(self, root):
+        key = hashlib.sha1(repr((MANIFEST_VERSION, root, self.exclude)).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.manifest_dir, f"{key}.json")
+
+    def _load_manifest(self, root):
+        try:
+            with open(self._manifest_path(root), "r", encoding="utf-8") as f:
+                return json.load(f)["dirs"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save_manifest(self, root, listing):
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        path = self._manifest_path(root)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"root": root, "exclude": self.exclude, "dirs": listing}, f)
+        os.replace(tmp_path, path)
+
+    def _walk(self, root):
+        previous = self._load_manifest(root) if self.manifest_dir else {}
+        listing = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="toolbox-list") as pool:
+            pending = {pool.submit(self._list_dir, root, "", previous.get(""))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rel_dir, entry = future.result()
+                    if entry is None:
+                        continue
+                    listing[rel_dir] = entry
+                    for name in entry[2]:
+                        child = f"{rel_dir}/{name}" if rel_dir else name
+                        pending.add(pool.submit(self._list_dir, root, child, previous.get(child)))
+        self.walks += 1
+        if self.manifest_dir and listing:
+            self._save_manifest(root, listing)
+        return listing
+
+    def listing(self, root):
+        """``{relative folder: [mtime_ns, files, subfolders]}`` for ``root``, walked once per instance."""
+        root = os.path.abspath(root)
+        with self._lock:
+            listing = self._listings.get(root)
+        if listing is None:
+            listing = self._walk(root)
+            with self._lock:
+                listing = self._listings.setdefault(root, listing)
+        return listing
+
+    def files(self, root, extensions=(".sas",), recursive=True):
+        """Sorted paths under ``root`` with one of ``extensions`` (any case) that pass the include patterns."""
+        if not root:
+            return []
+        with perf.phase("walk"):
+            extensions = tuple(ext.lower() for ext in extensions)
+            if recursive:
+                listing = self.listing(root)
+            else:
+                # A single folder: not worth a pool, a manifest or a place in the memo
+                rel_dir, entry = self._list_dir(os.path.abspath(root), "", None)
+                listing = {rel_dir: entry} if entry is not None else {}
+
+            paths = []
+            for rel_dir, (_, names, _) in listing.items():
+                folder = os.path.join(root, rel_dir) if rel_dir else root
+                for name in names:
+                    lower = name.lower()
+                    if not lower.endswith(extensions):
+                        continue
+                    if self.include and not _matches(self.include, lower, f"{rel_dir}/{lower}".lower().lstrip("/")):
+                        continue
+                    paths.append(os.path.join(folder, name))
+            return sorted(paths)
@@ -0,0 +1,98 @@
+"""Memory-mapped, bytes-level fast path for very large trees and logs.
+
+The file is mapped rather than read, a compiled ``bytes`` regex runs over the
+whole buffer in C, and line numbers are recovered by counting newlines
+between hits. Only lines that actually match are decoded, in the encoding
+sniffed from the buffer, so the per-byte cost of decoding and Python line
+loops disappears for non-matching text.
+
+Results are identical to the text readers in ``toolbox.reading``. Files
+whose line breaks the text readers would treat differently (a bare ``\\r``)
+are reported as unsupported so callers can fall back to the text path.
+"""
+import mmap
+import re
+from contextlib import contextmanager
+
+
+@contextmanager
+def mapped(file_path):
+    """Yield a read-only ``mmap`` of the file (``b""`` for empty files)."""
+    with open(file_path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            yield b""
+            return
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+
+_BARE_CR_RE = re.compile(rb"\r(?!\n)")
+
+# mmap objects have no count(); newlines are counted over slices of this size
+_COUNT_CHUNK = 16 * 1024 * 1024
+
+
+def supports_fast_path(buf):
+    """True when every ``\\r`` in ``buf`` is part of a ``\\r\\n`` pair."""
+    return _BARE_CR_RE.search(buf) is None
+
+
+def count_newlines(buf, start, end):
+    count = 0
+    for chunk_start in range(start, end, _COUNT_CHUNK):
+        count += buf[chunk_start:min(end, chunk_start + _COUNT_CHUNK)].count(b"\n")
+    return count
+
+
+def compile_bytes_pattern(terms):
+    """Case-insensitive ``bytes`` alternation of ``terms``, or None if any term is non-ASCII."""
+    terms = sorted(set(terms), key=lambda t: (-len(t), t))
+    if not terms or not all(term.isascii() for term in terms):
+        return None
+    return re.compile(b"|".join(re.escape(t.encode("ascii")) for t in terms), re.IGNORECASE)
+
+
+def decode(raw, encoding):
+    """A matched line of a buffer in ``encoding`` (``charsets.sniff_bytes``), as the text readers return it."""
+    return raw.decode(encoding, errors="replace").replace("\r\n", "\n")
+
+
+class LineCounter:
+    """Turns increasing byte offsets into 1-based line numbers by counting newlines."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self._offset = 0
+        self._line = 1
+
+    def line_at(self, offset):
+        if offset < self._offset:
+            raise ValueError("offsets must be non-decreasing")
+        self._line += count_newlines(self.buf, self._offset, offset)
+        self._offset = offset
+        return self._line
+
+
+def line_bounds(buf, start):
+    """Return ``(line_start, line_end)`` of the line containing ``start``; ``line_end`` includes the newline."""
+    line_start = buf.rfind(b"\n", 0, start) + 1
+    newline = buf.find(b"\n", start)
+    return line_start, len(buf) if newline == -1 else newline + 1
+
+
+def iter_matching_lines(buf, pattern):
+    """Yield ``(line_number, line_start, line_end)`` once for each line containing a ``pattern`` hit."""
+    counter = LineCounter(buf)
+    pos = 0
+    while True:
+        match = pattern.search(buf, pos)
+        if match is None:
+            return
+        line_start, line_end = line_bounds(buf, match.start())
+        yield counter.line_at(line_start), line_start, line_end
+        pos = line_end
@@ -0,0 +1,165 @@
+"""Rule registry and compiled rule engine for the hardcoding check.
+
+Each rule is a regex plus a description and severity, optionally with an
+``unless`` regex that suppresses the rule when it also matches. Rules run
+over whole SAS statements from ``toolbox.lexer`` -- comments removed and
+statements split across lines joined -- rather than physical lines.
+A rule may list ``keywords``: literals one of which every match contains
+(case-insensitively). They are a cheap prefilter -- a statement is lower-cased
+once, each rule's keywords are found with one scan of it (a precompiled
+alternation of the escaped literals), and the rule's regex only runs when one
+is there. A rule without keywords is always run. Keywords should be as
+specific as the pattern allows: a rule whose only keyword is a character most
+statements contain gains nothing and is better left without.
+
+Study-specific rules can be loaded from a JSON or YAML file (YAML needs
+PyYAML), either as a list of rules or as ``{"rules": [...]}``::
+
+    [{"name": "cutoff_date", "pattern": "cutoff\\\\s*=\\\\s*'\\\\d", "description": "Hardcoded cutoff",
+      "severity": "High", "keywords": ["cutoff"]}]
+"""
+import json
+import os
+import re
+
+from toolbox.lexer import iter_statements
+from toolbox.reading import read_text
+
+SEVERITIES = ("High", "Medium", "Low")
+
+DEFAULT_RULES = [
+    {"name": "condition_value", "pattern": r"\b(where|if|when)\b\s+.*?=\s*['\"0-9]",
+     "description": "Hardcoded value in condition", "severity": "High",
+     "keywords": ["where", "if", "when"]},
+    {"name": "set_merge_literal", "pattern": r"\b(set|merge)\b\s+[^;]*['\"0-9]",
+     "description": "Hardcoded dataset or literal in SET/MERGE", "severity": "High",
+     "keywords": ["set", "merge"]},
+    {"name": "put_value", "pattern": r"\bput\s+['\"0-9]",
+     "description": "Hardcoded value in PUT statement", "severity": "High",
+     "keywords": ["put"]},
+    # No keywords: the only literal every match has is a quote, and the regex finds that as fast
+    {"name": "string_literal", "pattern": r"['\"][A-Za-z0-9 _/-]{2,}['\"]",
+     "description": "Constant string literal", "severity": "Medium"},
+    {"name": "date_literal", "pattern": r"\d{4}-\d{2}-\d{2}",
+     "description": "Hardcoded date", "severity": "High",
+     "keywords": [f"-{digit}" for digit in range(10)]},
+    {"name": "select_literal", "pattern": r"\bselect\b\s+[^;]*['\"0-9]",
+     "description": "Hardcoded SELECT clause", "severity": "High",
+     "keywords": ["select"]},
+    # Terms that are usually parameterised via macro variables, on a line that uses none
+    {"name": "macro_variable_misuse", "pattern": r"(?<!&)\b(study|site|visit|dose|group|arm|treatment)\b",
+     "unless": r"&\w+", "description": "Possible macro variable misuse", "severity": "Low",
+     "keywords": ["study", "site", "visit", "dose", "group", "arm", "treatment"]},
+]
+
+
+class Rule:
+    def __init__(self, name, pattern, description, severity, unless=None, ignore_case=True, keywords=()):
+        if severity not in SEVERITIES:
+            raise ValueError(f"Rule {name!r}: severity must be one of {', '.join(SEVERITIES)}, not {severity!r}")
+        flags = re.IGNORECASE if ignore_case else 0
+        try:
+            self.regex = re.compile(pattern, flags)
+            self.unless = re.compile(unless, flags) if unless else None
+        except re.error as e:
+            raise ValueError(f"Rule {name!r}: invalid pattern: {e}") from None
+        if isinstance(keywords, str) or not all(isinstance(k, str) and k for k in keywords):
+            raise ValueError(f"Rule {name!r}: keywords must be a list of non-empty strings")
+        self.name = name
+        self.pattern = pattern
+        self.keywords = tuple(k.lower() for k in keywords)
+        # Longest first, so a keyword that starts another is not matched in its place
+        self._keyword_search = re.compile("|".join(
+            re.escape(k) for k in sorted(set(self.keywords), key=len, reverse=True)
+        )).search if self.keywords else None
+        self.description = description
+        self.severity = severity
+        self.ignore_case = ignore_case
+
+    @classmethod
+    def from_dict(cls, spec):
+        missing = {"name", "pattern", "description", "severity"} - set(spec)
+        if missing:
+            raise ValueError(f"Rule {spec.get('name', spec)!r} is missing {', '.join(sorted(missing))}")
+        return cls(spec["name"], spec["pattern"], spec["description"], spec["severity"],
+                   spec.get("unless"), spec.get("ignore_case", True), spec.get("keywords", ()))
+
+    def spec(self):
+        return (self.name, self.pattern, self.unless.pattern if self.unless else None,
+                self.description, self.severity, self.ignore_case, self.keywords)
+
+    def may_match(self, lowered):
+        """False when none of the keywords is in the lower-cased ``lowered``, so the regex cannot match."""
+        return self._keyword_search is None or self._keyword_search(lowered) is not None
+
+    def matches(self, line):
+        return bool(self.regex.search(line)) and not (self.unless and self.unless.search(line))
+
+
+class RuleSet:
+    """Rules compiled once, each behind its keyword prefilter (``prefilter=False`` runs every regex)."""
+
+    def __init__(self, rules, prefilter=True):
+        self.rules = [rule if isinstance(rule, Rule) else Rule.from_dict(rule) for rule in rules]
+        names = [rule.name for rule in self.rules]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate rule names: {', '.join(duplicates)}")
+        self.prefilter = prefilter
+
+    def signature(self):
+        """Hashable description of the rules, for cache namespaces."""
+        return tuple(rule.spec() for rule in self.rules)
+
+    def check_line(self, line):
+        """Return ``[(description, severity), ...]`` for every rule that fires on ``line``."""
+        if not self.prefilter:
+            return [(rule.description, rule.severity) for rule in self.rules if rule.matches(line)]
+        lowered = line.lower()
+        return [(rule.description, rule.severity) for rule in self.rules
+                if rule.may_match(lowered) and rule.matches(line)]
+
+    def scan_lines(self, lines):
+        """Yield ``(line_number, stripped_line, description, severity)`` for raw ``lines``."""
+        for line_num, line in enumerate(lines, start=1):
+            for description, severity in self.check_line(line):
+                yield line_num, line.strip(), description, severity
+
+    def scan_statements(self, lines):
+        """Yield ``(start_line, statement, description, severity)`` for each SAS statement in ``lines``."""
+        for statement in iter_statements(lines):
+            text = statement.normalized()
+            for description, severity in self.check_line(text):
+                yield statement.start_line, text, description, severity
+
+
+def load_rules(path):
+    """Load rule dicts from a JSON or YAML file."""
+    with open(path, "r", encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yml", ".yaml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("YAML rule files require the PyYAML package") from e
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a list of rules or a 'rules' list")
+    return data
+
+
+def build_ruleset(rules_path=None, include_defaults=True):
+    """Default rules, plus (or replaced by) the rules in ``rules_path``."""
+    rules = list(DEFAULT_RULES) if include_defaults else []
+    if rules_path:
+        rules.extend(load_rules(rules_path))
+    return RuleSet(rules)
+
+
+def scan_file(file_path, ruleset):
+    """Return ``(issues, encoding)``, with ``(line_number, statement, description, severity)`` for every issue."""
+    encoding, lines = read_text(file_path)
+    return list(ruleset.scan_statements(lines)), encoding
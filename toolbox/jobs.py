@@ -0,0 +1,183 @@
+"""Background jobs for long-running tasks.
+
+A ``JobRunner`` runs task functions on a small thread pool so the Streamlit
+script can return (and rerun) while a scan is in progress; the scans inside
+a job still fan out over ``toolbox.parallel`` worker processes. Each job
+reports progress as files done out of total and can be cancelled: the next
+progress report raises ``JobCancelled`` inside the job, which stops the scan
+and drops its queued work.
+
+Finished jobs are written to a small JSON job store, so their reports can
+be listed and downloaded again after the page is reopened.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_JOB_STORE = os.path.join(os.path.expanduser("~"), ".programmers_toolbox", "jobs.json")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Messages kept per job, so a tree full of unreadable files cannot grow the store unbounded
+MAX_MESSAGES = 200
+
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def current_job():
+    """The job running on this thread, or None outside a job."""
+    return getattr(_local, "job", None)
+
+
+class Job:
+    def __init__(self, task, description=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.task = task
+        self.description = description
+        self.status = QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.total = 0
+        self.messages = []
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def progress(self, done, total):
+        """Progress hook for ``toolbox.parallel.scan_files``; raises ``JobCancelled`` once cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.done = done
+        self.total = total
+
+    def warn(self, message):
+        if len(self.messages) < MAX_MESSAGES:
+            self.messages.append(message)
+
+    def throughput(self):
+        """Files per second since the job started."""
+        if not self.started or not self.done:
+            return 0.0
+        return self.done / max((self.finished or time.time()) - self.started, 1e-6)
+
+    def to_record(self):
+        result = dict(self.result or {})
+        # Per-file diffs stay in memory; the store keeps the patch file path instead
+        result.pop("diffs", None)
+        return {
+            "id": self.id, "task": self.task, "description": self.description, "status": self.status,
+            "submitted": self.submitted, "started": self.started, "finished": self.finished,
+            "done": self.done, "total": self.total, "messages": self.messages, "result": result,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls(record["task"], record.get("description", ""))
+        for key in ("id", "status", "submitted", "started", "finished", "done", "total", "messages", "result",
+                    "error"):
+            setattr(job, key, record.get(key, getattr(job, key)))
+        return job
+
+
+class JobStore:
+    """Finished jobs, newest first, kept in a JSON file."""
+
+    def __init__(self, path=DEFAULT_JOB_STORE, keep=50):
+        self.path = path
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return [Job.from_record(record) for record in json.load(f)]
+        except (OSError, ValueError):
+            return []
+
+    def save(self, job):
+        with self._lock:
+            records = [j.to_record() for j in self.load() if j.id != job.id]
+            records.insert(0, job.to_record())
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records[:self.keep], f)
+            os.replace(tmp_path, self.path)
+
+
+class JobRunner:
+    """Runs submitted task functions in background threads and tracks them by job id."""
+
+    def __init__(self, store=None, max_jobs=2):
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="toolbox-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, task, func, *args, description=""):
+        """Queue ``func(*args)``; its return value becomes ``job.result``."""
+        job = Job(task, description)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, func, args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = next((j for j in self.store.load() if j.id == job_id), None)
+        return job
+
+    def recent(self, limit=10):
+        """Jobs of this process and finished jobs from the store, newest first."""
+        with self._lock:
+            jobs = dict(self._jobs)
+        if self.store is not None:
+            for job in self.store.load():
+                jobs.setdefault(job.id, job)
+        return sorted(jobs.values(), key=lambda job: job.submitted, reverse=True)[:limit]
+
+    def _run(self, job, func, args):
+        if job.cancel_requested:
+            job.status = CANCELLED
+        else:
+            _local.job = job
+            job.status = RUNNING
+            job.started = time.time()
+            try:
+                job.result = func(*args)
+                job.status = DONE
+            except JobCancelled:
+                job.status = CANCELLED
+            except Exception as e:
+                job.status = FAILED
+                job.error = f"{type(e).__name__}: {e}"
+            finally:
+                _local.job = None
+        job.finished = time.time()
+        if self.store is not None:
+            self.store.save(job)
@@ -0,0 +1,216 @@
+"""Incremental SAS lexer shared by the program analyses.
+
+Lines are fed one at a time and split into segments of code, comments
+(``/* ... */``, ``* ... ;`` and ``%* ... ;``), single- and double-quoted
+string literals and DATALINES/CARDS data. State carries across lines, so
+comments, literals and statements that span several lines are handled, and
+semicolons inside literals or comments never end a statement.
+
+``iter_lexed`` makes one pass over a file and yields, per physical line,
+the line's segments together with any statements completed on it. Each
+analysis takes the view it needs from that single pass: a line with the
+comments blanked out (``code_view``) or whole statements with comments
+removed (``Statement.text``).
+"""
+import re
+from typing import NamedTuple
+
+CODE = "code"
+COMMENT = "comment"
+SQ_STRING = "sq_string"
+DQ_STRING = "dq_string"
+DATA = "data"
+
+# Internal lexer states that never appear as segment kinds
+BLOCK_COMMENT = "block_comment"
+COMMENT_STATEMENT = "comment_statement"
+
+# Statements whose following lines are raw data up to the next line with ';' (or ';;;;')
+DATALINES_KEYWORDS = {"datalines", "cards", "lines", "parmcards"}
+DATALINES4_KEYWORDS = {"datalines4", "cards4", "lines4", "parmcards4"}
+
+_CODE_SPECIAL_RE = re.compile(r"/\*|['\";]")
+_LEADING_WS_RE = re.compile(r"\s*")
+_SQ_END_RE = re.compile(r"(?:[^']|'')*'")
+_DQ_END_RE = re.compile(r'(?:[^"]|"")*"')
+_FIRST_WORD_RE = re.compile(r"\s*([A-Za-z_][A-Za-z0-9_]*)")
+
+
+class Segment(NamedTuple):
+    kind: str
+    text: str
+
+
+class Statement(NamedTuple):
+    start_line: int
+    end_line: int
+    text: str
+
+    def normalized(self):
+        """Statement text on one line with runs of whitespace collapsed."""
+        return " ".join(self.text.split())
+
+
+class SasLexer:
+    def __init__(self):
+        self.line_num = 0
+        self._state = CODE
+        self._at_statement_start = True
+        self._statement = []
+        self._statement_start = None
+        self._data_terminator = None
+
+    def feed(self, line):
+        """Lex one physical line; return ``(segments, completed_statements)``."""
+        self.line_num += 1
+        segments = []
+        completed = []
+
+        if self._state == DATA:
+            segments.append(Segment(DATA, line))
+            if self._data_terminator in line:
+                self._state = CODE
+                self._at_statement_start = True
+                self._data_terminator = None
+            return segments, completed
+
+        pos = 0
+        end = len(line)
+        while pos < end:
+            state = self._state
+            if state == CODE:
+                if self._at_statement_start:
+                    ws_end = _LEADING_WS_RE.match(line, pos).end()
+                    if ws_end > pos:
+                        self._add(segments, CODE, line[pos:ws_end])
+                        pos = ws_end
+                    if pos >= end:
+                        break
+                    if line.startswith("*", pos) or line.startswith("%*", pos):
+                        self._state = COMMENT_STATEMENT
+                        continue
+                    if not line.startswith("/*", pos):
+                        self._at_statement_start = False
+
+                m = _CODE_SPECIAL_RE.search(line, pos)
+                if m is None:
+                    self._add(segments, CODE, line[pos:])
+                    break
+                if m.start() > pos:
+                    self._add(segments, CODE, line[pos:m.start()])
+                token = m.group()
+                if token == "/*":
+                    self._state = BLOCK_COMMENT
+                    self._add(segments, COMMENT, token)
+                elif token == "'":
+                    self._state = SQ_STRING
+                    self._add(segments, SQ_STRING, token)
+                elif token == '"':
+                    self._state = DQ_STRING
+                    self._add(segments, DQ_STRING, token)
+                else:
+                    self._add(segments, CODE, token)
+                    completed.append(self._end_statement())
+                    self._at_statement_start = True
+                pos = m.end()
+
+            elif state == BLOCK_COMMENT:
+                close = line.find("*/", pos)
+                if close == -1:
+                    self._add(segments, COMMENT, line[pos:])
+                    break
+                self._add(segments, COMMENT, line[pos:close + 2])
+                self._state = CODE
+                pos = close + 2
+
+            elif state == COMMENT_STATEMENT:
+                semi = line.find(";", pos)
+                if semi == -1:
+                    self._add(segments, COMMENT, line[pos:])
+                    break
+                self._add(segments, COMMENT, line[pos:semi + 1])
+                self._state = CODE
+                self._at_statement_start = True
+                pos = semi + 1
+
+            else:
+                m = (_SQ_END_RE if state == SQ_STRING else _DQ_END_RE).match(line, pos)
+                if m is None:
+                    self._add(segments, state, line[pos:])
+                    break
+                self._add(segments, state, m.group())
+                self._state = CODE
+                pos = m.end()
+
+        if self._state == CODE and self._data_terminator:
+            # The DATALINES statement ended on this line; data starts on the next
+            self._state = DATA
+        return segments, completed
+
+    def finish(self):
+        """Return the trailing statement that was never closed by ';', if any."""
+        if self._statement and "".join(self._statement).strip():
+            return self._end_statement()
+        return None
+
+    def _add(self, segments, kind, text):
+        segments.append(Segment(kind, text))
+        if self._statement_start is None and text.strip() and kind != COMMENT:
+            self._statement_start = self.line_num
+        # Comments drop out of statement text but still separate tokens
+        self._statement.append(" " if kind == COMMENT else text)
+
+    def _end_statement(self):
+        text = "".join(self._statement)
+        statement = Statement(self._statement_start or self.line_num, self.line_num, text)
+        self._statement = []
+        self._statement_start = None
+
+        m = _FIRST_WORD_RE.match(text)
+        keyword = m.group(1).lower() if m else ""
+        if keyword in DATALINES_KEYWORDS:
+            self._data_terminator = ";"
+        elif keyword in DATALINES4_KEYWORDS:
+            self._data_terminator = ";;;;"
+        else:
+            self._data_terminator = None
+        return statement
+
+
+def iter_lexed(lines):
+    """Yield ``(line_number, line, segments, statements)`` for each line.
+
+    ``statements`` are those completed on that line; an unterminated final
+    statement is reported with the last line.
+    """
+    lexer = SasLexer()
+    pending = None
+    for line in lines:
+        if pending is not None:
+            yield pending
+        segments, statements = lexer.feed(line)
+        pending = (lexer.line_num, line, segments, statements)
+    if pending is not None:
+        tail = lexer.finish()
+        if tail is not None:
+            pending[3].append(tail)
+        yield pending
+
+
+def code_view(segments, keep=(CODE, SQ_STRING, DQ_STRING)):
+    """Rebuild the line with every segment not in ``keep`` blanked to spaces.
+
+    Column positions and the trailing newline are preserved.
+    """
+    return "".join(seg.text if seg.kind in keep else _blank(seg.text) for seg in segments)
+
+
+def _blank(text):
+    body = text.rstrip("\n")
+    return " " * len(body) + text[len(body):]
+
+
+def iter_statements(lines):
+    """Yield every ``Statement`` in ``lines``, comments removed."""
+    for _, _, _, statements in iter_lexed(lines):
+        yield from statements
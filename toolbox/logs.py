@@ -0,0 +1,406 @@
+"""SAS log parser producing a columnar per-step event table.
+
+Every DATA/PROC step in a SAS log ends with a statistics block::
+
+    NOTE: PROCEDURE SORT used (Total process time):
+          real time           1:05.20
+          cpu time            0.02 seconds
+          memory              512.00k
+
+``parse_log_events`` reads a log once, as bytes, and returns one column list
+per field with one entry per step, including the byte offsets that bound the
+step's part of the log. ``event_table`` stacks those columns for a whole tree
+into a single DataFrame, and thresholds, rankings and per-author or
+per-folder aggregates are then plain vectorized DataFrame operations.
+
+Besides timings, each step records its type (DATA, PROC and the procedure
+name), user and system cpu time, memory and OS memory from FULLSTIMER
+blocks, and the observation counts from the NOTE lines that precede the
+block. ``profile`` ranks steps by every metric and flags the ones whose real
+time is far above their cpu time -- steps that spend most of their time
+waiting on I/O rather than computing.
+
+``LogFollower`` keeps a ``LogParser`` per log between refreshes so that
+logs of running jobs can be watched at a cost proportional to their new
+output.
+"""
+import os
+import re
+
+import pandas as pd
+
+from toolbox.charsets import decode_guess
+
+AUTHOR_RE = re.compile(rb"author\s*[:\-]\s*(.*)", re.IGNORECASE)
+STEP_HEADER_RE = re.compile(rb"NOTE: (.+?) used(?: \(Total process time\))?:", re.IGNORECASE)
+STAT_RE = re.compile(
+    rb"[ \t]+(real time|user cpu time|system cpu time|cpu time|os memory|memory)[ \t]+(\S+(?:[ \t]+\S+)?)",
+    re.IGNORECASE,
+)
+OBS_READ_RE = re.compile(rb"NOTE: (?:There were )?(\d+) (?:observations|records) (?:were )?read from", re.IGNORECASE)
+OBS_WRITTEN_RE = re.compile(
+    rb"NOTE: (?:The data set \S+ has (\d+) observations"
+    rb"|Table \S+ created, with (\d+) rows"
+    rb"|(\d+) records were written to)",
+    re.IGNORECASE,
+)
+
+DURATION_RE = re.compile(r"(?:(\d+):)?(?:(\d+):)?(\d+(?:\.\d*)?)(?:\s+(seconds|minutes))?$", re.IGNORECASE)
+MEMORY_RE = re.compile(r"(\d+(?:\.\d*)?)\s*([kmgt])?b?$", re.IGNORECASE)
+MEMORY_UNITS_KB = {"": 1 / 1024, "k": 1, "m": 1024, "g": 1024 ** 2, "t": 1024 ** 3}
+
+# Statistics block SAS writes once for the whole session, after the last step
+SESSION_STEP = "The SAS System"
+
+EVENT_COLUMNS = ["Step", "Step Name", "Step Type", "Procedure", "Session Total", "Real Time (s)", "CPU Time (s)",
+                 "User CPU Time (s)", "System CPU Time (s)", "Memory (KB)", "OS Memory (KB)",
+                 "Observations Read", "Observations Written", "Start Offset", "End Offset"]
+METRIC_COLUMNS = ["Real Time (s)", "CPU Time (s)", "User CPU Time (s)", "System CPU Time (s)", "Memory (KB)",
+                  "OS Memory (KB)", "Observations Read", "Observations Written"]
+PROFILE_COLUMNS = ["Wait Time (s)", "I/O Bound"] + [f"{name} Rank" for name in METRIC_COLUMNS]
+TABLE_COLUMNS = ["Author", "Folder", "File"] + EVENT_COLUMNS
+AGGREGATE_COLUMNS = ["Logs", "Steps", "Total Real Time (s)", "Total CPU Time (s)", "Mean Real Time (s)",
+                     "Max Real Time (s)", "Max Memory (KB)"]
+
+# A step is flagged as I/O bound when real time is at least this multiple of cpu time ...
+IO_BOUND_RATIO = 4.0
+# ... and it ran long enough for the difference to matter
+IO_BOUND_MIN_SECONDS = 1.0
+
+
+def parse_duration(text):
+    """Seconds in a SAS time value (``0.15 seconds``, ``1.2 minutes``, ``1:05.20``, ``1:02:03.45``) or None."""
+    m = DURATION_RE.match(text.strip())
+    if m is None:
+        return None
+    first, second, seconds, unit = m.groups()
+    if second is not None:
+        hours, minutes = int(first), int(second)
+    else:
+        hours, minutes = 0, int(first or 0)
+    total = hours * 3600 + minutes * 60 + float(seconds)
+    if unit and unit.lower() == "minutes":
+        total *= 60
+    return round(total, 2)
+
+
+def parse_memory(text):
+    """Kilobytes in a SAS memory value (``675.21k``, ``1.5M``) or None."""
+    m = MEMORY_RE.match(text.strip())
+    if m is None:
+        return None
+    return round(float(m.group(1)) * MEMORY_UNITS_KB[(m.group(2) or "").lower()], 2)
+
+
+def _decode(raw):
+    # Logs are parsed as bytes; only these few fields are decoded, each in the encoding its bytes are in
+    return decode_guess(raw).strip()
+
+
+def step_type(name):
+    """``(step_type, procedure)`` for a statistics header such as ``PROCEDURE SORT``."""
+    words = name.split()
+    if not words:
+        return "", ""
+    if name.lower() == SESSION_STEP.lower():
+        return "SESSION", ""
+    if words[0].upper() == "DATA":
+        return "DATA", ""
+    if words[0].upper() == "PROCEDURE":
+        return "PROC", " ".join(words[1:]).upper()
+    return words[0].upper(), ""
+
+
+class _Step:
+    def __init__(self, name, start, end, observations):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.stats = {}
+        self.observations = observations
+
+
+def _emit(columns, step):
+    stats = step.stats
+    cpu = stats.get("cpu time")
+    if cpu is None and ("user cpu time" in stats or "system cpu time" in stats):
+        # FULLSTIMER logs split cpu time into user and system
+        cpu = round((stats.get("user cpu time") or 0) + (stats.get("system cpu time") or 0), 2)
+    kind, procedure = step_type(step.name)
+    observations_read, observations_written = step.observations
+    columns["Step"].append(len(columns["Step"]) + 1)
+    columns["Step Name"].append(step.name)
+    columns["Step Type"].append(kind)
+    columns["Procedure"].append(procedure)
+    columns["Session Total"].append(kind == "SESSION")
+    columns["Real Time (s)"].append(stats.get("real time"))
+    columns["CPU Time (s)"].append(cpu)
+    columns["User CPU Time (s)"].append(stats.get("user cpu time"))
+    columns["System CPU Time (s)"].append(stats.get("system cpu time"))
+    columns["Memory (KB)"].append(stats.get("memory"))
+    columns["OS Memory (KB)"].append(stats.get("os memory"))
+    columns["Observations Read"].append(observations_read)
+    columns["Observations Written"].append(observations_written)
+    columns["Start Offset"].append(step.start)
+    columns["End Offset"].append(step.end)
+
+
+class LogParser:
+    """Incremental log parser: feed raw lines as they are read, in any number of batches.
+
+    ``offset`` is the number of bytes consumed so far, so parsing can resume
+    exactly where it stopped when more output is appended to the log.
+    """
+
+    def __init__(self):
+        self.columns = {name: [] for name in EVENT_COLUMNS}
+        self.author = None
+        self.offset = 0
+        self._step = None
+        # Observation counts from NOTE lines seen since the last statistics block
+        self._observations = [None, None]
+        self._block_start = 0
+
+    def feed(self, lines):
+        """Parse complete raw (bytes) lines that follow everything fed so far."""
+        columns = self.columns
+        step = self._step
+        observations = self._observations
+        block_start = self._block_start
+        offset = self.offset
+        author = self.author
+        for raw in lines:
+            offset += len(raw)
+            indented = raw[:1] in (b" ", b"\t")
+            if indented:
+                stat = STAT_RE.match(raw)
+                if stat is not None:
+                    if step is None:
+                        # Timing lines without a NOTE header still count as a step
+                        step = _Step("", block_start, offset, observations)
+                    name = stat.group(1).decode("ascii").lower()
+                    value = _decode(stat.group(2))
+                    step.stats[name] = parse_memory(value) if name.endswith("memory") else parse_duration(value)
+                    step.end = offset
+                    continue
+                if step is not None and raw.strip():
+                    # Other indented statistics (Timestamp, page faults, ...)
+                    step.end = offset
+                    continue
+            if step is not None:
+                _emit(columns, step)
+                block_start = step.end
+                step = None
+                observations = [None, None]
+
+            if author is None and b"author" in raw.lower():
+                m = AUTHOR_RE.search(raw)
+                if m:
+                    author = _decode(m.group(1))
+            if not raw.startswith(b"NOTE:"):
+                continue
+            header = STEP_HEADER_RE.match(raw)
+            if header is not None:
+                step = _Step(_decode(header.group(1)), block_start, offset, observations)
+                continue
+            read = OBS_READ_RE.match(raw)
+            if read is not None:
+                observations[0] = (observations[0] or 0) + int(read.group(1))
+                continue
+            written = OBS_WRITTEN_RE.match(raw)
+            if written is not None:
+                count = next(group for group in written.groups() if group is not None)
+                observations[1] = (observations[1] or 0) + int(count)
+        self._step = step
+        self._observations = observations
+        self._block_start = block_start
+        self.offset = offset
+        self.author = author
+
+    def snapshot(self):
+        """``(author, columns)`` so far, including a statistics block that may still be growing.
+
+        The parser itself is left untouched, so more lines can be fed afterwards.
+        """
+        columns = self.columns
+        if self._step is not None:
+            columns = {name: list(values) for name, values in columns.items()}
+            _emit(columns, self._step)
+        return self.author or "", columns
+
+
+def parse_log_events(file_path):
+    """Parse one log in a single pass; return ``(author, columns)``.
+
+    ``columns`` maps each name in ``EVENT_COLUMNS`` to a list with one entry
+    per step. A step's log output runs from ``Start Offset`` (the end of the
+    previous statistics block) to ``End Offset`` (the end of its own).
+    """
+    parser = LogParser()
+    with open(file_path, "rb") as f:
+        parser.feed(f)
+    return parser.snapshot()
+
+
+class _FollowedLog:
+    def __init__(self, identity):
+        self.identity = identity
+        self.parser = LogParser()
+        self.head = b""
+
+
+class LogFollower:
+    """Tail a set of growing logs, parsing only the bytes appended since the last refresh.
+
+    Each log keeps its byte offset and parser state between refreshes. Only
+    complete lines are consumed; a partly written last line is picked up on
+    the next refresh. A log that was truncated, or rotated (a different file
+    now at the same path, or its first bytes changed), is parsed again from
+    the start.
+    """
+
+    # Leading bytes remembered per log to spot a file rewritten in place
+    HEAD_BYTES = 256
+
+    def __init__(self):
+        self._logs = {}
+
+    def __len__(self):
+        return len(self._logs)
+
+    def refresh(self, paths):
+        """Bring every log in ``paths`` up to date; return ``(bytes_read, logs_restarted)``."""
+        paths = set(paths)
+        for path in set(self._logs) - paths:
+            del self._logs[path]
+
+        bytes_read = restarted = 0
+        for path in sorted(paths):
+            try:
+                with open(path, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    identity = (st.st_dev, st.st_ino)
+                    log = self._logs.get(path)
+                    if log is not None and self._replaced(log, f, st, identity):
+                        log = None
+                        restarted += 1
+                    if log is None:
+                        log = self._logs[path] = _FollowedLog(identity)
+                    if st.st_size <= log.parser.offset:
+                        continue
+                    f.seek(log.parser.offset)
+                    before = log.parser.offset
+                    log.parser.feed(self._complete_lines(f))
+                    bytes_read += log.parser.offset - before
+                    if len(log.head) < self.HEAD_BYTES:
+                        f.seek(0)
+                        log.head = f.read(min(self.HEAD_BYTES, log.parser.offset))
+            except OSError:
+                # Deleted or locked between listing and reading; retried on the next refresh
+                self._logs.pop(path, None)
+        return bytes_read, restarted
+
+    def _replaced(self, log, f, st, identity):
+        if identity != log.identity or st.st_size < log.parser.offset:
+            return True
+        if log.head:
+            f.seek(0)
+            return f.read(len(log.head)) != log.head
+        return False
+
+    @staticmethod
+    def _complete_lines(f):
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                return
+            yield raw
+
+    def table(self):
+        """Event table of everything parsed so far (see ``event_table``)."""
+        return event_table((path, *log.parser.snapshot()) for path, log in sorted(self._logs.items()))
+
+
+def event_table(parsed_logs):
+    """Stack ``(file_path, author, columns)`` results into one DataFrame of ``TABLE_COLUMNS``."""
+    data = {name: [] for name in TABLE_COLUMNS}
+    for file_path, author, columns in parsed_logs:
+        count = len(columns["Step"])
+        folder, filename = os.path.split(file_path)
+        data["Author"].extend([author] * count)
+        data["Folder"].extend([folder] * count)
+        data["File"].extend([filename] * count)
+        for name in EVENT_COLUMNS:
+            data[name].extend(columns[name])
+    table = pd.DataFrame(data, columns=TABLE_COLUMNS)
+    for name in METRIC_COLUMNS:
+        table[name] = pd.to_numeric(table[name], errors="coerce")
+    return table.astype({"Step": "int64", "Session Total": "bool", "Start Offset": "int64", "End Offset": "int64",
+                         "Observations Read": "Int64", "Observations Written": "Int64"})
+
+
+def steps(table):
+    """The per-step rows, without the whole-session totals."""
+    return table[~table["Session Total"]]
+
+
+def steps_over(table, threshold):
+    """Steps whose real time exceeds ``threshold`` seconds, slowest first."""
+    table = steps(table)
+    return table[table["Real Time (s)"] > threshold].sort_values("Real Time (s)", ascending=False)
+
+
+def slowest_steps(table, n):
+    return steps(table).nlargest(n, "Real Time (s)")
+
+
+def aggregate(table, by):
+    """Runtime totals per value of ``by`` (e.g. ``"Author"`` or ``"Folder"``), slowest first."""
+    grouped = steps(table).groupby(by, sort=False)
+    result = grouped.agg(**{
+        "Logs": ("File", "nunique"),
+        "Steps": ("Step", "size"),
+        "Total Real Time (s)": ("Real Time (s)", "sum"),
+        "Total CPU Time (s)": ("CPU Time (s)", "sum"),
+        "Mean Real Time (s)": ("Real Time (s)", "mean"),
+        "Max Real Time (s)": ("Real Time (s)", "max"),
+        "Max Memory (KB)": ("Memory (KB)", "max"),
+    })
+    return result.round(2).sort_values("Total Real Time (s)", ascending=False).reset_index()
+
+
+def profile(table, ratio=IO_BOUND_RATIO, min_seconds=IO_BOUND_MIN_SECONDS):
+    """Steps with ``PROFILE_COLUMNS`` added, slowest first.
+
+    Each metric gets a rank (1 = highest across all steps), ``Wait Time`` is
+    real time not spent on the cpu, and ``I/O Bound`` marks steps that ran
+    at least ``min_seconds`` with real time ``ratio`` or more times their
+    cpu time.
+    """
+    table = steps(table).copy()
+    real, cpu = table["Real Time (s)"], table["CPU Time (s)"]
+    table["Wait Time (s)"] = (real - cpu).clip(lower=0).round(2)
+    table["I/O Bound"] = (real >= min_seconds) & (real >= ratio * cpu)
+    for name in METRIC_COLUMNS:
+        table[f"{name} Rank"] = table[name].rank(ascending=False, method="min").astype("Int64")
+    return table.sort_values("Real Time (s)", ascending=False, na_position="last")
+
+
+def io_bound_steps(table, ratio=IO_BOUND_RATIO, min_seconds=IO_BOUND_MIN_SECONDS):
+    """Profiled steps flagged as I/O bound, longest wait first."""
+    profiled = profile(table, ratio, min_seconds)
+    return profiled[profiled["I/O Bound"]].sort_values("Wait Time (s)", ascending=False)
+
+
+def log_summary(table):
+    """One row per log: step count, summed step time, slowest step and the session total."""
+    keys = ["Author", "Folder", "File"]
+    per_log = aggregate(table, keys)[keys + ["Steps", "Total Real Time (s)", "Max Real Time (s)"]]
+    session = (table[table["Session Total"]].groupby(keys, sort=False)["Real Time (s)"].max()
+               .rename("Session Real Time (s)").reset_index())
+    return per_log.merge(session, on=keys, how="outer").sort_values("Total Real Time (s)", ascending=False,
+                                                                    na_position="last")
+
+
+def records(df):
+    """Row dicts for a report sheet, with missing values as empty cells."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
@@ -0,0 +1,58 @@
+"""Macro invocation tokenizer and inverted index.
+
+Programs are lexed line by line and ``%name`` tokens are taken from code and
+double-quoted literals only (where SAS resolves macro calls), so calls in
+commented-out code do not count. Each token is a whole identifier, so
+``%dm`` no longer matches inside ``%dmc5``, and the index answers "is this
+macro used, how often and by whom" with a dict lookup.
+"""
+import re
+from collections import defaultdict
+
+from toolbox.lexer import CODE, DQ_STRING, code_view, iter_lexed
+
+MACRO_CALL_RE = re.compile(r"%([A-Za-z_][A-Za-z0-9_]*)")
+
+
+def line_macro_calls(line, segments):
+    """Lower-cased ``%name`` tokens in one lexed line."""
+    if "%" not in line:
+        return []
+    return [match.group(1).lower() for match in MACRO_CALL_RE.finditer(code_view(segments, keep=(CODE, DQ_STRING)))]
+
+
+def extract_macro_calls(lines):
+    """Return ``{macro_name: [line_number, ...]}`` for ``%name`` tokens in ``lines``."""
+    calls = defaultdict(list)
+    for line_num, line, segments, _ in iter_lexed(lines):
+        for name in line_macro_calls(line, segments):
+            calls[name].append(line_num)
+    return dict(calls)
+
+
+class MacroIndex:
+    """Inverted index of macro name -> calling program -> line numbers."""
+
+    def __init__(self):
+        self._index = defaultdict(dict)
+
+    def add(self, program, calls):
+        for macro, line_numbers in calls.items():
+            self._index[macro][program] = line_numbers
+
+    def __contains__(self, macro):
+        return macro.lower() in self._index
+
+    def programs(self, macro):
+        return sorted(self._index.get(macro.lower(), {}))
+
+    def call_count(self, macro):
+        return sum(len(lines) for lines in self._index.get(macro.lower(), {}).values())
+
+    def locations(self, macro):
+        """Return ``[(program, line_number), ...]`` for every call of ``macro``."""
+        return [
+            (program, line_num)
+            for program, lines in sorted(self._index.get(macro.lower(), {}).items())
+            for line_num in lines
+        ]
@@ -0,0 +1,96 @@
+"""Multi-term matchers that scan each line once against every search term.
+
+A matcher is built once per run from the list of terms and then fed lines.
+``match_line`` returns the terms found in a line, in the order the terms were
+given, which is exactly what the old per-term ``re.search`` loop reported.
+
+Terms are strings in the ``toolbox.query`` syntax (plain text is a literal
+term) or ``Query`` objects; a matcher reports each term as typed. The
+``ahocorasick`` engine is only offered where ``pyahocorasick`` is installed.
+"""
+import importlib.util
+
+from toolbox.query import LITERAL, QueryError, QueryPlan, as_queries
+
+
+class RegexMatcher:
+    """A ``QueryPlan`` of all terms: one precompiled, case-insensitive alternation.
+
+    The combined pattern rejects non-matching lines in a single scan. Only
+    lines that hit are checked term by term, so overlapping terms such as
+    ``dmc`` and ``re:dmc[0-9]+`` are all still reported.
+    """
+
+    def __init__(self, terms):
+        self.plan = QueryPlan(terms)
+        self.terms = self.plan.terms
+
+    def match_line(self, line):
+        if not self.plan.queries or not self.plan.search(line):
+            return []
+        if len(self.plan.queries) == 1:
+            return [self.terms[0]]
+        return [query.term for query in self.plan.queries if query.search(line)]
+
+
+class AhoCorasickMatcher:
+    """Aho-Corasick automaton over the lower-cased terms (needs ``pyahocorasick``); literal terms only."""
+
+    def __init__(self, terms):
+        queries = as_queries(terms)
+        for query in queries:
+            if query.mode != LITERAL:
+                raise QueryError(f"Term {query.term!r}: the 'ahocorasick' matcher engine matches literal terms only; "
+                                 f"use the 'regex' engine")
+            query.validate()
+        try:
+            import ahocorasick
+        except ImportError as e:
+            raise ImportError(
+                "The 'ahocorasick' matcher engine requires the pyahocorasick package"
+            ) from e
+
+        self.terms = [query.term for query in queries]
+        self._automaton = ahocorasick.Automaton()
+        for index, query in enumerate(queries):
+            key = query.text.lower()
+            indexes = self._automaton.get(key, ())
+            self._automaton.add_word(key, indexes + (index,))
+        if self.terms:
+            self._automaton.make_automaton()
+
+    def match_line(self, line):
+        if not self.terms:
+            return []
+        found = set()
+        for _, indexes in self._automaton.iter(line.lower()):
+            found.update(indexes)
+        return [self.terms[i] for i in sorted(found)]
+
+
+MATCHER_ENGINES = {
+    "regex": RegexMatcher,
+}
+# pyahocorasick is optional; without it the engine is not listed in the app or the CLI
+if importlib.util.find_spec("ahocorasick") is not None:
+    MATCHER_ENGINES["ahocorasick"] = AhoCorasickMatcher
+
+
+def build_matcher(terms, engine="regex"):
+    """Return a matcher for ``terms`` using one of ``MATCHER_ENGINES``."""
+    try:
+        matcher_cls = MATCHER_ENGINES[engine]
+    except KeyError:
+        if engine == "ahocorasick":
+            raise ValueError("The 'ahocorasick' matcher engine requires the pyahocorasick package") from None
+        raise ValueError(
+            f"Unknown matcher engine {engine!r}; choose from {', '.join(MATCHER_ENGINES)}"
+        ) from None
+    return matcher_cls(terms)
+
+
+def scan_lines(lines, matcher):
+    """Yield ``(line_number, line, term)`` for every term hit in ``lines``."""
+    for line_num, line in enumerate(lines, start=1):
+        for term in matcher.match_line(line):
+            yield line_num, line, term
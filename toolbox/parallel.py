@@ -0,0 +1,179 @@
+"""Parallel per-file scan executor shared by every tree walker.
+
+Each scanner splits its work into a module-level function that handles a
+single file. ``scan_files`` fans those calls out over a worker pool and yields
+the results back in the order the paths were given, so reports come out in
+the same order no matter how many workers ran.
+"""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from toolbox import perf
+
+EXECUTORS = ("process", "thread")
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _call(func, path, args):
+    # Runs inside the worker; exceptions are returned rather than raised so
+    # that a single unreadable file never aborts the whole scan.
+    try:
+        return path, func(path, *args), None
+    except Exception as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            e = RuntimeError(str(e))
+        return path, None, e
+
+
+def _call_measured(func, path, args):
+    # _call with the file's own perf metrics, sent back with its result
+    with perf.per_file(path, merge=False) as metrics:
+        path, result, error = _call(func, path, args)
+    return path, result, error, metrics.to_dict()
+
+
+def _call_chunk(call, func, paths, args):
+    return [call(func, path, args) for path in paths]
+
+
+def scan_files(func, paths, args=(), workers=1, executor="process", chunksize=None,
+               cache=None, namespace=None, progress=None, roots=None, dedupe=False):
+    """Yield ``(path, result, error)`` for ``func(path, *args)`` over ``paths``.
+
+    ``workers`` <= 1 runs in-process. ``executor`` picks processes (regex heavy
+    work, each worker reads its own files so reads overlap too) or threads
+    (latency-bound network shares with light parsing). ``func`` must be a
+    module-level function so it can be sent to worker processes.
+
+    With a ``toolbox.cache.ScanCache`` and a ``namespace``, files whose
+    fingerprint is unchanged are answered from the cache and only the rest
+    are sent to the workers.
+
+    ``progress(done, total)`` is called before each result is yielded. An
+    exception raised from it stops the scan and drops any queued work.
+
+    With ``roots``, a ``toolbox.studies.StudyRoots`` of several roots, the
+    files of each root go to a pool of their own with ``roots.budget(workers)``
+    workers, and the pools run side by side; ``paths`` are yielded grouped by
+    root. With ``dedupe`` as well, a file with the same content as a file
+    under another root is not scanned but gets that file's result, so only
+    pass it for a ``func`` whose result depends on the content alone.
+
+    While a run is measured (``toolbox.perf``), every file is measured in
+    its worker and the numbers are added to the run's metrics.
+    """
+    paths = list(paths)
+    multiple = roots is not None and roots.multiple
+    if multiple:
+        paths = [path for group in roots.groups(paths) for path in group]
+    cached = {}
+    fingerprints = {}
+    if cache is not None:
+        with perf.phase("cache"):
+            for path in paths:
+                try:
+                    fingerprints[path] = cache.fingerprint(path)
+                except OSError:
+                    continue
+                hit, result = cache.get(namespace, os.path.abspath(path), fingerprints[path])
+                if hit:
+                    cached[path] = result
+    pending = [path for path in paths if path not in cached]
+    copies = {}
+    if multiple and dedupe:
+        with perf.phase("hash"):
+            copies = roots.shared_copies(pending)
+        pending = [path for path in pending if path not in copies]
+    # Results of the files that have copies, kept until their copies are yielded
+    originals = dict.fromkeys(copies.values())
+
+    metrics = perf.current_metrics()
+    call = _call if metrics is None else _call_measured
+    if multiple:
+        results = _run_root_pools(call, func, roots.groups(pending), args, roots.budget(workers), executor, chunksize)
+    else:
+        results = _run_pool(call, func, pending, args, workers, executor, chunksize)
+    try:
+        for done, path in enumerate(paths, start=1):
+            if path in cached:
+                result, error = cached[path], None
+                if metrics is not None:
+                    metrics.counts["cached"] += 1
+            elif path in copies:
+                result, error = originals[copies[path]]
+                perf.count("shared")
+                if cache is not None and error is None and path in fingerprints:
+                    cache.put(namespace, os.path.abspath(path), fingerprints[path], result)
+            else:
+                if metrics is None:
+                    path, result, error = next(results)
+                else:
+                    with metrics.phase("scan"):
+                        path, result, error, file_metrics = next(results)
+                    metrics.merge(file_metrics)
+                if cache is not None and error is None and path in fingerprints:
+                    cache.put(namespace, os.path.abspath(path), fingerprints[path], result)
+                if path in originals:
+                    originals[path] = result, error
+            if progress is not None:
+                progress(done, len(paths))
+            yield path, result, error
+    finally:
+        results.close()
+        if cache is not None:
+            # Each pass ends its writes, so other scans sharing the cache are not kept waiting
+            cache.commit()
+
+
+def _run_pool(call, func, paths, args, workers, executor, chunksize):
+    if workers is None:
+        workers = default_workers()
+    workers = max(1, min(int(workers), len(paths) or 1))
+
+    if workers == 1:
+        for path in paths:
+            yield call(func, path, args)
+        return
+
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor {executor!r}; choose from {', '.join(EXECUTORS)}")
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    if chunksize is None:
+        chunksize = max(1, len(paths) // (workers * 8))
+
+    pool = pool_cls(max_workers=workers)
+    try:
+        n = len(paths)
+        yield from pool.map(call, [func] * n, paths, [args] * n, chunksize=chunksize)
+    finally:
+        # Queued chunks are dropped when the consumer stops early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_root_pools(call, func, groups, args, budget, executor, chunksize):
+    # One pool of ``budget`` workers per group, all started at once; results come back group by group, in order
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor {executor!r}; choose from {', '.join(EXECUTORS)}")
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    pools, futures = [], []
+    try:
+        for paths in groups:
+            if not paths:
+                continue
+            workers = max(1, min(budget, len(paths)))
+            pool = pool_cls(max_workers=workers)
+            pools.append(pool)
+            size = chunksize or max(1, len(paths) // (workers * 8))
+            futures += [pool.submit(_call_chunk, call, func, paths[i:i + size], args)
+                        for i in range(0, len(paths), size)]
+        for future in futures:
+            yield from future.result()
+    finally:
+        for pool in pools:
+            pool.shutdown(wait=True, cancel_futures=True)
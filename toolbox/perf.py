@@ -0,0 +1,300 @@
+"""Per-phase timers and counters for a scan run.
+
+A run is measured by entering ``measure()`` on the thread that runs it; the
+scan functions then report into it through ``phase`` and ``count``, which do
+nothing when no run is being measured. Phases of the run itself are timed on
+its own thread and never overlap: a nested phase pauses the enclosing one,
+so ``write`` excludes the time spent waiting on the scan that produces the
+rows being written.
+
+Per-file work runs in worker processes or threads, so each file is measured
+on its own (``per_file``) and its numbers are sent back with its result by
+``toolbox.parallel.scan_files``. The text reader splits a file's time into
+reading, sniffing its encoding and decoding; the rest of its time is
+matching and parsing. These per-file phases are summed over every file and
+worker, so with several workers they can add up to more than the wall time.
+
+``measure(profile=True)`` also runs ``cProfile`` on the run's thread and
+``measure(trace_memory=True)`` traces allocations of this process with
+``tracemalloc``; both are costly and off by default. Both are process-wide,
+so only one run captures at a time: a second profiled or traced run waits
+for the first to finish before it starts.
+"""
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from toolbox.jobs import current_job
+
+# Phases of the run's own thread, in the order they usually happen ...
+RUN_PHASES = ("walk", "index", "cache", "hash", "scan", "dataframe", "write")
+# ... and of each file's work, summed over files and workers
+FILE_PHASES = ("read", "sniff", "decode", "regex")
+PHASE_LABELS = {
+    "walk": "Listing folders",
+    "index": "Trigram index",
+    "cache": "Scan cache lookups",
+    "hash": "Finding files shared by roots",
+    "scan": "Waiting on per-file work",
+    "dataframe": "Building DataFrames",
+    "write": "Writing the report",
+    "read": "Reading files",
+    "sniff": "Sniffing encodings",
+    "decode": "Decoding text",
+    "regex": "Matching and parsing",
+}
+COUNTERS = ("files", "cached", "shared", "bytes", "lines", "matches")
+COUNTER_NOTES = {
+    "files": "read and scanned",
+    "cached": "answered from the scan cache without reading",
+    "shared": "answered from an identical file under another root",
+    "bytes": "size of the files read",
+    "lines": "lines read by the text reader",
+}
+
+PERFORMANCE_SHEET = "Performance"
+PERFORMANCE_COLUMNS = ["Section", "Name", "Value", "Unit", "Detail"]
+
+# Rows kept from the profile (by cumulative time) and from the allocation trace
+PROFILE_TOP = 25
+ALLOCATION_TOP = 10
+
+_local = threading.local()
+# Held by the run that is profiling or tracing allocations (see RunMetrics.start)
+_capture_lock = threading.Lock()
+
+
+def current_metrics():
+    """The metrics being collected on this thread, or None."""
+    return getattr(_local, "metrics", None)
+
+
+def phase(name):
+    """Time the block as phase ``name`` of the current metrics, if any."""
+    metrics = current_metrics()
+    return metrics.phase(name) if metrics is not None else nullcontext()
+
+
+def count(name, amount=1):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.counts[name] += amount
+
+
+class Metrics:
+    """Seconds per phase and counters, of a run or of one file."""
+
+    def __init__(self):
+        self.seconds = Counter()
+        self.counts = Counter()
+        self._stack = []
+        self._mark = time.perf_counter()
+
+    def _charge(self):
+        now = time.perf_counter()
+        if self._stack:
+            self.seconds[self._stack[-1]] += now - self._mark
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name):
+        self._charge()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._charge()
+            self._stack.pop()
+
+    def add_seconds(self, name, seconds):
+        self.seconds[name] += seconds
+
+    def to_dict(self):
+        return {"seconds": dict(self.seconds), "counts": dict(self.counts)}
+
+    def merge(self, other):
+        """Add the numbers of ``other``, a ``to_dict()`` from another thread or process."""
+        self.seconds.update(other["seconds"])
+        self.counts.update(other["counts"])
+
+
+@contextmanager
+def per_file(path, merge=True):
+    """Measure the work on one file in the block, with its own ``Metrics``.
+
+    Time the reader did not account for is counted as matching and parsing.
+    With ``merge`` the numbers are added to the enclosing metrics; workers
+    send them back with their result instead.
+    """
+    outer = current_metrics()
+    metrics = _local.metrics = Metrics()
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        _local.metrics = outer
+        elapsed = time.perf_counter() - start
+        metrics.seconds["regex"] += max(0.0, elapsed - sum(metrics.seconds.values()))
+        metrics.counts["files"] += 1
+        try:
+            metrics.counts["bytes"] += os.path.getsize(path)
+        except OSError:
+            pass
+        if merge and outer is not None:
+            outer.merge(metrics.to_dict())
+
+
+class RunMetrics(Metrics):
+    """Metrics of one run, with optional ``cProfile`` and ``tracemalloc`` captures."""
+
+    def __init__(self, profile=False, trace_memory=False):
+        super().__init__()
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.started = None
+        self.wall = None
+        self._outer = None
+        self._profiler = None
+        self._started_tracing = False
+        self._captured = False
+        self._holds_capture = False
+        self._capture_rows = []
+
+    def start(self):
+        if self.profile or self.trace_memory:
+            # Taken before the clock starts, so time spent waiting is not part of the run
+            if not _capture_lock.acquire(blocking=False):
+                job = current_job()
+                if job is not None:
+                    job.warn("Waiting for another profiled or traced job to finish")
+                _capture_lock.acquire()
+            self._holds_capture = True
+        self._outer = current_metrics()
+        _local.metrics = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self.started = self._mark = time.perf_counter()
+
+    def stop_capture(self):
+        """End the profile and the allocation trace and keep their top entries."""
+        if self._captured:
+            return
+        self._captured = True
+        try:
+            if self._profiler is not None:
+                self._profiler.disable()
+            # The trace is read first, so it does not include building the profile rows
+            if self.trace_memory and tracemalloc.is_tracing():
+                self._capture_rows += _memory_rows()
+                if self._started_tracing:
+                    tracemalloc.stop()
+            if self._profiler is not None:
+                self._capture_rows += _profile_rows(self._profiler)
+                self._profiler = None
+        finally:
+            if self._holds_capture:
+                self._holds_capture = False
+                _capture_lock.release()
+
+    def stop(self):
+        if self.wall is not None:
+            return
+        self.stop_capture()
+        self._charge()
+        self._stack.clear()
+        self.wall = time.perf_counter() - self.started
+        _local.metrics = self._outer
+
+    def rows(self):
+        """Performance report rows (dicts keyed by ``PERFORMANCE_COLUMNS``), as of now."""
+        seconds = Counter(self.seconds)
+        now = time.perf_counter()
+        if self._stack:
+            seconds[self._stack[-1]] += now - self._mark
+        wall = self.wall if self.wall is not None else now - self.started
+        files, size = self.counts["files"], self.counts["bytes"]
+
+        def row(section, name, value, unit, detail=""):
+            return {"Section": section, "Name": name, "Value": value, "Unit": unit, "Detail": detail}
+
+        rows = [
+            row("Run", "Wall time", round(wall, 3), "s"),
+            row("Run", "Throughput", round(files / wall, 1) if wall else None, "files/s"),
+            row("Run", "Throughput", round(size / 1e6 / wall, 2) if wall else None, "MB/s"),
+        ]
+        for name in RUN_PHASES:
+            share = f"{100 * seconds[name] / wall:.1f}% of wall time" if wall else ""
+            rows.append(row("Phase", PHASE_LABELS[name], round(seconds[name], 3), "s", share))
+        other = wall - sum(seconds[name] for name in RUN_PHASES)
+        rows.append(row("Phase", "Other", round(max(other, 0.0), 3), "s", "not in any phase above"))
+        file_total = sum(seconds[name] for name in FILE_PHASES)
+        for name in FILE_PHASES:
+            share = f"{100 * seconds[name] / file_total:.1f}% of per-file time" if file_total else ""
+            rows.append(row("Per-file phase", PHASE_LABELS[name], round(seconds[name], 3), "s",
+                            f"summed over files and workers; {share}" if share else "summed over files and workers"))
+        for name in COUNTERS:
+            unit = "files" if name in ("cached", "shared") else name
+            rows.append(row("Counter", name.capitalize(), self.counts[name], unit, COUNTER_NOTES.get(name, "")))
+        return rows + self._capture_rows
+
+    def iter_rows(self):
+        """Rows for a report sheet written at the end of the run; ends the captures first."""
+        self.stop_capture()
+        yield from self.rows()
+
+    def summary(self):
+        """The rows as plain text, for the command line."""
+        return format_performance(self.rows())
+
+
+@contextmanager
+def measure(profile=False, trace_memory=False):
+    """Measure the run in the block on this thread; yields its ``RunMetrics``."""
+    metrics = RunMetrics(profile, trace_memory)
+    metrics.start()
+    try:
+        yield metrics
+    finally:
+        metrics.stop()
+
+
+def format_performance(rows):
+    """Performance rows as aligned plain text."""
+    lines = []
+    for row in rows:
+        value = "" if row["Value"] is None else row["Value"]
+        line = f"{row['Section']:<15} {row['Name']:<28} {value:>12} {row['Unit']:<8} {row['Detail']}"
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def _profile_rows(profiler):
+    stats = pstats.Stats(profiler).sort_stats("cumulative")
+    rows = []
+    for key in stats.fcn_list[:PROFILE_TOP]:
+        filename, line_num, func = key
+        _, calls, own_time, cumulative, _ = stats.stats[key]
+        where = f"{os.path.basename(filename)}:{line_num}" if line_num else filename
+        rows.append({"Section": "Profile", "Name": f"{func} ({where})", "Value": round(cumulative, 4), "Unit": "s",
+                     "Detail": f"{calls} calls, {own_time:.4f}s in the function itself"})
+    return rows
+
+
+def _memory_rows():
+    _, peak = tracemalloc.get_traced_memory()
+    rows = [{"Section": "Memory", "Name": "Peak traced memory", "Value": round(peak / 1e6, 2), "Unit": "MB",
+             "Detail": "this process only; worker processes are not traced"}]
+    for stat in tracemalloc.take_snapshot().statistics("lineno")[:ALLOCATION_TOP]:
+        frame = stat.traceback[0]
+        rows.append({"Section": "Allocation", "Name": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                     "Value": round(stat.size / 1024, 1), "Unit": "KB", "Detail": f"{stat.count} blocks"})
+    return rows
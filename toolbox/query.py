@@ -0,0 +1,385 @@
+"""Search terms with a match mode, compiled once into validated query plans.
+
+A term is typed as ``mode:text``; a term without a mode is literal text, as
+before::
+
+    dmc4               literal text (``lit:`` spells the mode out)
+    word:dev           a whole word: ``dev`` but not ``device`` or ``dev_flag``
+    re:dmc[0-9]+       a Python regular expression
+    glob:dmc*_final    a whole word with wildcards: ``*`` any run of word
+                       characters, ``?`` one word character, ``[...]`` a set
+
+Every mode is case-insensitive. In a text box, each line with a mode holds
+exactly one term (so a regex may contain commas); lines without one are
+split on commas as before.
+
+A ``QueryPlan`` compiles every term once and validates it up front: a term
+that does not compile, matches the empty string (and so every line) or can
+backtrack catastrophically raises ``QueryError`` naming the term, before
+any file is read. The backtracking check rejects an unbounded repeat
+(``*``, ``+``, ``{n,}``) whose body can match the same text in more than one
+way: a body that can be empty, a nested repeat whose surroundings are
+optional or can match what it matches (``(a+)+``, ``(\\w+\\s*)+``),
+alternatives that can start the same way (``(a|aa)+``), or an optional part
+that can match what follows it (``(a?a)+``). ``(\\w+\\.)+`` and
+``(-?\\d+,)+`` are fine. A counted repeat of such a body (``(.*a){10}``) is
+rejected too once it can repeat ``COUNTED_REPEAT_LIMIT`` times or more: it
+does not blow up exponentially, but as the line length to the power of the
+count. Atomic groups and possessive repeats are never rejected.
+
+All terms are joined into one alternation that rejects most lines in a
+single scan, unless a term uses backreferences or named groups; then each
+term is searched on its own.
+"""
+import re
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+from toolbox.trigram import any_query, literal_query, regex_query
+
+LITERAL = "lit"
+WORD = "word"
+REGEX = "re"
+GLOB = "glob"
+MODES = (LITERAL, WORD, REGEX, GLOB)
+
+_MODE_RE = re.compile(rf"^({'|'.join(MODES)}):", re.IGNORECASE)
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=|\(\?P<")
+
+# Backtracking repeats: possessive repeats give nothing back
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_ASCII = frozenset(range(128))
+# Counted repeats ({n}, {n,m}) of an ambiguous body are rejected from this many repetitions
+COUNTED_REPEAT_LIMIT = 3
+_CATEGORY_CHARS = {
+    getattr(sre_constants, name): frozenset(c for c in range(128) if re.match(pattern, chr(c)))
+    for name, pattern in (("CATEGORY_DIGIT", r"\d"), ("CATEGORY_NOT_DIGIT", r"\D"), ("CATEGORY_SPACE", r"\s"),
+                          ("CATEGORY_NOT_SPACE", r"\S"), ("CATEGORY_WORD", r"\w"), ("CATEGORY_NOT_WORD", r"\W"))
+}
+
+
+class QueryError(ValueError):
+    """A term that cannot be run: it does not compile, matches everything or can backtrack catastrophically."""
+
+
+def _glob_regex(text):
+    parts = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "*":
+            parts.append(r"\w*")
+        elif char == "?":
+            parts.append(r"\w")
+        elif char == "[":
+            # A set as in fnmatch: [!...] negates, and a ] right after the opening [ (or [!) is literal
+            start = i + 2 if text[i + 1:i + 2] == "!" else i + 1
+            end = text.find("]", start + 1 if text[start:start + 1] == "]" else start)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                members = text[start:end].replace("\\", "\\\\")
+                if start > i + 1:
+                    members = "^" + members
+                elif members.startswith("^"):
+                    members = "\\" + members
+                parts.append(f"[{members}]")
+                i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+
+class Query:
+    """One term: ``term`` as typed, its ``mode``, the ``text`` after the mode, and its compiled ``pattern``."""
+
+    def __init__(self, term, mode, text):
+        self.term = term
+        self.mode = mode
+        self.text = text
+        if mode == LITERAL:
+            self.regex = re.escape(text)
+        elif mode == WORD:
+            # Lookarounds rather than \b, so terms that start or end with & or % work too
+            self.regex = rf"(?<!\w){re.escape(text)}(?!\w)"
+        elif mode == GLOB:
+            self.regex = rf"(?<!\w){_glob_regex(text)}(?!\w)"
+        else:
+            self.regex = text
+        try:
+            self.pattern = re.compile(self.regex, re.IGNORECASE)
+        except re.error as e:
+            where = f" at position {e.pos}" if e.pos is not None else ""
+            raise QueryError(f"Term {term!r}: {e.msg}{where}") from None
+        except (OverflowError, RecursionError):
+            raise QueryError(f"Term {term!r}: too large or too deeply nested") from None
+
+    def __repr__(self):
+        # Stable across runs, so it can go into cache namespaces
+        return f"Query({self.term!r})"
+
+    def search(self, line):
+        return self.pattern.search(line)
+
+    def trigram_query(self):
+        """``toolbox.trigram`` query of the files this term can match."""
+        return literal_query(self.text) if self.mode == LITERAL else regex_query(self.regex, re.IGNORECASE)
+
+    def validate(self):
+        """Raise ``QueryError`` if the term matches the empty string or can backtrack catastrophically."""
+        if not self.text:
+            raise QueryError(f"Term {self.term!r} is empty")
+        parsed = sre_parse.parse(self.regex, re.IGNORECASE)
+        if parsed.getwidth()[0] == 0:
+            raise QueryError(f"Term {self.term!r} can match an empty string, so it would match every line")
+        risk = _backtracking_risk(parsed, parsed.state)
+        if risk:
+            raise QueryError(f"Term {self.term!r} can backtrack catastrophically on long lines: {risk}. "
+                             f"Rewrite it, or make the repeat atomic with (?>...) or possessive with *+ or ++")
+
+
+def split_mode(term):
+    """``(prefix, text)`` of a typed term: ``"re:"`` and the rest, or ``""`` and the term."""
+    m = _MODE_RE.match(term)
+    return (m.group(), term[m.end():]) if m else ("", term)
+
+
+def parse_query(term):
+    """The ``Query`` for one typed term (``mode:text``, or literal text)."""
+    term = term.strip()
+    prefix, text = split_mode(term)
+    return Query(term, prefix[:-1].lower() or LITERAL, text)
+
+
+def parse_terms(text):
+    """``Query`` objects for the terms typed into a text box; see the module docstring."""
+    queries = []
+    for line in text.splitlines():
+        line = line.strip()
+        if split_mode(line)[0]:
+            queries.append(parse_query(line))
+        else:
+            queries.extend(parse_query(term) for term in line.split(",") if term.strip())
+    return queries
+
+
+def as_queries(terms):
+    """``terms`` as ``Query`` objects; strings are parsed with ``parse_query``."""
+    return [term if isinstance(term, Query) else parse_query(term) for term in terms]
+
+
+class QueryPlan:
+    """Queries compiled and validated once, with a combined single-scan prefilter.
+
+    ``finditer`` yields non-overlapping ``(query, match)`` pairs left to
+    right. Where several queries match at the same position, literal and
+    whole-word terms win over the others, longer ones first (so
+    ``dmc4_final`` beats ``dmc4``), then glob and regex terms in the order
+    given.
+    """
+
+    def __init__(self, terms):
+        self.queries = as_queries(terms)
+        for query in self.queries:
+            query.validate()
+        fixed = sorted((q for q in self.queries if q.mode in (LITERAL, WORD)), key=lambda q: -len(q.text))
+        self._ordered = fixed + [q for q in self.queries if q.mode not in (LITERAL, WORD)]
+        self.combined = None
+        # Numbered backreferences and group names would clash once the terms are joined
+        if self._ordered and not any(_BACKREF_RE.search(q.regex) for q in self.queries):
+            try:
+                self.combined = re.compile(
+                    "|".join(f"(?P<_q{i}>{q.regex})" for i, q in enumerate(self._ordered)), re.IGNORECASE
+                )
+            except re.error:
+                # e.g. a term with global inline flags; each term is then searched on its own
+                pass
+
+    @property
+    def terms(self):
+        return [query.term for query in self.queries]
+
+    def signature(self):
+        """Hashable description of the plan, for cache namespaces."""
+        return tuple(self.terms)
+
+    def all_literal(self):
+        return all(query.mode == LITERAL for query in self.queries)
+
+    def search(self, line):
+        """True when any query matches ``line``."""
+        if self.combined is not None:
+            return self.combined.search(line) is not None
+        return any(query.search(line) for query in self.queries)
+
+    def finditer(self, line):
+        if self.combined is not None:
+            for match in self.combined.finditer(line):
+                query = self._ordered[int(match.lastgroup[2:])]
+                # The term's own match, so its group numbers are its own
+                yield query, query.pattern.match(line, match.start()) if query.mode == REGEX else match
+            return
+        pos = 0
+        while True:
+            best = None
+            for query in self._ordered:
+                match = query.pattern.search(line, pos)
+                if match is not None and (best is None or match.start() < best[1].start()):
+                    best = query, match
+            if best is None:
+                return
+            yield best
+            pos = best[1].end()
+
+    def trigram_query(self):
+        return any_query(query.trigram_query() for query in self.queries)
+
+
+def _min_width(element, state):
+    return sre_parse.SubPattern(state, [element]).getwidth()[0]
+
+
+def _case_variants(code):
+    char = chr(code)
+    variants = {code}
+    for other in (char.lower(), char.upper()):
+        if len(other) == 1:
+            variants.add(ord(other))
+    return {c for c in variants if c < 128}
+
+
+def _item_chars(op, av):
+    # The ASCII characters a one-character item can match, or None for anything longer
+    if op is sre_constants.LITERAL:
+        return _case_variants(av)
+    if op is sre_constants.NOT_LITERAL:
+        return _ASCII - _case_variants(av)
+    if op is sre_constants.ANY:
+        return _ASCII - {10}
+    if op is sre_constants.IN:
+        chars, negate = set(), False
+        for item_op, item_av in av:
+            if item_op is sre_constants.NEGATE:
+                negate = True
+            elif item_op is sre_constants.LITERAL:
+                chars |= _case_variants(item_av)
+            elif item_op is sre_constants.RANGE:
+                for code in range(item_av[0], min(item_av[1], 127) + 1):
+                    chars |= _case_variants(code)
+            else:
+                chars |= _CATEGORY_CHARS.get(item_av, _ASCII)
+        return _ASCII - chars if negate else chars
+    return None
+
+
+def _first_chars(elements, state):
+    """The ASCII characters a match of ``elements`` can start with."""
+    chars = set()
+    for element in elements:
+        op, av = element
+        single = _item_chars(op, av)
+        if single is not None:
+            return chars | single
+        if op is sre_constants.AT:
+            continue
+        if op in _REPEATS or op is getattr(sre_constants, "POSSESSIVE_REPEAT", None):
+            chars |= _first_chars(av[2], state)
+        elif op is sre_constants.SUBPATTERN:
+            chars |= _first_chars(av[-1], state)
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                chars |= _first_chars(branch, state)
+        else:
+            # Lookarounds, backreferences: assume anything
+            return set(_ASCII)
+        if _min_width(element, state) > 0:
+            return chars
+    return chars
+
+
+def _flatten(elements):
+    # Groups do not change what a sequence matches
+    flat = []
+    for op, av in elements:
+        if op is sre_constants.SUBPATTERN:
+            flat.extend(_flatten(av[-1]))
+        else:
+            flat.append((op, av))
+    return flat
+
+
+def _literal_prefix(elements):
+    prefix = []
+    for op, av in elements:
+        if op is not sre_constants.LITERAL:
+            break
+        prefix.append(chr(av).lower())
+    return "".join(prefix)
+
+
+def _branches_overlap(first, second, state):
+    first_prefix, second_prefix = _literal_prefix(first), _literal_prefix(second)
+    if first_prefix and second_prefix:
+        return first_prefix.startswith(second_prefix) or second_prefix.startswith(first_prefix)
+    return bool(_first_chars(first, state) & _first_chars(second, state))
+
+
+def _body_risk(elements, state):
+    # Why a repeat of ``elements`` can split the same text in many ways, or None
+    elements = _flatten(elements)
+    for index, element in enumerate(elements):
+        op, av = element
+        others = elements[:index] + elements[index + 1:]
+        if op in _REPEATS and av[1] == sre_constants.MAXREPEAT:
+            chars = _first_chars(av[2], state)
+            if all(_min_width(other, state) == 0 or _first_chars([other], state) & chars for other in others):
+                return "a repeat inside a repeat"
+        elif op is sre_constants.BRANCH:
+            branches = av[1]
+            for i, branch in enumerate(branches):
+                for other in branches[i + 1:]:
+                    if _branches_overlap(branch, other, state):
+                        return "alternatives inside a repeat that can start the same way"
+                risk = _body_risk(branch, state) if not others else None
+                if risk:
+                    return risk
+        # What an optional part competes with: the rest of the body, then the next repetition
+        if _min_width(element, state) == 0 and _first_chars([element], state) & _first_chars(
+                elements[index + 1:] + elements, state):
+            if op is sre_constants.BRANCH:
+                # The parser factors (a|aa) into a(|a): one alternative is the start of another
+                return "alternatives inside a repeat that can start the same way"
+            return "an optional part inside a repeat that can match what follows it"
+    return None
+
+
+def _backtracking_risk(elements, state):
+    for op, av in elements:
+        risk = None
+        if op in _REPEATS:
+            low, high, body = av
+            if high == sre_constants.MAXREPEAT:
+                if sre_parse.SubPattern(state, list(body)).getwidth()[0] == 0:
+                    return "a repeat of something that can match an empty string"
+                risk = _body_risk(body, state)
+            elif high >= COUNTED_REPEAT_LIMIT:
+                risk = _body_risk(body, state)
+                if risk:
+                    risk = f"{risk}, repeated up to {high} times"
+            risk = risk or _backtracking_risk(body, state)
+        elif op is sre_constants.SUBPATTERN:
+            risk = _backtracking_risk(av[-1], state)
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                risk = risk or _backtracking_risk(branch, state)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            risk = _backtracking_risk(av[1], state)
+        # Atomic groups and possessive repeats never give back what they matched
+        if risk:
+            return risk
+    return None
@@ -0,0 +1,107 @@
+"""Lazy, bounded-memory readers shared by the scanners.
+
+Files are never materialised as whole strings or line lists: callers iterate
+lines as they are read, and keep any context they need in a fixed-size
+``collections.deque`` window.
+
+Files are decoded in their own encoding, sniffed per file unless given
+(``toolbox.charsets``); ``read_text`` also returns the encoding it used.
+
+While a run is measured (see ``toolbox.perf``), ``iter_lines`` times the raw
+reads and the decoding separately and counts the lines it yields.
+"""
+import io
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from toolbox.charsets import sniff_file
+from toolbox.perf import current_metrics
+
+
+class _TimedFileIO(io.FileIO):
+    # Raw reads under the buffered text reader, timed
+    seconds = 0.0
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        try:
+            return super().readinto(buffer)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def read_text(file_path, encoding=None, errors="replace", newline=None):
+    """``(encoding, lines)``: the encoding ``file_path`` is read in, sniffed when not given, and its lines.
+
+    ``lines`` yields the lines one at a time. A file small enough to be
+    sniffed in one chunk is decoded from the bytes read to sniff it.
+    """
+    data = None
+    if encoding is None:
+        encoding, data = sniff_file(file_path)
+    return encoding, _lines(file_path, data, encoding, errors, newline)
+
+
+def iter_lines(file_path, encoding=None, errors="replace", newline=None):
+    """Yield the lines of ``file_path`` one at a time."""
+    return read_text(file_path, encoding, errors, newline)[1]
+
+
+def _lines(file_path, data, encoding, errors, newline):
+    metrics = current_metrics()
+    if metrics is not None:
+        raw = io.BytesIO(data) if data is not None else _TimedFileIO(file_path, "r")
+        yield from _iter_lines_measured(raw, encoding, errors, newline, metrics)
+        return
+    if data is not None:
+        f = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, errors=errors, newline=newline)
+    else:
+        f = open(file_path, "r", encoding=encoding, errors=errors, newline=newline)
+    with f:
+        yield from f
+
+
+def _iter_lines_measured(raw, encoding, errors, newline, metrics):
+    # The same text reader open() builds, over a raw file that times its reads (or the bytes already read)
+    text_seconds = 0.0
+    lines = 0
+    with io.TextIOWrapper(io.BufferedReader(raw), encoding=encoding, errors=errors, newline=newline) as f:
+        try:
+            while True:
+                start = time.perf_counter()
+                line = f.readline()
+                text_seconds += time.perf_counter() - start
+                if not line:
+                    break
+                lines += 1
+                yield line
+        finally:
+            read_seconds = getattr(raw, "seconds", 0.0)
+            metrics.add_seconds("read", read_seconds)
+            metrics.add_seconds("decode", max(0.0, text_seconds - read_seconds))
+            metrics.counts["lines"] += lines
+
+
+@contextmanager
+def rewrite_file(file_path, encoding="utf-8", errors="ignore", newline=None):
+    """Open a temp file next to ``file_path`` for a streaming rewrite.
+
+    Yields ``(handle, commit)``; calling ``commit()`` before the block exits
+    moves the new contents over the original, otherwise the temp file is
+    discarded.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=directory)
+    committed = []
+    try:
+        with open(fd, "w", encoding=encoding, errors=errors, newline=newline) as out:
+            yield out, lambda: committed.append(True)
+        if committed:
+            shutil.copymode(file_path, tmp_path)
+            os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,190 @@
+"""The 'real time' log report of the original log runtime checks.
+
+Every ``real time`` line of a log is reported with the log lines that led up
+to it (back to the previous ``real time`` line, at most ``SNIPPET_LINES``).
+The summary has the last entry of each log, normally the session total; the
+details have every earlier entry slower than ``DETAIL_SECONDS``. The
+step-level profile lives in ``toolbox.logs``.
+"""
+import os
+import re
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+from toolbox import fastscan, perf
+from toolbox.cache import cache_namespace
+from toolbox.discovery import FileDiscovery
+from toolbox.parallel import scan_files
+from toolbox.charsets import sniff_bytes
+from toolbox.reading import read_text
+from toolbox.studies import as_roots
+
+REALTIME_COLUMNS = ["Author", "File Location", "Filename", "Encoding", "Timestamp", "Log Snippet", "Raw Value",
+                    "Real Time (seconds)"]
+
+# Lines of context kept before each 'real time' line for the log snippet
+SNIPPET_LINES = 20
+# Entries before the last one are listed in the details when slower than this
+DETAIL_SECONDS = 5
+
+AUTHOR_BYTES_RE = re.compile(rb'author[ \t\f\v]*[:\-][ \t\f\v]*([^\n]*)', re.IGNORECASE)
+REAL_TIME_BYTES_RE = re.compile(rb'real time', re.IGNORECASE)
+
+
+def parse_real_time(line_lower):
+    """
+    Parse a lower-cased 'real time' line.
+    Returns (raw_value, total_seconds); total_seconds is None when the value is not recognised.
+    """
+    # Format: real time 10:0.15
+    colon_match = re.search(r"real time\s+([0-9]+):([0-9.]+)", line_lower)
+    if colon_match:
+        minutes = int(colon_match.group(1))
+        seconds = float(colon_match.group(2))
+        return colon_match.group(0).split('real time')[-1].strip(), round(minutes * 60 + seconds, 2)
+
+    # Format: real time 0.15 seconds or 1.2 minutes
+    unit_match = re.search(r"real time\s+([0-9.]+)\s+(seconds|minutes)", line_lower)
+    if unit_match:
+        time_val = float(unit_match.group(1))
+        unit = unit_match.group(2)
+        return unit_match.group(0).split('real time')[-1].strip(), round(time_val * 60 if unit == 'minutes' else time_val, 2)
+
+    return '', None
+
+
+def parse_log(file_path):
+    """
+    Stream a log file once, keeping only the last SNIPPET_LINES lines in memory.
+    Returns (author, entries, encoding) where entries is the list described in extract_realtime_entries
+    and encoding is the one the log was read in.
+    """
+    timings = []
+    file_timestamp = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
+
+    author = None
+    window = deque(maxlen=SNIPPET_LINES)
+    encoding, lines = read_text(file_path)
+    for line in lines:
+        line_lower = line.lower()
+
+        # Extract author (first match anywhere in the log applies to every entry)
+        if author is None and 'author' in line_lower:
+            author_match = re.search(r'author\s*[:\-]\s*(.*)', line, re.IGNORECASE)
+            if author_match:
+                author = author_match.group(1).strip()
+
+        if 'real time' not in line_lower:
+            window.append(line)
+            continue
+
+        raw_value, total_seconds = parse_real_time(line_lower)
+        if total_seconds is not None:
+            # The snippet runs back to the previous 'real time' line, at most SNIPPET_LINES lines
+            snippet = (''.join(window) + line).strip()
+            timings.append((snippet, raw_value, total_seconds))
+        window.clear()
+
+    author = author or ''
+    folder, filename = os.path.split(file_path)
+    entries = [(author, folder, filename, encoding, file_timestamp, *timing) for timing in timings]
+    return author, entries, encoding
+
+
+def parse_log_mmap(file_path):
+    """
+    Same result as parse_log, from a memory-mapped bytes scan.
+    Only 'real time' lines and their snippets are decoded; falls back to parse_log for bare-CR logs.
+    """
+    timings = []
+    file_timestamp = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
+
+    with fastscan.mapped(file_path) as buf:
+        if not fastscan.supports_fast_path(buf):
+            return parse_log(file_path)
+
+        encoding = sniff_bytes(buf)
+        author_match = AUTHOR_BYTES_RE.search(buf)
+        author = fastscan.decode(author_match.group(1), encoding).strip() if author_match else ''
+
+        previous_end = 0
+        for _, line_start, line_end in fastscan.iter_matching_lines(buf, REAL_TIME_BYTES_RE):
+            line = fastscan.decode(buf[line_start:line_end], encoding)
+            raw_value, total_seconds = parse_real_time(line.lower())
+            if total_seconds is not None:
+                # Walk back at most SNIPPET_LINES lines, stopping after the previous 'real time' line
+                snippet_start = line_start
+                for _ in range(SNIPPET_LINES):
+                    if snippet_start <= previous_end:
+                        break
+                    snippet_start = buf.rfind(b"\n", 0, snippet_start - 1) + 1
+                snippet_start = max(snippet_start, previous_end)
+                snippet = fastscan.decode(buf[snippet_start:line_end], encoding).strip()
+                timings.append((snippet, raw_value, total_seconds))
+            previous_end = line_end
+
+    folder, filename = os.path.split(file_path)
+    entries = [(author, folder, filename, encoding, file_timestamp, *timing) for timing in timings]
+    return author, entries, encoding
+
+
+def extract_realtime_entries(file_path):
+    """
+    Extract all 'real time' entries from a log file.
+    Returns a list of tuples:
+    (Author, File Location, Filename, Encoding, Timestamp, Log Snippet, Raw Value, Real Time (seconds))
+    """
+    return parse_log(file_path)[1]
+
+
+def scan_logs(folder_path, workers=1, executor="process", cache=None, use_mmap=False, discovery=None, progress=None,
+              warn=print):
+    """Return ``(summary, details)`` DataFrames for every log under ``folder_path`` (one or several roots)."""
+    summary_entries = []
+    detail_entries = []
+
+    roots = as_roots(folder_path)
+    log_files = roots.files(discovery or FileDiscovery(), (".log",))
+
+    parse_func = parse_log_mmap if use_mmap else parse_log
+    # Not deduplicated: the entries carry each log's own folder and timestamp
+    for file_path, parsed, error in scan_files(parse_func, log_files, (), workers, executor,
+                                               cache=cache, namespace=cache_namespace("parse_log"),
+                                               progress=progress, roots=roots):
+        root, file = os.path.split(file_path)
+        if error:
+            warn(f"Error reading {file_path}: {error}")
+            parsed = ('', [], None)
+        author, all_entries, encoding = parsed
+        perf.count("matches", len(all_entries))
+
+        if all_entries:
+            # Sort entries by appearance (they are in order already)
+            last_entry = all_entries[-1]
+            summary_entries.append(last_entry)
+
+            # All but last with time > DETAIL_SECONDS
+            for entry in all_entries[:-1]:
+                if entry[-1] > DETAIL_SECONDS:
+                    detail_entries.append(entry)
+        else:
+            # No real time entries, but still include in summary with blanks
+            try:
+                file_timestamp = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
+            except OSError:
+                # Deleted or rotated since it was listed
+                file_timestamp = ''
+            summary_entries.append((author, root, file, encoding, file_timestamp, '', '', None))
+
+    with perf.phase("dataframe"):
+        df_summary = pd.DataFrame(summary_entries, columns=REALTIME_COLUMNS)
+        df_details = pd.DataFrame(detail_entries, columns=REALTIME_COLUMNS)
+    return df_summary, df_details
+
+
+def realtime_summary(df_summary):
+    """The summary as reported: slowest logs first, without the snippet."""
+    df_summary = df_summary.sort_values(by="Real Time (seconds)", ascending=False, na_position="last")
+    return df_summary.drop(columns=["Log Snippet"], errors="ignore")
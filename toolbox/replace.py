@@ -0,0 +1,135 @@
+"""Safe bulk search-and-replace engine.
+
+All search terms are compiled into one ``toolbox.query.QueryPlan`` and each
+line is rewritten in a single left-to-right pass, so the output of one
+replacement is never searched again by a later term. A ``re:`` term's
+replacement may refer to its groups (``\\1``, ``\\g<name>``); every other
+replacement is inserted as typed. Files are read and
+written back in their own encoding (``toolbox.charsets``; an ASCII file
+that gains other characters becomes UTF-8), byte-for-byte: undecodable
+bytes survive via ``surrogateescape`` and line endings are kept as they are. Changes go to a temp file that atomically
+replaces the original, so a crash never leaves a half-written program.
+With ``dry_run`` nothing is written and a unified diff is returned instead.
+"""
+import difflib
+import re
+
+from toolbox.charsets import write_encoding
+from toolbox.query import REGEX, QueryError, QueryPlan, split_mode
+from toolbox.reading import iter_lines, read_text, rewrite_file
+
+# Lossless round trip for any byte sequence, valid in the file's encoding or not
+ERRORS = "surrogateescape"
+
+
+def parse_replacements(text):
+    """``{search_term: replacement}`` from lines of ``search:replace``.
+
+    A line may use `` => `` instead, for terms that contain a colon
+    (``re:(?:dmc|dev)(\\d+) => DMC\\1``); otherwise it is split at the first
+    colon after the term's mode. Lines with neither are ignored.
+    """
+    replacements = {}
+    for line in text.splitlines():
+        if " => " in line:
+            key, val = line.split(" => ", 1)
+        else:
+            prefix, rest = split_mode(line.strip())
+            if ":" not in rest:
+                continue
+            key, val = rest.split(":", 1)
+            key = prefix + key
+        if key.strip():
+            replacements[key.strip()] = val.strip()
+    return replacements
+
+
+class ReplacePlan:
+    """A ``{search_term: replacement}`` mapping compiled for single-pass rewriting.
+
+    Terms are validated when the plan is built, replacements of ``re:``
+    terms included, so a bad term fails before any file is touched.
+    """
+
+    def __init__(self, replace_dict):
+        self.replacements = dict(replace_dict)
+        self.plan = QueryPlan(self.replacements)
+        for query in self.plan.queries:
+            if query.mode == REGEX:
+                try:
+                    query.pattern.sub(self.replacements[query.term], "")
+                except (re.error, IndexError) as e:
+                    raise QueryError(f"Replacement for {query.term!r}: {e}") from None
+
+    def search(self, line):
+        return self.plan.search(line)
+
+    def apply(self, line):
+        """Return ``(new_line, terms)`` with ``terms`` in the order they were given."""
+        found = set()
+        parts = []
+        pos = 0
+        for query, match in self.plan.finditer(line):
+            replacement = self.replacements[query.term]
+            parts += [line[pos:match.start()], match.expand(replacement) if query.mode == REGEX else replacement]
+            pos = match.end()
+            found.add(query.term)
+        if not found:
+            return line, []
+        parts.append(line[pos:])
+        return "".join(parts), [term for term in self.replacements if term in found]
+
+
+def display_text(text):
+    """Make text that may carry escaped raw bytes safe to show in reports."""
+    return text.encode("utf-8", ERRORS).decode("utf-8", "replace")
+
+
+def _read_lines(file_path, encoding):
+    return iter_lines(file_path, encoding, ERRORS, newline="")
+
+
+def _rewrite(lines, plan):
+    for line_num, line in enumerate(lines, start=1):
+        new_line, terms = plan.apply(line)
+        yield line_num, line, new_line, terms
+
+
+def _rows(line_num, line, new_line, terms, plan):
+    original, modified = display_text(line).strip(), display_text(new_line).strip()
+    return [(line_num, original, modified, term, plan.replacements[term]) for term in terms]
+
+
+def replace_in_file(file_path, plan, dry_run=False):
+    """Apply ``plan`` to one file.
+
+    Returns ``(rows, diff, encoding)``. Each row is ``(line_number,
+    original_line, modified_line, search_term, replace_term)``. ``diff`` is
+    a unified diff of the change when ``dry_run`` is set (the file is left
+    untouched), and an empty string otherwise. ``encoding`` is the one the
+    file was read in.
+    """
+    if not plan.replacements:
+        return [], "", None
+    # Cheap read-only pass first, so untouched files are never rewritten
+    encoding, lines = read_text(file_path, errors=ERRORS, newline="")
+    if not any(plan.search(line) for line in lines):
+        return [], "", encoding
+
+    rows = []
+    if dry_run:
+        before, after = [], []
+        for line_num, line, new_line, terms in _rewrite(_read_lines(file_path, encoding), plan):
+            before.append(line.rstrip("\r\n"))
+            after.append(new_line.rstrip("\r\n"))
+            rows.extend(_rows(line_num, line, new_line, terms, plan))
+        diff = "\n".join(difflib.unified_diff(before, after, file_path, file_path, lineterm=""))
+        return rows, display_text(diff) + "\n", encoding
+
+    with rewrite_file(file_path, write_encoding(encoding), ERRORS, newline="") as (out, commit):
+        for line_num, line, new_line, terms in _rewrite(_read_lines(file_path, encoding), plan):
+            out.write(new_line)
+            rows.extend(_rows(line_num, line, new_line, terms, plan))
+        if rows:
+            commit()
+    return rows, "", encoding
@@ -0,0 +1,229 @@
+"""Streaming report writers.
+
+Rows are written to the report as they are produced instead of being
+collected into a DataFrame first. ``write_report`` takes one or more sheets,
+each a name, a column list and an iterable of row dicts, and streams them to
+an xlsx workbook (openpyxl write-only mode, styles applied as cells are
+written), CSV or Parquet. CSV and Parquet reports with more than one sheet
+are written as a zip archive with one file per sheet.
+"""
+import csv
+import os
+import re
+import tempfile
+import zipfile
+
+REPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+ZIP_MIME = "application/zip"
+
+# Characters openpyxl refuses to write into a cell
+ILLEGAL_CHARS_RE = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]")
+
+PARQUET_BATCH_ROWS = 50_000
+
+# Parquet column types for the numeric and flag columns the reports share; every
+# other column is written as text. Timing and memory columns carry their unit.
+COLUMN_TYPES = {
+    "Line Number": "int64",
+    "Call Count": "int64",
+    "Count": "int64",
+    "Depth": "int64",
+    "Order": "int64",
+    "Total": "int64",
+    "Studies": "int64",
+    "Logs": "int64",
+    "Steps": "int64",
+    "Step": "int64",
+    "Observations Read": "int64",
+    "Observations Written": "int64",
+    "Start Offset": "int64",
+    "End Offset": "int64",
+    "Session Total": "bool",
+    "I/O Bound": "bool",
+}
+FLOAT_SUFFIXES = (" (s)", " (KB)", " (seconds)")
+
+
+class Sheet:
+    """One report sheet: ``rows`` is any iterable of dicts keyed by ``columns``."""
+
+    def __init__(self, name, columns, rows, wrap_columns=()):
+        self.name = name
+        self.columns = list(columns)
+        self.rows = rows
+        self.wrap_columns = set(wrap_columns)
+
+    def values(self):
+        for row in self.rows:
+            yield [row.get(col) for col in self.columns]
+
+
+def report_path(output_path, fmt, sheet_count=1):
+    """Return ``output_path`` with the extension ``write_report`` will use for ``fmt``."""
+    stem = os.path.splitext(output_path)[0]
+    if fmt != "xlsx" and sheet_count > 1:
+        return f"{stem}.zip"
+    return f"{stem}.{fmt}"
+
+
+def report_mime(path):
+    ext = os.path.splitext(path)[1].lstrip(".")
+    return REPORT_FORMATS.get(ext, ZIP_MIME)
+
+
+def write_report(output_path, sheets, fmt="xlsx"):
+    """Stream ``sheets`` to ``output_path`` in ``fmt``.
+
+    Returns ``(path, row_counts)`` where ``path`` may differ from
+    ``output_path`` in its extension (see ``report_path``) and ``row_counts``
+    maps sheet names to the number of data rows written.
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format {fmt!r}; choose from {', '.join(REPORT_FORMATS)}")
+    path = report_path(output_path, fmt, len(sheets))
+    if fmt == "xlsx":
+        return path, _write_xlsx(path, sheets)
+    writer = _write_csv if fmt == "csv" else _write_parquet
+    if len(sheets) == 1:
+        return path, {sheets[0].name: writer(path, sheets[0])}
+
+    row_counts = {}
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf, tempfile.TemporaryDirectory() as tmp:
+        for sheet in sheets:
+            member = f"{_safe_name(sheet.name)}.{fmt}"
+            member_path = os.path.join(tmp, member)
+            row_counts[sheet.name] = writer(member_path, sheet)
+            zf.write(member_path, member)
+            os.remove(member_path)
+    return path, row_counts
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "sheet"
+
+
+def _write_xlsx(path, sheets):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    header_font = Font(bold=True)
+    wrap = Alignment(wrap_text=True, vertical="top")
+    row_counts = {}
+    for sheet in sheets:
+        ws = wb.create_sheet(sheet.name[:31])
+        wrap_idx = {i for i, col in enumerate(sheet.columns) if col in sheet.wrap_columns}
+        for i in wrap_idx:
+            ws.column_dimensions[get_column_letter(i + 1)].width = 80
+
+        header = []
+        for col in sheet.columns:
+            cell = WriteOnlyCell(ws, value=col)
+            cell.font = header_font
+            header.append(cell)
+        ws.append(header)
+
+        count = 0
+        for values in sheet.values():
+            count += 1
+            row = []
+            height = None
+            for i, value in enumerate(values):
+                if isinstance(value, str):
+                    value = ILLEGAL_CHARS_RE.sub("", value)
+                if i in wrap_idx:
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.alignment = wrap
+                    if value:
+                        num_lines = str(value).count("\n") + 1
+                        height = max(height or 15, min(15 * num_lines, 200))
+                    row.append(cell)
+                else:
+                    row.append(value)
+            if height is not None:
+                ws.row_dimensions[count + 1].height = height
+            ws.append(row)
+        row_counts[sheet.name] = count
+    wb.save(path)
+    return row_counts
+
+
+def _write_csv(path, sheet):
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(sheet.columns)
+        for values in sheet.values():
+            writer.writerow(values)
+            count += 1
+    return count
+
+
+def column_type(name):
+    """Parquet type of a report column: numbers and flags by name, text otherwise."""
+    if name in COLUMN_TYPES:
+        return COLUMN_TYPES[name]
+    if name.endswith(FLOAT_SUFFIXES):
+        return "float64"
+    if name.endswith(" Rank"):
+        return "int64"
+    return "string"
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+
+def _write_parquet(path, sheet):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet reports require the pyarrow package") from e
+
+    arrow_types = {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(), "string": pa.string()}
+    converters = {"int64": int, "float64": float, "bool": _to_bool, "string": str}
+    types = [column_type(name) for name in sheet.columns]
+    # Every field is nullable and fixed up front, so a later batch can't disagree with the first
+    schema = pa.schema([pa.field(name, arrow_types[type_], nullable=True) for name, type_ in zip(sheet.columns, types)])
+
+    def convert(value, type_):
+        if value is None or (type_ != "string" and value == ""):
+            return None
+        try:
+            if value != value:  # NaN / NA from pandas
+                return None
+        except (TypeError, ValueError):
+            pass
+        try:
+            return converters[type_](value)
+        except (TypeError, ValueError):
+            # A value that doesn't fit its declared column is dropped rather than failing the write
+            return None
+
+    count = 0
+    batch = []
+    with pq.ParquetWriter(path, schema) as writer:
+        def flush():
+            columns = list(zip(*batch)) if batch else [() for _ in sheet.columns]
+            arrays = [pa.array([convert(v, type_) for v in col], type=field.type)
+                      for col, type_, field in zip(columns, types, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            batch.clear()
+
+        for values in sheet.values():
+            batch.append(values)
+            count += 1
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                flush()
+        if batch or not count:
+            flush()
+    return count
@@ -0,0 +1,53 @@
+"""Per-file workers behind the Streamlit tasks.
+
+Each function handles exactly one file and returns plain data, so it can run
+in a worker process via ``toolbox.parallel.scan_files``. Workers whose rows
+name the file also return the encoding it was read in, for the report.
+"""
+from toolbox import fastscan
+from toolbox.charsets import sniff_bytes
+from toolbox.lexer import code_view, iter_lexed
+from toolbox.macros import extract_macro_calls
+from toolbox.matching import scan_lines
+from toolbox.reading import iter_lines, read_text
+
+
+def macro_calls_in_file(file_path):
+    """Return ``{macro_name: [line_number, ...]}`` for macros invoked in the file."""
+    return extract_macro_calls(iter_lines(file_path))
+
+
+def search_file(file_path, matcher, code_only=False):
+    """Return ``(hits, encoding)``, with ``(line_number, line, term)`` for every term hit in the file.
+
+    With ``code_only`` the file is lexed and hits inside comments are skipped;
+    the reported line is still the full physical line.
+    """
+    encoding, lines = read_text(file_path)
+    if not code_only:
+        return [(line_num, line.strip(), term) for line_num, line, term in scan_lines(lines, matcher)], encoding
+    return [
+        (line_num, line.strip(), term)
+        for line_num, line, segments, _ in iter_lexed(lines)
+        for term in matcher.match_line(code_view(segments))
+    ], encoding
+
+
+def search_file_mmap(file_path, matcher, bytes_pattern):
+    """Same result as ``search_file``, from a memory-mapped bytes scan of the file.
+
+    ``bytes_pattern`` comes from ``fastscan.compile_bytes_pattern``; when it is
+    None, or the file's line breaks need the text reader, this falls back to
+    ``search_file``. ASCII terms are the same bytes in every sniffed encoding.
+    """
+    if bytes_pattern is None:
+        return search_file(file_path, matcher)
+    with fastscan.mapped(file_path) as buf:
+        if not fastscan.supports_fast_path(buf):
+            return search_file(file_path, matcher)
+        encoding = sniff_bytes(buf)
+        hits = []
+        for line_num, start, end in fastscan.iter_matching_lines(buf, bytes_pattern):
+            line = fastscan.decode(buf[start:end], encoding)
+            hits.extend((line_num, line.strip(), term) for term in matcher.match_line(line))
+        return hits, encoding
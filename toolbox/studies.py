@@ -0,0 +1,204 @@
+"""Several studies and cuts scanned in one run, into one report.
+
+A folder input may name several roots, one per line or separated by ``;``,
+and each may be a glob (``/studies/*/dmc5/programs``). ``StudyRoots`` keeps
+them in order and labels each with what tells it apart from the others: its
+path below their common folder, without the trailing folders they all
+share. ``/studies/pso_3003/dmc5/programs`` and
+``/studies/3001/dryrun1/programs`` become ``pso_3003/dmc5`` and
+``3001/dryrun1``. Reports of several roots get a ``Study/Cut`` column and
+cross-study sheets; a single root reports as before.
+
+The roots are listed side by side, and ``toolbox.parallel.scan_files``
+scans them side by side, each with its own pool of ``budget`` workers, so
+one slow share does not hold up the others. Files with the same content in
+several roots, as the shared programs of two cuts usually are, are found by
+size and then by content hash, and scanned once.
+"""
+import glob
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from toolbox.cache import file_digest
+
+STUDY_COLUMN = "Study/Cut"
+ACROSS_STUDIES_SHEET = "Across Studies"
+ACROSS_COLUMNS = ["Total", "Studies", "Found In", "Not Found In", "Status"]
+
+# Hashing is latency-bound on a share, like listing folders
+HASH_WORKERS = 8
+
+_GLOB_CHARS = frozenset("*?[")
+
+
+def split_roots(text):
+    """Root entries typed into a form: one per line, or separated by ``;``."""
+    return [entry.strip() for entry in text.replace("\n", ";").split(";") if entry.strip()]
+
+
+def expand_roots(entries):
+    """Folders named by ``entries`` in order, each once; globs are expanded to the folders they match, sorted.
+
+    Raises ``ValueError`` for a glob that matches no folder and for a root inside another.
+    """
+    roots, seen = [], {}
+    for entry in entries:
+        entry = os.path.expanduser(entry)
+        if os.path.isdir(entry) or not _GLOB_CHARS & set(entry):
+            matches = [entry]
+        else:
+            matches = sorted(path for path in glob.glob(entry) if os.path.isdir(path))
+            if not matches:
+                raise ValueError(f"No folder matches {entry}")
+        for path in matches:
+            key = os.path.normcase(os.path.abspath(path))
+            if key not in seen:
+                seen[key] = path
+                roots.append(path)
+    keys = sorted(seen)
+    for outer, inner in zip(keys, keys[1:]):
+        if inner.startswith(outer.rstrip(os.sep) + os.sep):
+            raise ValueError(f"{seen[inner]} is inside {seen[outer]}; give one or the other")
+    return roots
+
+
+def study_labels(roots):
+    """``Study/Cut`` label of each root: the part of its path that differs from the others."""
+    if len(roots) == 1:
+        return [os.path.basename(os.path.normpath(roots[0])) or roots[0]]
+    parts = [os.path.abspath(root).replace("\\", "/").rstrip("/").split("/") for root in roots]
+    # Every label keeps at least one folder of its own
+    lead = min(len(os.path.commonprefix(parts)), min(len(p) for p in parts) - 1)
+    trail = len(os.path.commonprefix([p[::-1] for p in parts]))
+    trail = min(trail, min(len(p) - lead for p in parts) - 1)
+    return ["/".join(p[lead:len(p) - trail]) for p in parts]
+
+
+class StudyRoots:
+    """The roots of a run with their ``Study/Cut`` labels, and the worker budget of each."""
+
+    def __init__(self, paths, root_workers=None):
+        if not paths:
+            raise ValueError("No folder given")
+        self.paths = list(paths)
+        self.labels = study_labels(self.paths)
+        self.root_workers = root_workers
+        # Longest first, so a file is matched to the deepest root that holds it
+        self._prefixes = sorted(((os.path.normcase(os.path.abspath(path)).rstrip(os.sep) + os.sep, index)
+                                 for index, path in enumerate(self.paths)), key=lambda item: -len(item[0]))
+
+    @classmethod
+    def parse(cls, text, root_workers=None):
+        """Roots typed into a form or given on the command line; see ``split_roots`` and ``expand_roots``."""
+        return cls(expand_roots(split_roots(text)), root_workers)
+
+    def __len__(self):
+        return len(self.paths)
+
+    @property
+    def multiple(self):
+        return len(self.paths) > 1
+
+    def index_of(self, path):
+        key = os.path.normcase(os.path.abspath(path))
+        for prefix, index in self._prefixes:
+            if key.startswith(prefix):
+                return index
+        return 0
+
+    def label_for(self, path):
+        return self.labels[self.index_of(path)]
+
+    def study(self, path=None, index=None):
+        """``{"Study/Cut": label}`` of a path's root (or the root at ``index``) to start a report row with.
+
+        ``{}`` for a single root, whose reports keep their columns.
+        """
+        if not self.multiple:
+            return {}
+        return {STUDY_COLUMN: self.labels[self.index_of(path) if index is None else index]}
+
+    def columns(self, columns):
+        """``columns`` of a report sheet, with ``Study/Cut`` first when there are several roots."""
+        return [STUDY_COLUMN] + list(columns) if self.multiple else list(columns)
+
+    def relpath(self, path):
+        return os.path.relpath(path, self.paths[self.index_of(path)])
+
+    def budget(self, workers):
+        """Workers of each root's pool: ``root_workers``, or ``workers`` shared out between the roots."""
+        return max(1, int(self.root_workers or (workers or 1) // len(self.paths)))
+
+    def files(self, discovery, extensions=(".sas",), recursive=True):
+        """Paths of every root in root order, the roots listed side by side."""
+        if not self.multiple:
+            return discovery.files(self.paths[0], extensions, recursive)
+        with ThreadPoolExecutor(max_workers=len(self.paths), thread_name_prefix="toolbox-roots") as pool:
+            listings = list(pool.map(lambda root: discovery.files(root, extensions, recursive), self.paths))
+        return [path for listing in listings for path in listing]
+
+    def groups(self, paths):
+        """``paths`` split by root: one list per root, in root order."""
+        groups = [[] for _ in self.paths]
+        for path in paths:
+            groups[self.index_of(path)].append(path)
+        return groups
+
+    def shared_copies(self, paths):
+        """``{path: original}`` for every path whose content equals an earlier path's under another root.
+
+        Only files whose size matches a file under another root are hashed.
+        """
+        by_size = defaultdict(list)
+        for path in paths:
+            try:
+                by_size[os.path.getsize(path)].append(path)
+            except OSError:
+                continue
+        candidates = [path for group in by_size.values()
+                      if len({self.index_of(path) for path in group}) > 1 for path in group]
+        if not candidates:
+            return {}
+
+        def digest(path):
+            try:
+                return file_digest(path)
+            except OSError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="toolbox-hash") as pool:
+            digests = dict(zip(candidates, pool.map(digest, candidates)))
+        originals, copies = {}, {}
+        for path in paths:
+            key = digests.get(path)
+            if key is None:
+                continue
+            original = originals.setdefault(key, path)
+            if original != path:
+                copies[path] = original
+        return copies
+
+
+def iter_across_studies(key_column, counts, labels):
+    """Rows of a cross-study sheet: for each key of ``counts``, how often and in which studies it was found.
+
+    ``counts`` maps each key (a macro, a term, an issue) to a ``Counter`` by
+    study label; keys with no count anywhere are reported as found in no study.
+    """
+    for key, by_study in counts.items():
+        found = [label for label in labels if by_study.get(label)]
+        status = "In every study" if len(found) == len(labels) else "In no study" if not found else "In some studies"
+        yield {
+            key_column: key,
+            "Total": sum(by_study.values()),
+            "Studies": len(found),
+            "Found In": ", ".join(found),
+            "Not Found In": ", ".join(label for label in labels if label not in found),
+            "Status": status
+        }
+
+
+def as_roots(folder):
+    """``folder`` as ``StudyRoots``: a folder, a root list or glob as typed, or ``StudyRoots`` already."""
+    return folder if isinstance(folder, StudyRoots) else StudyRoots.parse(folder)
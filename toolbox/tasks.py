@@ -0,0 +1,503 @@
+"""The toolbox tasks, independent of any user interface.
+
+Every task the Streamlit app offers is a plain function here, so the app,
+the ``python -m toolbox`` command line and cron jobs run the same engines.
+``iter_*`` functions yield report rows as the scan produces them and
+``run_*`` wrap them in a DataFrame. ``run_task`` runs one task by name from
+a dict of form inputs and streams its report to disk.
+
+Warnings and progress go to the ``toolbox.jobs`` job the task runs in, when
+there is one; otherwise warnings are printed to stderr.
+"""
+import os
+import sys
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+
+import pandas as pd
+
+from toolbox import perf
+from toolbox.batch import (DEPENDENCY_COLUMNS, HARDCODING_COLUMNS, LOG_STEP_COLUMNS, LOG_SUMMARY_COLUMNS,
+                           MACRO_USAGE_COLUMNS, SEARCH_COLUMNS, parse_logs, run_all_checks)
+from toolbox.bundle import BUNDLE_COLUMNS, build_bundle, check_tools, iter_bundle_rows
+from toolbox.cache import ScanCache, cache_namespace
+from toolbox.depgraph import DEFAULT_GRAPH_PATH, DependencyGraph, program_dependencies
+from toolbox.discovery import FileDiscovery
+from toolbox.fastscan import compile_bytes_pattern
+from toolbox.hardcoding import build_ruleset, scan_file as scan_hardcoding
+from toolbox.jobs import current_job
+from toolbox.logs import (AGGREGATE_COLUMNS, PROFILE_COLUMNS, aggregate, io_bound_steps, log_summary, profile, records,
+                          slowest_steps, steps_over)
+from toolbox.macros import MacroIndex
+from toolbox.matching import build_matcher
+from toolbox.parallel import scan_files
+from toolbox.perf import PERFORMANCE_COLUMNS, PERFORMANCE_SHEET
+from toolbox.query import QueryError, QueryPlan, parse_terms
+from toolbox.realtime import REALTIME_COLUMNS, realtime_summary, scan_logs
+from toolbox.replace import ReplacePlan, parse_replacements, replace_in_file
+from toolbox.reports import Sheet, report_path, write_report
+from toolbox.scanners import macro_calls_in_file, search_file, search_file_mmap
+from toolbox.studies import (ACROSS_COLUMNS, ACROSS_STUDIES_SHEET, StudyRoots, as_roots, iter_across_studies,
+                             split_roots)
+from toolbox.trigram import TrigramIndex
+
+TASKS = ("Macro Usage Check", "Search for Terms", "Search and Replace Terms", "Hardcoding Check", "Log Runtime Check",
+         "Real Time Report", "Dependency Graph", "Run All Checks", "RTF to PDF Bundle")
+
+REPLACE_COLUMNS = ["Program Name", "Encoding", "Line Number", "Original Line", "Modified Line", "Identified Term",
+                   "Replaced With"]
+RERUN_COLUMNS = ["Program", "Depth", "Reason"]
+
+
+def list_sas_files(program_dir, discovery=None):
+    # One FileDiscovery per run lists each tree once, however many checks use it
+    return as_roots(program_dir).files(discovery or FileDiscovery(), (".sas",))
+
+
+def list_log_files(log_dir, discovery=None):
+    return as_roots(log_dir).files(discovery or FileDiscovery(), (".log",))
+
+
+def warn(message):
+    """Keep a warning on the background job this runs in, or print it."""
+    job = current_job()
+    if job is not None:
+        job.warn(message)
+    else:
+        print(message, file=sys.stderr)
+
+
+def report_progress(done, total):
+    # Lets a background job show progress and stop at the next file once cancelled
+    job = current_job()
+    if job is not None:
+        job.progress(done, total)
+
+
+def _dataframe(rows):
+    rows = list(rows)
+    with perf.phase("dataframe"):
+        return pd.DataFrame(rows)
+
+
+def iter_macro_usage_check(macro_dir, program_dir, workers=1, executor="process", cache=None, discovery=None,
+                           across=None):
+    """Usage of each macro of ``macro_dir``, per study when ``program_dir`` names several roots.
+
+    ``across``, a ``defaultdict(Counter)``, gets the call count of each macro by study.
+    """
+    discovery = discovery or FileDiscovery()
+    roots = as_roots(program_dir)
+    macro_files = discovery.files(macro_dir, (".sas",), recursive=False)
+    macro_names = [os.path.splitext(os.path.basename(f))[0].lower() for f in macro_files]
+
+    indexes = [MacroIndex() for _ in roots.paths]
+    program_files = list_sas_files(roots, discovery)
+    for file_path, calls, error in scan_files(macro_calls_in_file, program_files, (), workers, executor,
+                                              cache=cache, namespace=cache_namespace("macro_calls"),
+                                              progress=report_progress, roots=roots, dedupe=True):
+        if error:
+            warn(f"Could not read {file_path}: {error}")
+        else:
+            perf.count("matches", sum(len(lines) for lines in calls.values()))
+            indexes[roots.index_of(file_path)].add(roots.relpath(file_path), calls)
+
+    for study, (label, index) in enumerate(zip(roots.labels, indexes)):
+        for macro in macro_names:
+            if across is not None:
+                across[macro][label] += index.call_count(macro)
+            yield {
+                **roots.study(index=study),
+                "List of macros": macro,
+                "Status": "Used" if macro in index else "Not Used",
+                "Call Count": index.call_count(macro),
+                "Calling Programs": ", ".join(index.programs(macro))
+            }
+
+
+def run_macro_usage_check(macro_dir, program_dir, workers=1, executor="process", cache=None, discovery=None):
+    return _dataframe(iter_macro_usage_check(macro_dir, program_dir, workers, executor, cache, discovery))
+
+
+def iter_search_for_terms(program_dir, terms, engine="regex", workers=1, executor="process", cache=None,
+                          use_mmap=False, code_only=False, discovery=None, index_path=None, index_stats=None,
+                          across=None):
+    """Hits of ``terms`` in every program; ``across``, a ``defaultdict(Counter)``, gets each term's hits by study."""
+    # Every term is compiled and validated before any file is read
+    plan = QueryPlan(terms)
+    matcher = build_matcher(plan.queries, engine)
+    roots = as_roots(program_dir)
+    program_files = list_sas_files(roots, discovery)
+    if index_path:
+        # Only the files the trigram index cannot rule out are read
+        with TrigramIndex(index_path) as index, perf.phase("index"):
+            for root, root_files in zip(roots.paths, roots.groups(program_files)):
+                index.update(root, root_files, workers, executor, progress=report_progress)
+            program_files = index.candidates(program_files, plan.trigram_query())
+        if index_stats is not None:
+            index_stats.update(index.stats)
+    namespace = cache_namespace("search_for_terms", plan.terms, engine, code_only)
+    # Skipping comments needs the lexer, which runs on the text path
+    if use_mmap and not code_only:
+        # The bytes prefilter only knows literal text; other terms fall back to the text path
+        bytes_pattern = compile_bytes_pattern([q.text for q in plan.queries]) if plan.all_literal() else None
+        scan_func, scan_args = search_file_mmap, (matcher, bytes_pattern)
+    else:
+        scan_func, scan_args = search_file, (matcher, code_only)
+    if across is not None:
+        for term in plan.terms:
+            across.setdefault(term, Counter())
+    for file_path, result, error in scan_files(scan_func, program_files, scan_args, workers, executor,
+                                               cache=cache, namespace=namespace, progress=report_progress,
+                                               roots=roots, dedupe=True):
+        if error:
+            warn(f"Error reading file {file_path}: {error}")
+            continue
+        hits, encoding = result
+        perf.count("matches", len(hits))
+        study = roots.study(file_path)
+        for line_num, line, term in hits:
+            if across is not None:
+                across[term][roots.label_for(file_path)] += 1
+            yield {
+                **study,
+                'Program Name': os.path.basename(file_path),
+                'Encoding': encoding,
+                'Line Number': line_num,
+                'Line Code': line,
+                'Identified Term': term
+            }
+
+
+def run_search_for_terms(program_dir, terms, engine="regex", workers=1, executor="process", cache=None,
+                         use_mmap=False, code_only=False, discovery=None, index_path=None):
+    return _dataframe(iter_search_for_terms(program_dir, terms, engine, workers, executor, cache, use_mmap, code_only,
+                                            discovery, index_path))
+
+
+def iter_search_and_replace_terms(program_dir, replace_dict, workers=1, executor="process", dry_run=False,
+                                  diffs=None, discovery=None):
+    plan = ReplacePlan(replace_dict)
+    roots = as_roots(program_dir)
+    program_files = list_sas_files(roots, discovery)
+    # Every copy of a shared file is rewritten, so nothing is deduplicated
+    for file_path, result, error in scan_files(replace_in_file, program_files, (plan, dry_run), workers, executor,
+                                               progress=report_progress, roots=roots):
+        if error:
+            warn(f"Error processing file {file_path}: {error}")
+            continue
+        changes, diff, encoding = result
+        perf.count("matches", len(changes))
+        if diff and diffs is not None:
+            diffs.append((file_path, diff))
+        for line_num, original_line, modified_line, search_term, replace_term in changes:
+            yield {
+                **roots.study(file_path),
+                'Program Name': os.path.basename(file_path),
+                'Encoding': encoding,
+                'Line Number': line_num,
+                'Original Line': original_line,
+                'Modified Line': modified_line,
+                'Identified Term': search_term,
+                'Replaced With': replace_term
+            }
+
+
+def run_search_and_replace_terms(program_dir, replace_dict, workers=1, executor="process", dry_run=False,
+                                 discovery=None):
+    return _dataframe(iter_search_and_replace_terms(program_dir, replace_dict, workers, executor, dry_run,
+                                                    discovery=discovery))
+
+
+def iter_hardcoding_check(program_dir, ruleset, workers=1, executor="process", cache=None, severity_counts=None,
+                          discovery=None, across=None):
+    """Hardcoding issues in every program; ``across`` (a ``defaultdict(Counter)``) gets each issue's count by study."""
+    roots = as_roots(program_dir)
+    program_files = list_sas_files(roots, discovery)
+    namespace = cache_namespace("hardcoding", ruleset.signature())
+    for file_path, result, error in scan_files(scan_hardcoding, program_files, (ruleset,), workers, executor,
+                                               cache=cache, namespace=namespace, progress=report_progress,
+                                               roots=roots, dedupe=True):
+        if error:
+            warn(f"Error reading file {file_path}: {error}")
+            continue
+        issues, encoding = result
+        perf.count("matches", len(issues))
+        study = roots.study(file_path)
+        for line_num, line, issue, severity in issues:
+            if severity_counts is not None:
+                severity_counts[severity] += 1
+            if across is not None:
+                across[issue][roots.label_for(file_path)] += 1
+            yield {
+                **study,
+                "File": file_path,
+                "Encoding": encoding,
+                "Line Number": line_num,
+                "Line": line,
+                "Issue": issue,
+                "Severity": severity
+            }
+
+
+def run_hardcoding_check(program_dir, ruleset, workers=1, executor="process", cache=None, discovery=None):
+    return _dataframe(iter_hardcoding_check(program_dir, ruleset, workers, executor, cache, discovery=discovery))
+
+
+def iter_severity_summary(severity_counts):
+    # Evaluated lazily, after the detail rows have been streamed and counted
+    for severity, count in severity_counts.most_common():
+        yield {"Severity": severity, "Count": count}
+
+
+def run_log_runtime_check(log_dir, workers=1, executor="process", cache=None, discovery=None):
+    """Parse every log under ``log_dir`` into one step-level event table."""
+    return parse_logs(log_dir, workers, executor, cache, discovery, report_progress, warn)
+
+
+def iter_program_dependencies(program_dir, workers=1, executor="process", cache=None, discovery=None):
+    program_files = list_sas_files(program_dir, discovery)
+    for file_path, edges, error in scan_files(program_dependencies, program_files, (), workers, executor,
+                                              cache=cache, namespace=cache_namespace("dependencies"),
+                                              progress=report_progress):
+        if error:
+            warn(f"Error reading file {file_path}: {error}")
+            continue
+        perf.count("matches", len(edges))
+        yield os.path.relpath(file_path, program_dir), edges
+
+
+def build_dependency_graph(program_dir, graph, workers=1, executor="process", cache=None, discovery=None):
+    """Rescan ``program_dir`` and replace its edges in the saved ``graph``."""
+    graph.replace(program_dir, iter_program_dependencies(program_dir, workers, executor, cache, discovery))
+
+
+def iter_dependency_rows(edges):
+    for program, kind, target, line_num in edges:
+        yield {"Program": program, "Kind": kind, "Target": target, "Line Number": line_num}
+
+
+def iter_rerun_rows(affected):
+    for program, depth, reason in affected:
+        yield {"Program": program, "Depth": depth, "Reason": reason}
+
+
+def describe_inputs(inputs):
+    roots = split_roots(inputs.get("program_dir") or inputs.get("log_dir") or "")
+    folder = "; ".join(roots) or inputs.get("toc_path", "")
+    query = inputs.get("query", "").strip()
+    return f"{folder} ({query})" if query else folder
+
+
+def check_inputs(task, inputs):
+    """Check the folders and compile the terms of ``task``, so a bad one is reported before the run.
+
+    Raises ``ValueError`` (``toolbox.query.QueryError`` for a term).
+    """
+    for key in ("program_dir", "log_dir"):
+        # Run All Checks can leave out either; every other task needs the folder it has
+        if key not in inputs or (task == "Run All Checks" and not inputs[key].strip()):
+            continue
+        roots = StudyRoots.parse(inputs[key])
+        for root in roots.paths:
+            if not os.path.isdir(root):
+                raise ValueError(f"Not a folder: {root}")
+        if roots.multiple and task == "Dependency Graph":
+            raise ValueError("The Dependency Graph is saved per folder; give one program folder")
+    if task == "Search and Replace Terms":
+        replacements = parse_replacements(inputs["terms_text"])
+        if not replacements:
+            raise QueryError("No 'search:replace' pairs were given")
+        ReplacePlan(replacements)
+    elif task in ("Search for Terms", "Run All Checks"):
+        build_matcher(parse_terms(inputs["terms_text"]), inputs["matcher_engine"])
+    elif task == "RTF to PDF Bundle":
+        toc_path = inputs["toc_path"].strip()
+        if not os.path.isfile(toc_path):
+            raise ValueError(f"TOC file not found: {toc_path}")
+        # A dry run only plans; converting and merging need both tools
+        if not inputs["dry_run"]:
+            check_tools()
+
+
+def _across_studies(roots, key_column, counts):
+    # Only a run over several roots has studies to compare
+    if not roots.multiple:
+        return []
+    return [Sheet(ACROSS_STUDIES_SHEET, [key_column] + ACROSS_COLUMNS,
+                  iter_across_studies(key_column, counts, roots.labels))]
+
+
+def build_sheets(task, inputs, workers, executor, cache, result, discovery):
+    """Report sheets for ``task``; most rows are produced lazily while the report is written.
+
+    A folder may name several roots (``toolbox.studies``); their rows get a
+    ``Study/Cut`` column, and cross-study sheets are added.
+    """
+    program_dir = inputs.get("program_dir")
+    roots = StudyRoots.parse(program_dir, inputs.get("root_workers")) if program_dir else None
+    log_roots = StudyRoots.parse(inputs["log_dir"], inputs.get("root_workers")) if inputs.get("log_dir") else None
+    # Filled while the rows are written, then read by the cross-study sheet
+    across = defaultdict(Counter)
+    if task == "Macro Usage Check":
+        sheets = [Sheet(task, roots.columns(MACRO_USAGE_COLUMNS),
+                        iter_macro_usage_check(inputs["macro_dir"], roots, workers, executor, cache, discovery,
+                                               across))]
+        return sheets + _across_studies(roots, "List of macros", across)
+
+    if task == "Search for Terms":
+        search_terms = parse_terms(inputs["terms_text"])
+        result["index_stats"] = {}
+        sheets = [Sheet(task, roots.columns(SEARCH_COLUMNS),
+                        iter_search_for_terms(roots, search_terms, inputs["matcher_engine"], workers, executor, cache,
+                                              inputs["use_mmap"], inputs["code_only"], discovery,
+                                              inputs.get("index_path"), result["index_stats"], across))]
+        return sheets + _across_studies(roots, "Identified Term", across)
+
+    if task == "Search and Replace Terms":
+        replace_dict = parse_replacements(inputs["terms_text"])
+        result["diffs"] = []
+        return [Sheet(task, roots.columns(REPLACE_COLUMNS),
+                      iter_search_and_replace_terms(roots, replace_dict, workers, executor, inputs["dry_run"],
+                                                    result["diffs"], discovery))]
+
+    if task == "Hardcoding Check":
+        ruleset = build_ruleset(inputs["rules_path"].strip() or None, inputs["include_default_rules"])
+        severity_counts = Counter()
+        return [
+            Sheet("Detailed Issues", roots.columns(HARDCODING_COLUMNS),
+                  iter_hardcoding_check(roots, ruleset, workers, executor, cache, severity_counts, discovery, across)),
+            Sheet("Summary by Severity", ["Severity", "Count"], iter_severity_summary(severity_counts)),
+        ] + _across_studies(roots, "Issue", across)
+
+    if task == "Log Runtime Check":
+        events = run_log_runtime_check(log_roots, workers, executor, cache, discovery)
+        io_ratio = inputs["io_ratio"]
+        with perf.phase("dataframe"):
+            return [
+                Sheet("Slow Steps", LOG_STEP_COLUMNS, records(steps_over(events, inputs["threshold"]))),
+                Sheet("Slowest Steps", LOG_STEP_COLUMNS, records(slowest_steps(events, int(inputs["top_n"])))),
+                Sheet("Step Profile", LOG_STEP_COLUMNS + PROFILE_COLUMNS, records(profile(events, io_ratio))),
+                Sheet("I-O Bound Steps", LOG_STEP_COLUMNS + PROFILE_COLUMNS,
+                      records(io_bound_steps(events, io_ratio))),
+                Sheet("By Step Type", ["Step Type", "Procedure"] + AGGREGATE_COLUMNS,
+                      records(aggregate(events, ["Step Type", "Procedure"]))),
+                Sheet("By Author", ["Author"] + AGGREGATE_COLUMNS, records(aggregate(events, "Author"))),
+                Sheet("By Folder", ["Folder"] + AGGREGATE_COLUMNS, records(aggregate(events, "Folder"))),
+                Sheet("Log Summary", LOG_SUMMARY_COLUMNS, records(log_summary(events))),
+            ]
+
+    if task == "Real Time Report":
+        df_summary, df_details = scan_logs(log_roots, workers, executor, cache, inputs["use_mmap"], discovery,
+                                           report_progress, warn)
+        detail_columns = [c for c in REALTIME_COLUMNS if c != "Timestamp"]
+        with perf.phase("dataframe"):
+            return [
+                Sheet("Summary", [c for c in REALTIME_COLUMNS if c != "Log Snippet"],
+                      realtime_summary(df_summary).to_dict("records")),
+                Sheet("Details", detail_columns, df_details.to_dict("records"), wrap_columns=["Log Snippet"]),
+            ]
+
+    if task == "Dependency Graph":
+        # The graph is saved per root; check_inputs allows only one
+        program_dir = roots.paths[0]
+        # The graph is queried up front so its connection stays on this thread
+        with DependencyGraph(DEFAULT_GRAPH_PATH) as graph:
+            if not (inputs["use_saved_graph"] and graph.has_root(program_dir)):
+                build_dependency_graph(program_dir, graph, workers, executor, cache, discovery)
+            sheets = [Sheet("Dependencies", DEPENDENCY_COLUMNS, list(iter_dependency_rows(graph.edges(program_dir))))]
+            query = inputs["query"].strip()
+            if query:
+                sheets += [
+                    Sheet("Used By", DEPENDENCY_COLUMNS, list(iter_dependency_rows(graph.users(program_dir, query)))),
+                    Sheet("Must Rerun", RERUN_COLUMNS, list(iter_rerun_rows(graph.must_rerun(program_dir, query)))),
+                ]
+        return sheets
+
+    if task == "Run All Checks":
+        terms = parse_terms(inputs["terms_text"])
+        ruleset = None
+        if inputs["hardcoding"]:
+            ruleset = build_ruleset(inputs["rules_path"].strip() or None, inputs["include_default_rules"])
+        return run_all_checks(roots, inputs["macro_dir"].strip() or None, terms, inputs["matcher_engine"],
+                              inputs["code_only"], ruleset, inputs["dependencies"], log_roots,
+                              inputs["threshold"], workers, executor, cache, discovery, report_progress, warn)
+
+    if task == "RTF to PDF Bundle":
+        # LibreOffice runs in its own processes, so ``workers`` is the number of soffice launches at a time
+        toc_path = inputs["toc_path"].strip()
+        pdf_dir = inputs["pdf_dir"].strip() or os.path.dirname(os.path.abspath(toc_path))
+        items, bundle_path, page_count = build_bundle(toc_path, pdf_dir, inputs["bundle_name"].strip() or "bundle.pdf",
+                                                      workers, inputs["dry_run"], progress=report_progress)
+        for item in items:
+            if item.status.startswith("conversion failed"):
+                warn(f"Could not convert {item.rtf_path}: {item.status}")
+        if bundle_path:
+            result["bundle_path"] = bundle_path
+            result["bundle_pages"] = page_count
+        return [Sheet("Bundle", BUNDLE_COLUMNS, list(iter_bundle_rows(items)))]
+
+    raise ValueError(f"Unknown task {task!r}")
+
+
+def run_task(task, inputs, report_format, workers, executor, cache_settings, discovery_settings, output_path=None,
+             perf_settings=None):
+    """Run ``task`` and write its report, by default to a timestamped file in the working folder.
+
+    Returns a dict with the report path and row counts, the cache statistics
+    and, for a replace dry run, the diffs and the patch file.
+
+    With ``perf_settings`` (``{"profile": ..., "trace_memory": ...}``, see
+    ``toolbox.perf.measure``) the run is measured: the result gets the
+    performance rows, and an xlsx report a Performance sheet.
+    """
+    check_inputs(task, inputs)
+    discovery = FileDiscovery(**discovery_settings)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = output_path or f"report_{task.replace(' ', '_').lower()}_{timestamp}.{report_format}"
+    # The bundle has a dry run too, but no diffs or patch
+    result = {"dry_run": task == "Search and Replace Terms" and bool(inputs.get("dry_run"))}
+    # Search and Replace rewrites files, so its results are never cached; the bundle scans nothing
+    cache = None
+    if cache_settings and task not in ("Search and Replace Terms", "RTF to PDF Bundle"):
+        cache = ScanCache(**cache_settings)
+    measuring = perf.measure(**perf_settings) if perf_settings is not None else nullcontext()
+    with measuring as metrics:
+        try:
+            sheets = build_sheets(task, inputs, workers, executor, cache, result, discovery)
+            if metrics is not None and report_format == "xlsx":
+                # Written last, so it covers the whole scan
+                sheets.append(Sheet(PERFORMANCE_SHEET, PERFORMANCE_COLUMNS, metrics.iter_rows()))
+            output_path = report_path(output_path, report_format, len(sheets))
+            try:
+                # Rows are streamed straight into the report as the scan produces them
+                with perf.phase("write"):
+                    output_path, row_counts = write_report(output_path, sheets, report_format)
+            except BaseException:
+                # Cancelled or failed part-way: do not leave a truncated report behind
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise
+        finally:
+            if cache is not None:
+                result["cache_stats"] = cache.stats()
+                cache.close()
+    if metrics is not None:
+        result["performance"] = metrics.rows()
+        row_counts.pop(PERFORMANCE_SHEET, None)
+
+    for folder, error in discovery.errors:
+        warn(f"Could not list folder {folder}: {error}")
+    result["row_counts"] = row_counts
+    if sum(row_counts.values()):
+        result["output_path"] = os.path.abspath(output_path)
+    else:
+        os.remove(output_path)
+    if result.get("diffs"):
+        patch_path = os.path.join(os.path.dirname(os.path.abspath(output_path)), f"replace_preview_{timestamp}.patch")
+        with open(patch_path, "w", encoding="utf-8") as f:
+            f.writelines(diff for _, diff in result["diffs"])
+        result["patch_path"] = patch_path
+    return result
+
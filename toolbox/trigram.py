@@ -0,0 +1,385 @@
+"""Persistent trigram index over a tree of programs, for instant repeat searches.
+
+``TrigramIndex`` keeps, in a small SQLite database, the list of files that
+contain each trigram (three consecutive characters) of the case-folded text.
+A search first asks the index which files can possibly match and then reads
+only those, so repeat searches of a large tree read a handful of files
+instead of all of them.
+
+The index is brought up to date before every lookup: files whose mtime or
+size changed, and new files, are re-indexed (on the usual worker pool); the
+rest are taken as they are. A changed file gets a new id and its old
+postings are left behind, to be dropped by the next compaction.
+
+Queries are sets of alternatives, each a set of trigrams that must all be in
+a file (``literal_query``, ``regex_query``, ``any_query``). Terms shorter than
+three characters, and regexes without a literal run of three characters,
+cannot be narrowed and match every file. The index only ever over-selects:
+every candidate is still searched, so results are identical with or
+without it.
+
+Matching is case-insensitive, so the text is lower-cased first; only ASCII
+trigrams are indexed, and the few other characters that case-insensitive
+matching equates with ASCII letters (Kelvin sign, long s, dotted and dotless
+i) are folded onto them. A trigram is stored as the integer of its three
+bytes; posting lists are sorted arrays of file ids, handled with numpy.
+"""
+import codecs
+import os
+import re
+import sqlite3
+import zlib
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+from toolbox.parallel import scan_files
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".programmers_toolbox", "trigram_index.sqlite3")
+
+# Bump when the folding or the storage format changes; an older index is rebuilt
+INDEX_VERSION = 1
+# File ids and trigram codes as stored: little-endian uint32
+ID_DTYPE = "<u4"
+
+# New postings held in memory before they are written out
+FLUSH_POSTINGS = 5_000_000
+# Postings of replaced files are dropped once there are more of them than live files (and at least this many)
+COMPACT_MIN_DEAD = 1000
+# Alternatives kept when regex branches are multiplied out; beyond this a query is loosened
+MAX_ALTERNATIVES = 64
+
+READ_CHUNK = 1 << 20
+
+# Characters that case-insensitive matching equates with ASCII letters
+_FOLD = str.maketrans({"İ": "i", "ı": "i", "ſ": "s", "K": "k"})
+# Every byte outside ASCII, and NUL and line breaks, becomes NUL, which no indexed trigram contains
+_BYTE_FOLD = bytes(b if 0 < b < 0x80 and b not in (0x0a, 0x0d) else 0 for b in range(256))
+
+# A query that every file satisfies
+ALL = frozenset([frozenset()])
+
+_REPEATS = tuple(op for op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+                               getattr(sre_constants, "POSSESSIVE_REPEAT", None)) if op is not None)
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+
+
+def fold(text):
+    """``text`` lower-cased as bytes, with NUL for every byte of a non-ASCII character and for line breaks."""
+    return text.translate(_FOLD).lower().encode("utf-8", "surrogatepass").translate(_BYTE_FOLD)
+
+
+def _trigrams(data):
+    # Integer codes of the trigrams of folded bytes, NUL-free ones only
+    return {int.from_bytes(data[i:i + 3], "big") for i in range(len(data) - 2) if 0 not in data[i:i + 3]}
+
+
+def _chunk_codes(np, data):
+    values = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    first, second, third = values[:-2], values[1:-1], values[2:]
+    codes = (first << 16) | (second << 8) | third
+    return np.unique(codes[(first != 0) & (second != 0) & (third != 0)])
+
+
+def file_trigrams(file_path):
+    """The sorted trigram codes of one file, as ``ID_DTYPE`` bytes."""
+    import numpy as np
+
+    # Only ASCII trigrams are indexed, and ASCII reads the same in every encoding the search sniffs; bytes that
+    # are not UTF-8 are dropped, which can only add candidates
+    decoder = codecs.getincrementaldecoder("utf-8")("ignore")
+    parts = []
+    tail = b""
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            # ASCII needs no decoding; an incomplete character before it would have been dropped anyway
+            folded = chunk.lower().translate(_BYTE_FOLD) if chunk.isascii() else fold(decoder.decode(chunk))
+            data = tail + folded
+            parts.append(_chunk_codes(np, data))
+            tail = data[-2:]
+    parts.append(_chunk_codes(np, tail + fold(decoder.decode(b"", final=True))))
+    return np.unique(np.concatenate(parts)).astype(ID_DTYPE).tobytes()
+
+
+def _and(left, right):
+    product = frozenset(a | b for a in left for b in right)
+    if len(product) <= MAX_ALTERNATIVES:
+        return product
+    # Too many combinations: keep the side with fewer alternatives, which matches a superset
+    return min(left, right, key=len)
+
+
+def _or(left, right):
+    if frozenset() in left or frozenset() in right:
+        return ALL
+    union = left | right
+    return union if len(union) <= MAX_ALTERNATIVES else ALL
+
+
+def _run_query(run):
+    return frozenset([frozenset(_trigrams(bytes(run)))])
+
+
+def literal_query(term):
+    """Query for a term searched for as plain text."""
+    return _run_query(fold(term))
+
+
+def any_query(queries):
+    """Query matching the files that satisfy any of ``queries``; no queries match nothing."""
+    result = frozenset()
+    for query in queries:
+        result = _or(result, query)
+    return result
+
+
+def _literal_byte(op, av):
+    # The folded byte one regex item always matches, or None
+    if op is sre_constants.LITERAL:
+        folded = fold(chr(av))
+        return folded if len(folded) == 1 else b"\x00"
+    if op is sre_constants.IN:
+        # [Dd] and the like: every member folds to the same character
+        members = set()
+        for item_op, item_av in av:
+            if item_op is not sre_constants.LITERAL:
+                return None
+            members.add(fold(chr(item_av)))
+        if len(members) == 1:
+            folded = members.pop()
+            return folded if len(folded) == 1 else b"\x00"
+    return None
+
+
+def _sequence_query(items):
+    query = ALL
+    run = bytearray()
+    for op, av in items:
+        byte = _literal_byte(op, av)
+        if byte is not None:
+            run += byte
+            continue
+        if op is sre_constants.AT:
+            # Anchors and \b match no characters, so the literal run goes on
+            continue
+        query = _and(query, _run_query(run))
+        run.clear()
+        if op is sre_constants.SUBPATTERN:
+            query = _and(query, _sequence_query(av[-1]))
+        elif op is sre_constants.BRANCH:
+            query = _and(query, any_query(_sequence_query(branch) for branch in av[1]))
+        elif op in _REPEATS:
+            low, _, item = av
+            if low >= 1:
+                query = _and(query, _sequence_query(item))
+        elif op is sre_constants.ASSERT and av[0] >= 0:
+            # A positive lookahead's text is in the line too; lookbehinds are left out
+            query = _and(query, _sequence_query(av[1]))
+        elif _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+            query = _and(query, _sequence_query(av))
+        # Anything else (classes, ., backreferences, negative lookarounds) matches text that cannot be known
+    return _and(query, _run_query(run))
+
+
+def regex_query(pattern, flags=0):
+    """Query for a regex: the trigrams of the literal runs every match must contain.
+
+    A pattern that does not parse matches every file; compiling it reports
+    the error.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, TypeError, ValueError, RecursionError):
+        return ALL
+    return _sequence_query(parsed)
+
+
+def _encode_ids(ids):
+    return zlib.compress(ids.astype(ID_DTYPE).tobytes(), 1)
+
+
+def _decode_ids(np, blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=ID_DTYPE)
+
+
+class TrigramIndex:
+    """SQLite-backed trigram posting lists of every indexed file, kept up to date incrementally."""
+
+    def __init__(self, db_path=DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Two searches of the same tree may update it at once; the second waits for the first
+        self._conn = sqlite3.connect(db_path, timeout=300)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS files (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   path TEXT NOT NULL UNIQUE,
+                   mtime_ns INTEGER NOT NULL,
+                   size INTEGER NOT NULL
+               );
+               CREATE TABLE IF NOT EXISTS postings (
+                   trigram INTEGER PRIMARY KEY,
+                   ids BLOB NOT NULL
+               );
+               CREATE TABLE IF NOT EXISTS meta (
+                   key TEXT PRIMARY KEY,
+                   value INTEGER NOT NULL
+               );"""
+        )
+        if self._meta("version") != INDEX_VERSION:
+            with self._conn:
+                self._conn.execute("DELETE FROM files")
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute("DELETE FROM meta")
+                self._set_meta("version", INDEX_VERSION)
+        # abspath -> (id, mtime_ns, size) of every indexed file
+        self._files = {path: (file_id, mtime_ns, size)
+                       for file_id, path, mtime_ns, size in self._conn.execute("SELECT * FROM files")}
+        self.stats = {"files": 0, "candidates": 0, "indexed": 0}
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def update(self, root, paths, workers=1, executor="process", progress=None):
+        """Re-index the files of ``paths`` that are new or changed, and forget deleted files under ``root``.
+
+        Files that cannot be read stay out of the index, so they are always
+        candidates and the search reports the error.
+        """
+        stale = {}
+        listed = set()
+        for path in paths:
+            key = os.path.abspath(path)
+            listed.add(key)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            known = self._files.get(key)
+            if known is None or known[1:] != (st.st_mtime_ns, st.st_size):
+                stale[path] = (key, st.st_mtime_ns, st.st_size)
+
+        prefix = os.path.join(os.path.abspath(root), "")
+        # Files filtered out of this listing stay indexed while they exist
+        gone = [key for key in self._files if key.startswith(prefix) and key not in listed and not os.path.exists(key)]
+        if gone:
+            with self._conn:
+                self._remove(gone)
+
+        pending = []
+        pending_postings = 0
+        for path, codes, error in scan_files(file_trigrams, list(stale), (), workers, executor, progress=progress):
+            if error:
+                continue
+            pending.append((*stale[path], codes))
+            pending_postings += len(codes) // 4
+            if pending_postings >= FLUSH_POSTINGS:
+                self._flush(pending)
+                pending, pending_postings = [], 0
+        self._flush(pending)
+        self.stats["indexed"] = len(stale)
+        self._maybe_compact()
+
+    def _remove(self, keys):
+        self._conn.executemany("DELETE FROM files WHERE id = ?", ((self._files.pop(key)[0],) for key in keys))
+        self._set_meta("dead", (self._meta("dead") or 0) + len(keys))
+
+    def _flush(self, pending):
+        # Files and their postings are written in one transaction, so a file is never listed without its postings
+        if not pending:
+            return
+        import numpy as np
+
+        with self._conn:
+            self._remove([key for key, _, _, _ in pending if key in self._files])
+            all_codes, all_ids = [], []
+            for key, mtime_ns, size, codes in pending:
+                file_id = self._conn.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                             (key, mtime_ns, size)).lastrowid
+                self._files[key] = (file_id, mtime_ns, size)
+                codes = np.frombuffer(codes, dtype=ID_DTYPE)
+                all_codes.append(codes)
+                all_ids.append(np.full(len(codes), file_id, dtype=np.uint32))
+            codes, ids = np.concatenate(all_codes), np.concatenate(all_ids)
+            # Grouped by trigram; the stable sort keeps each group's ids ascending, after the ids already stored
+            order = np.argsort(codes, kind="stable")
+            codes, ids = codes[order], ids[order]
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            for code, group in zip(codes[starts].tolist(), np.split(ids, starts[1:])):
+                row = self._conn.execute("SELECT ids FROM postings WHERE trigram = ?", (code,)).fetchone()
+                if row is not None:
+                    group = np.concatenate((_decode_ids(np, row[0]), group))
+                self._conn.execute("INSERT OR REPLACE INTO postings VALUES (?, ?)", (code, _encode_ids(group)))
+
+    def _maybe_compact(self):
+        dead = self._meta("dead") or 0
+        if dead < max(COMPACT_MIN_DEAD, len(self._files)):
+            return
+        import numpy as np
+
+        live = np.array(sorted(file_id for file_id, _, _ in self._files.values()), dtype=np.uint32)
+        with self._conn:
+            for trigram, blob in self._conn.execute("SELECT trigram, ids FROM postings").fetchall():
+                ids = _decode_ids(np, blob)
+                ids = ids[np.isin(ids, live, assume_unique=True)]
+                if len(ids):
+                    self._conn.execute("UPDATE postings SET ids = ? WHERE trigram = ?", (_encode_ids(ids), trigram))
+                else:
+                    self._conn.execute("DELETE FROM postings WHERE trigram = ?", (trigram,))
+            self._set_meta("dead", 0)
+        self._conn.execute("VACUUM")
+
+    def _matching_ids(self, query):
+        import numpy as np
+
+        postings = {}
+
+        def ids_of(trigram):
+            if trigram not in postings:
+                row = self._conn.execute("SELECT ids FROM postings WHERE trigram = ?", (trigram,)).fetchone()
+                postings[trigram] = _decode_ids(np, row[0]) if row else np.empty(0, dtype=ID_DTYPE)
+            return postings[trigram]
+
+        matched = set()
+        for alternative in query:
+            ids = None
+            # Shortest posting lists first, so the intersection shrinks fast
+            for posting in sorted((ids_of(trigram) for trigram in alternative), key=len):
+                ids = posting if ids is None else np.intersect1d(ids, posting, assume_unique=True)
+                if not len(ids):
+                    break
+            matched.update(ids.tolist())
+        return matched
+
+    def candidates(self, paths, query):
+        """The paths that may satisfy ``query``, in their original order."""
+        paths = list(paths)
+        if frozenset() in query:
+            selected = paths
+        else:
+            matched = self._matching_ids(query)
+            selected = []
+            for path in paths:
+                known = self._files.get(os.path.abspath(path))
+                if known is None or known[0] in matched:
+                    selected.append(path)
+        self.stats["files"] = len(paths)
+        self.stats["candidates"] = len(selected)
+        return selected
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()